@@ -5,6 +5,7 @@ from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
 
 import json
+import threading
 
 # 替换为自己的阿里云 AccessKey 和短信签名/模板
 ACCESS_KEY_ID = "AccessKeyId"
@@ -12,22 +13,32 @@ ACCESS_KEY_SECRET = "AccessKeySecret"
 SIGN_NAME = "短信签名"
 TEMPLATE_CODE = "模板CODE"
 
-# 创建阿里云短信客户端（指定区域为 cn-hangzhou）
-client = AcsClient(ACCESS_KEY_ID, ACCESS_KEY_SECRET, "cn-hangzhou")
+# 阿里云短信客户端（指定区域为 cn-hangzhou），首次发送时创建并复用
+_client = None
+_client_lock = threading.Lock()
 
 
-def send_sms_code(phone_number, code):
+class AliSMSError(Exception):
     """
-    发送短信验证码到指定手机号（使用阿里云短信服务）。
+    阿里云返回的业务错误（如签名/模板未审核、号码格式错误），不属于临时性错误。
+    """
+    transient = False
 
-    参数:
-        phone_number (str): 接收短信的手机号（必须为中国大陆号码，格式如 "+8613812345678" 或 "13812345678"）
-        code (str): 要发送的验证码（通常为 6 位数字）
 
-    返回:
-        bool: 发送是否成功（True 表示成功，False 表示失败）
-    """
+def get_client():
+    global _client
 
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AcsClient(ACCESS_KEY_ID, ACCESS_KEY_SECRET, "cn-hangzhou")
+    return _client
+
+
+def build_request(phone_number, code):
+    """
+    构建阿里云 SendSms 请求。
+    """
     # 创建通用请求对象
     request = CommonRequest()
     request.set_method('POST')
@@ -43,21 +54,44 @@ def send_sms_code(phone_number, code):
 
     # 设置模板参数（变量名必须与模板中定义的一致）
     request.add_query_param('TemplateParam', json.dumps({"code": code}))
+    return request
+
+
+def send_sms_request(phone_number, code):
+    """
+    发送短信验证码，成功返回回执 BizId，失败抛出异常。
+    """
+    # 发送请求并获取响应
+    response = get_client().do_action_with_exception(build_request(phone_number, code))
 
+    # 解析响应
+    result = json.loads(response)
+
+    # 判断是否发送成功
+    if result.get("Code") != "OK":
+        raise AliSMSError(f"{result.get('Code')}: {result.get('Message')}")
+    return result.get("BizId")
+
+
+def send_sms_code(phone_number, code):
+    """
+    发送短信验证码到指定手机号（使用阿里云短信服务）。
+
+    参数:
+        phone_number (str): 接收短信的手机号（必须为中国大陆号码，格式如 "+8613812345678" 或 "13812345678"）
+        code (str): 要发送的验证码（通常为 6 位数字）
+
+    返回:
+        bool: 发送是否成功（True 表示成功，False 表示失败）
+    """
     try:
-        # 发送请求并获取响应
-        response = client.do_action_with_exception(request)
-
-        # 解析响应
-        result = json.loads(response)
-
-        # 判断是否发送成功
-        if result.get("Code") == "OK":
-            print(f"[AliSMS] 验证码发送成功：{phone_number}")
-            return True
-        else:
-            print(f"[AliSMS] 发送失败：{result}")
-            return False
+        send_sms_request(phone_number, code)
+        print(f"[AliSMS] 验证码发送成功：{phone_number}")
+        return True
+
+    except AliSMSError as e:
+        print(f"[AliSMS] 发送失败：{e}")
+        return False
 
     except Exception as e:
         print(f"[AliSMS] 异常：{e}")
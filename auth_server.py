@@ -0,0 +1,365 @@
+# auth_server.py
+#
+# 基于 asyncio 的 HTTP/JSON 认证服务，把 AuthService 暴露为共享的认证后端。
+# 用法: python auth_server.py [--host 127.0.0.1] [--port 8080] [--rotate-keys]
+#   --rotate-keys  同时在后台把旧密钥加密的 TOTP 密钥逐批重新加密（见 key_rotation.py）
+#
+# 接口（请求与响应均为 JSON）：
+#   POST /login/code    {"username", "method": "sms" | "email"}            发送登录验证码
+#   POST /login         {"username", "method", "credential"}               第一因子，返回 second_factor 凭据
+#   POST /login/totp    {"session", "code"}                                 第二因子，返回会话令牌
+#   GET  /session       请求头 Authorization: Bearer <令牌>                 查询会话
+#   POST /logout        请求头 Authorization: Bearer <令牌>                 注销
+#   GET  /health
+#   GET  /metrics       请求头 Authorization: Bearer <config.AUTH_SERVER_METRICS_TOKEN>
+#                       Prometheus 文本格式的阶段耗时与结果计数（非 JSON）；未配置令牌时不提供
+#
+# 用户不存在、凭证错误与账户锁定对外都是 401 {"status": "invalid_credentials"}，不返回剩余次数；
+# /login/code 按请求的用户名限流，未被限流时一律返回 202，查找用户与发送在后台完成。
+
+import argparse
+import asyncio
+import hmac
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+# 导入认证服务
+import auth_service
+from auth_service import get_auth_service
+
+# 导入限流异常
+from rate_limiter import RateLimitExceeded
+
+# 导入指标采集
+import metrics
+
+# 导入密码哈希（启动时预先生成用于等耗时校验的固定哈希）
+import password_kdf
+
+# 导入服务配置
+from config import (
+    AUTH_SERVER_HOST,
+    AUTH_SERVER_PORT,
+    AUTH_SERVER_WORKERS,
+    AUTH_SERVER_MAX_BODY,
+    AUTH_SERVER_TIMEOUT,
+    AUTH_SERVER_METRICS_TOKEN
+)
+
+# 登录结果状态 -> HTTP 状态码
+STATUS_CODES = {
+    auth_service.OK: 200,
+    auth_service.SECOND_FACTOR_REQUIRED: 200,
+    auth_service.INVALID_CREDENTIALS: 401,
+    auth_service.SESSION_EXPIRED: 401,
+}
+
+# 对外一律显示为凭证错误的状态
+HIDDEN_STATUSES = (auth_service.NO_SUCH_USER, auth_service.LOCKED)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method, path, headers, body, caller=None):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.caller = caller  # 客户端 IP，用于限流
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的 JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "请求体必须是 JSON 对象")
+        return data
+
+    def field(self, data, name):
+        value = data.get(name)
+        if not isinstance(value, str) or not value:
+            raise HTTPError(400, f"缺少字段 {name}")
+        return value
+
+    def bearer_token(self):
+        value = self.headers.get("authorization", "")
+        if not value.startswith("Bearer "):
+            raise HTTPError(401, "缺少会话令牌")
+        return value[len("Bearer "):].strip()
+
+
+def auth_response(result):
+    """
+    登录结果 -> (HTTP 状态码, JSON)。
+    对外不区分“用户不存在”“凭证错误”与“账户锁定”，也不返回剩余尝试次数，
+    避免被用来枚举用户名。
+    """
+    status = result.status
+    if status in HIDDEN_STATUSES:
+        status = auth_service.INVALID_CREDENTIALS
+    body = {"status": status}
+    if result.session is not None:
+        body["session"] = result.session
+    return STATUS_CODES[status], body
+
+
+class AuthServer:
+    """
+    单线程事件循环负责连接与 HTTP 解析（支持 keep-alive），
+    密码哈希、读写用户数据等阻塞操作交给线程池，事件循环不会被单个请求卡住。
+    """
+
+    def __init__(self, service=None, host=AUTH_SERVER_HOST, port=AUTH_SERVER_PORT,
+                 workers=AUTH_SERVER_WORKERS, max_body=AUTH_SERVER_MAX_BODY, timeout=AUTH_SERVER_TIMEOUT,
+                 metrics_token=AUTH_SERVER_METRICS_TOKEN):
+        self.service = service or get_auth_service()
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.timeout = timeout
+        self.metrics_token = metrics_token
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="auth-server")
+        self.server = None
+
+        # (方法, 路径) -> 处理函数（协程，返回 (状态码, JSON 或文本)）
+        self.routes = {
+            ("POST", "/login/code"): self.handle_send_code,
+            ("POST", "/login"): self.handle_login,
+            ("POST", "/login/totp"): self.handle_totp,
+            ("GET", "/session"): self.handle_session,
+            ("POST", "/logout"): self.handle_logout,
+            ("GET", "/health"): self.handle_health,
+        }
+        if metrics_token:
+            # 指标与认证接口共用监听地址，只对持有令牌的请求开放
+            self.routes[("GET", "/metrics")] = self.handle_metrics
+
+        # 统计计数（仅在事件循环线程中修改）
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def run_blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ---------- 接口 ----------
+
+    async def handle_send_code(self, request):
+        data = request.json()
+        username = request.field(data, "username")
+        method = request.field(data, "method")
+        if method not in auth_service.CODE_METHODS:
+            raise HTTPError(400, "不支持的发送方式")
+        # 只做内存中的限流检查并提交后台任务，不阻塞事件循环；
+        # 与登录接口一致，响应与耗时不暴露用户名或联系方式是否存在
+        try:
+            self.service.request_login_code(username, method, request.caller)
+        except RuntimeError as e:
+            print(f"[AuthServer] 无法提交验证码发送任务：{e}")
+            raise HTTPError(503, "验证码发送服务暂不可用，请稍后再试")
+        return 202, {"status": "accepted"}
+
+    async def handle_login(self, request):
+        data = request.json()
+        username = request.field(data, "username")
+        method = data.get("method", "password")
+        credential = request.field(data, "credential")
+        if method != "password" and method not in auth_service.CODE_METHODS:
+            raise HTTPError(400, "不支持的登录方式")
+        result = await self.run_blocking(self.service.begin_login, username, method, credential, request.caller)
+        return auth_response(result)
+
+    async def handle_totp(self, request):
+        data = request.json()
+        result = await self.run_blocking(
+            self.service.complete_login, request.field(data, "session"), request.field(data, "code"), request.caller
+        )
+        return auth_response(result)
+
+    async def handle_session(self, request):
+        username = self.service.get_session(request.bearer_token())
+        if username is None:
+            raise HTTPError(401, "会话无效或已过期")
+        return 200, {"username": username}
+
+    async def handle_logout(self, request):
+        self.service.logout(request.bearer_token())
+        return 200, {"status": "ok"}
+
+    async def handle_health(self, request):
+        return 200, {"status": "ok", **self.service.stats()}
+
+    async def handle_metrics(self, request):
+        # 按字节比较：请求头可能含非 ASCII 字符
+        token = request.bearer_token().encode("latin-1")
+        if not hmac.compare_digest(token, self.metrics_token.encode()):
+            raise HTTPError(401, "令牌无效")
+        return 200, metrics.render()
+
+    # ---------- HTTP ----------
+
+    async def read_request(self, reader, caller=None):
+        """
+        读取一个请求；连接在请求之间被关闭时返回 None。
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise HTTPError(400, "请求不完整")
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "请求头过大")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "请求行格式错误")
+
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            raise HTTPError(400, "Content-Length 格式错误")
+        if length > self.max_body:
+            raise HTTPError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+
+        return Request(method.upper(), target.split("?", 1)[0], headers, body, caller)
+
+    @staticmethod
+    def encode_response(status, body, keep_alive, headers=None):
+        # 字符串响应体按纯文本发送（/metrics），其余按 JSON
+        if isinstance(body, str):
+            payload = body.encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            payload = json.dumps(body, ensure_ascii=False).encode()
+            content_type = "application/json; charset=utf-8"
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"{extra}"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        return head.encode() + payload
+
+    async def dispatch(self, request):
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                raise HTTPError(405, "不支持的请求方法")
+            raise HTTPError(404, "接口不存在")
+        try:
+            return await handler(request)
+        except RateLimitExceeded as e:
+            raise HTTPError(429, str(e), {"Retry-After": int(e.retry_after) + 1})
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        peer = writer.get_extra_info("peername")
+        caller = peer[0] if peer else None
+        try:
+            while True:
+                keep_alive = False
+                headers = None
+                try:
+                    request = await asyncio.wait_for(self.read_request(reader, caller), self.timeout)
+                    if request is None:
+                        break
+                    self.requests += 1
+                    keep_alive = request.headers.get("connection", "").lower() != "close"
+                    status, body = await self.dispatch(request)
+                except HTTPError as e:
+                    status, body, headers = e.status, {"error": e.message}, e.headers
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    self.errors += 1
+                    print(f"[AuthServer] 请求处理异常：{e}")
+                    status, body = 500, {"error": "服务器内部错误"}
+
+                writer.write(self.encode_response(status, body, keep_alive, headers))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self):
+        # 固定哈希在首次使用时生成：提前生成，避免第一个“用户不存在”的请求明显更慢
+        await self.run_blocking(password_kdf.verify_dummy, "")
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"[AuthServer] 监听 http://{self.host}:{self.port}")
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+
+def run_in_thread(server):
+    """
+    在后台线程的事件循环中运行服务（便于测试与基准），返回 (线程, 事件循环)。
+    """
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="auth-server-loop", daemon=True)
+    thread.start()
+    started.wait()
+    return thread, loop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP/JSON 认证服务")
+    parser.add_argument("--host", default=AUTH_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=AUTH_SERVER_PORT)
+    parser.add_argument("--rotate-keys", action="store_true", help="在后台运行密钥轮换任务")
+    args = parser.parse_args()
+
+    if args.rotate_keys:
+        # 延迟导入
+        from key_rotation import KeyRotationJob
+        KeyRotationJob().start()
+
+    try:
+        asyncio.run(AuthServer(host=args.host, port=args.port).serve_forever())
+    except KeyboardInterrupt:
+        pass
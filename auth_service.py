@@ -0,0 +1,272 @@
+# auth_service.py
+
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# 导入用户管理与验证码模块
+from user_manager import get_user, user_transaction, CONTACT_FIELDS
+from verification_manager import send_user_code, check_send_rate, check_login_rate, verify_first_factor
+
+# 导入密码哈希（用户不存在时做一次等耗时的校验）
+import password_kdf
+
+# 导入 TOTP 验证函数
+from totp_manager import verify_totp
+
+# 导入登录日志
+from logger import log_login_attempt
+
+# 导入指标采集
+import metrics
+
+# 导入会话有效期配置
+from config import AUTH_PENDING_TTL, AUTH_SESSION_TTL, AUTH_CODE_SEND_WORKERS
+
+# 登录结果状态
+OK = "ok"                                    # 登录完成，session 为会话令牌
+SECOND_FACTOR_REQUIRED = "second_factor"     # 第一因子通过，session 为第二因子凭据
+INVALID_CREDENTIALS = "invalid_credentials"  # 凭证错误，remaining 为剩余尝试次数
+LOCKED = "locked"                            # 账户已锁定（或本次失败导致锁定）
+NO_SUCH_USER = "no_such_user"                # 用户不存在
+SESSION_EXPIRED = "session_expired"          # 第二因子凭据无效或已过期
+
+# 失败状态 -> 指标事件名前缀（后接 _first_factor / _second_factor）
+FAILURE_EVENTS = {
+    INVALID_CREDENTIALS: "invalid_credentials",
+    LOCKED: "locked",
+    NO_SUCH_USER: "no_such_user",
+}
+
+# 登录方式 -> 验证码发送方式（兼容界面中的 "phone"）
+CODE_METHODS = {"sms": "sms", "phone": "sms", "email": "email"}
+
+# 一次登录操作的结果：
+#   status     上方状态常量之一
+#   username   用户名
+#   session    第二因子凭据或会话令牌（其余状态为 None）
+#   remaining  凭证错误时的剩余尝试次数（其余状态为 None）
+AuthResult = namedtuple("AuthResult", "status username session remaining")
+
+
+class SessionTable:
+    """
+    固定有效期的令牌表：令牌按创建顺序存放，最早创建的最先过期，
+    因此清理过期令牌只需从头部弹出。
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._items = OrderedDict()   # 令牌 -> (用户名, 过期时间)
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        while self._items:
+            token, (_, expires_at) = next(iter(self._items.items()))
+            if expires_at > now:
+                break
+            del self._items[token]
+
+    def create(self, username):
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            self._items[token] = (username, now + self.ttl)
+        return token
+
+    def get(self, token):
+        with self._lock:
+            item = self._items.get(token)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def pop(self, token):
+        with self._lock:
+            item = self._items.pop(token, None)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def __len__(self):
+        with self._lock:
+            self._purge(time.monotonic())
+            return len(self._items)
+
+
+class AuthService:
+    """
+    与界面无关的登录流程：
+
+    1. begin_login：锁定检查、第一因子（密码 / 短信 / 邮箱验证码）校验与失败计数，
+       通过后返回一次性的第二因子凭据；
+    2. complete_login：凭第二因子凭据校验 TOTP 或恢复码，通过后返回会话令牌。
+
+    所有方法都是阻塞调用（密码哈希、读写用户数据、发送验证码），线程安全，
+    可由桌面界面的工作线程或网络服务的线程池调用。会话保存在进程内存中。
+
+    caller 为调用方标识（网络服务中为客户端 IP），与用户名、联系方式一起用于限流；
+    超出限额时抛出 rate_limiter.RateLimitExceeded，且不计入失败次数。
+    """
+
+    def __init__(self, pending_ttl=AUTH_PENDING_TTL, session_ttl=AUTH_SESSION_TTL):
+        self.pending = SessionTable(pending_ttl)
+        self.sessions = SessionTable(session_ttl)
+        # 线程在首次提交时才创建
+        self.code_sender = ThreadPoolExecutor(max_workers=AUTH_CODE_SEND_WORKERS, thread_name_prefix="code-sender")
+
+    def send_login_code(self, username, method, caller=None):
+        """
+        向用户绑定的手机号或邮箱发送登录验证码，阻塞到发送完成（桌面界面据此提示结果）。
+        异常:
+            ValueError: 用户不存在、方式不支持或未绑定对应联系方式
+        """
+        if method not in CODE_METHODS:
+            raise ValueError("不支持的发送方式")
+
+        # 限流在查询用户之前，按请求的用户名计数
+        check_send_rate(username, caller)
+        self._send_login_code(username, method)
+
+    def request_login_code(self, username, method, caller=None):
+        """
+        只做限流检查便立即返回，查找用户与发送在后台线程中完成（网络接口使用）。
+        返回结果与耗时不取决于用户是否存在、是否绑定联系方式或发送是否成功，
+        避免被用来枚举用户名。
+        异常:
+            ValueError: 方式不支持
+            RuntimeError: 后台发送线程池已关闭
+        """
+        if method not in CODE_METHODS:
+            raise ValueError("不支持的发送方式")
+
+        check_send_rate(username, caller)
+        self.code_sender.submit(self._send_login_code_quietly, username, method)
+
+    def _send_login_code(self, username, method):
+        user = get_user(username)
+        if not user:
+            raise ValueError("用户不存在")
+
+        contact = user.get(CONTACT_FIELDS[method])
+        if not contact:
+            raise ValueError(f"该用户未绑定 {method}")
+
+        send_user_code(username, contact, CODE_METHODS[method])
+
+    def _send_login_code_quietly(self, username, method):
+        try:
+            self._send_login_code(username, method)
+        except Exception as e:
+            print(f"[AuthService] 未发送登录验证码（{username}）：{e}")
+
+    @metrics.timed("login_first_factor")
+    def begin_login(self, username, method, credential, caller=None):
+        """
+        校验第一因子。method 为 "password"、"sms"（或 "phone"）、"email"。
+        在一个用户事务内完成读取、校验与失败计数，最多一次读、一次写。
+        用户不存在或已锁定时仍对固定哈希计算一次密码哈希，响应耗时与密码错误相同。
+        """
+        if method != "password" and method not in CODE_METHODS:
+            raise ValueError("不支持的登录方式")
+
+        # 限流在读取用户之前：轮换用户名的尝试同样计入调用方的额度
+        check_login_rate(username, caller)
+
+        with user_transaction(username) as txn:
+            if not txn.exists():
+                result = AuthResult(NO_SUCH_USER, username, None, None)
+            elif txn.is_locked():
+                result = AuthResult(LOCKED, username, None, None)
+            else:
+                success = verify_first_factor(
+                    username, CODE_METHODS.get(method, method), credential, txn=txn
+                )
+
+                if success:
+                    txn.reset_failed_attempts()
+                    result = AuthResult(SECOND_FACTOR_REQUIRED, username, self.pending.create(username), None)
+                else:
+                    remaining = txn.register_failure()
+                    status = LOCKED if remaining <= 0 else INVALID_CREDENTIALS
+                    result = AuthResult(status, username, None, remaining)
+
+        if method == "password" and result.status in (NO_SUCH_USER, LOCKED) and result.remaining is None:
+            # 未做真实校验（用户不存在或已锁定）：在事务外补一次等耗时的校验
+            password_kdf.verify_dummy(credential)
+
+        if result.status != SECOND_FACTOR_REQUIRED:
+            metrics.event(FAILURE_EVENTS[result.status] + "_first_factor")
+            log_login_attempt(username, False, reason=f"第一因子（{method}）：{result.status}")
+        return result
+
+    @metrics.timed("login_second_factor")
+    def complete_login(self, pending_token, code, caller=None):
+        """
+        校验第二因子（TOTP 或恢复码）。第二因子凭据只能成功使用一次；
+        失败次数用尽导致锁定时凭据作废。
+        """
+        username = self.pending.get(pending_token)
+        if username is None:
+            metrics.event("session_expired")
+            return AuthResult(SESSION_EXPIRED, None, None, None)
+
+        with user_transaction(username) as txn:
+            if not txn.exists():
+                result = AuthResult(NO_SUCH_USER, username, None, None)
+            elif txn.is_locked():
+                result = AuthResult(LOCKED, username, None, None)
+            elif verify_totp(username, code, user=txn.user, caller=caller) or txn.consume_recovery_code(code):
+                txn.reset_failed_attempts()
+                result = AuthResult(OK, username, None, None)
+            else:
+                remaining = txn.register_failure()
+                status = LOCKED if remaining <= 0 else INVALID_CREDENTIALS
+                result = AuthResult(status, username, None, remaining)
+
+        if result.status == OK:
+            # 凭据已被并发请求用掉时不再签发会话
+            if self.pending.pop(pending_token) is None:
+                metrics.event("session_expired")
+                return AuthResult(SESSION_EXPIRED, None, None, None)
+            metrics.event("login_success")
+            log_login_attempt(username, True)
+            return result._replace(session=self.sessions.create(username))
+
+        if result.status != INVALID_CREDENTIALS:
+            self.pending.pop(pending_token)
+        metrics.event(FAILURE_EVENTS[result.status] + "_second_factor")
+        log_login_attempt(username, False, reason=f"第二因子：{result.status}")
+        return result
+
+    def get_session(self, token):
+        """
+        返回会话令牌对应的用户名；令牌无效或已过期时返回 None。
+        """
+        return self.sessions.get(token)
+
+    def logout(self, token):
+        return self.sessions.pop(token) is not None
+
+    def stats(self):
+        return {"pending": len(self.pending), "sessions": len(self.sessions)}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_auth_service():
+    """
+    获取进程内共享的认证服务（桌面界面与网络服务共用同一套会话）。
+    """
+    global _service
+
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = AuthService()
+    return _service
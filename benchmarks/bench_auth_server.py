@@ -0,0 +1,78 @@
+# benchmarks/bench_auth_server.py
+#
+# 认证服务并发登录基准：多个客户端线程通过 HTTP（keep-alive）同时完成两步登录。
+# 用法: python benchmarks/bench_auth_server.py [--users 50] [--clients 16] [--rounds 4]
+
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+
+from common import setup_workdir
+
+setup_workdir()
+
+import pyotp
+from user_manager import add_user
+from auth_server import AuthServer, run_in_thread
+
+
+def call(conn, path, body):
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def client(port, accounts, rounds, latencies):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for _ in range(rounds):
+        for username, secret in accounts:
+            start = time.perf_counter()
+            status, body = call(conn, "/login", {"username": username, "credential": "password123"})
+            assert status == 200, body
+            status, body = call(conn, "/login/totp", {"session": body["session"], "code": pyotp.TOTP(secret).now()})
+            assert status == 200, body
+            latencies.append((time.perf_counter() - start) * 1000)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证服务并发登录基准")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=4, help="每个客户端对其账户重复登录的轮数")
+    args = parser.parse_args()
+
+    accounts = []
+    for i in range(args.users):
+        secret = pyotp.random_base32()
+        add_user(f"bench{i}", secret, "password123")
+        accounts.append((f"bench{i}", secret))
+
+    server = AuthServer(port=0)
+    run_in_thread(server)
+
+    latencies = []
+    threads = [
+        threading.Thread(target=client, args=(server.port, accounts[i::args.clients], args.rounds, latencies))
+        for i in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} 次两步登录，{args.clients} 个并发客户端：{elapsed:.2f} s，"
+          f"{len(latencies) / elapsed:.1f} 次/秒")
+    print(f"单次登录 平均 {statistics.mean(latencies):.1f} ms  "
+          f"p50 {latencies[len(latencies) // 2]:.1f} ms  p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms")
+    print(f"会话统计：{server.service.stats()}")
+
+
+if __name__ == "__main__":
+    main()
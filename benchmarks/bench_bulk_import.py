@@ -0,0 +1,72 @@
+# benchmarks/bench_bulk_import.py
+#
+# 批量导入 / 导出吞吐量：生成合成用户 CSV，对比逐个 add_user 与 bulk_users 批量导入
+# （明文密码需要计算 scrypt；已有哈希的行只做加密与写入），再测量流式导出。
+# 用法: python benchmarks/bench_bulk_import.py [--users 20000] [--add-user 200] [--workers 0] [--scrypt-n 1024]
+#
+# 默认降低 scrypt 成本（--scrypt-n），使结果反映导入管道本身；
+# 按生产参数估算时，用 --scrypt-n 0 保持配置值（此时耗时主要取决于 CPU 核数）。
+
+import argparse
+import csv
+import hashlib
+import os
+import time
+
+from common import setup_workdir
+
+
+def write_csv(path, users, prefix, prehashed=False):
+    # prehashed 时写入旧版 SHA-256 哈希（从旧系统迁移的典型情况），导入时不再计算 scrypt
+    legacy = hashlib.sha256(b"password123").hexdigest()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["username", "password_hash" if prehashed else "password", "email", "phone"])
+        for i in range(users):
+            writer.writerow([f"{prefix}{i}", legacy if prehashed else "password123",
+                             f"{prefix}{i}@example.com", f"+1{prefix[0]}{i:09d}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入 / 导出吞吐量基准")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--add-user", type=int, default=200, help="逐个 add_user 对照组的用户数")
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数（0 表示 CPU 核数）")
+    parser.add_argument("--scrypt-n", type=int, default=1024, help="覆盖 PASSWORD_SCRYPT_N（0 表示使用配置值）")
+    args = parser.parse_args()
+
+    setup_workdir()
+
+    # 必须在导入项目模块之前修改配置
+    import config
+    if args.scrypt_n:
+        config.PASSWORD_SCRYPT_N = args.scrypt_n
+
+    import pyotp
+    from user_manager import add_user
+    from bulk_users import import_users, export_users
+
+    secret = pyotp.random_base32()
+    start = time.perf_counter()
+    for i in range(args.add_user):
+        add_user(f"single{i}", secret, "password123", email=f"single{i}@example.com")
+    elapsed = time.perf_counter() - start
+    print(f"逐个 add_user：{args.add_user} 个用户 {elapsed:.2f} s，{args.add_user / elapsed:.0f} 个/秒")
+
+    for name, prehashed in (("明文密码", False), ("已有哈希", True)):
+        path = f"{'hashed' if prehashed else 'plain'}.csv"
+        write_csv(path, args.users, "hashed" if prehashed else "plain", prehashed)
+        result = import_users(path, workers=args.workers)
+        print(f"bulk_users 导入（{name}）：{result['imported']} 个用户 {result['seconds']:.2f} s，"
+              f"{result['imported'] / result['seconds']:.0f} 个/秒")
+
+    for fmt in ("jsonl", "csv"):
+        start = time.perf_counter()
+        count = export_users(f"export.{fmt}")
+        elapsed = time.perf_counter() - start
+        print(f"导出 {fmt}：{count} 个用户 {elapsed:.2f} s，{count / elapsed:.0f} 个/秒，"
+              f"文件 {os.path.getsize(f'export.{fmt}') / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
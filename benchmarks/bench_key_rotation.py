@@ -0,0 +1,105 @@
+# benchmarks/bench_key_rotation.py
+#
+# 密钥轮换：重新加密吞吐量，以及轮换在后台运行期间 TOTP 校验（读取用户 + 解密 + 验证）的延迟。
+# 用法: python benchmarks/bench_key_rotation.py [--users 50000] [--batch-size 200] [--pause 0.05]
+
+import argparse
+import os
+import statistics
+import threading
+import time
+
+from common import setup_workdir
+
+setup_workdir()
+
+from cryptography.fernet import Fernet
+
+# 旧密钥加密全部用户，之后以“新密钥,旧密钥”启动轮换
+OLD_KEY = os.environ["FERNET_KEY"]
+NEW_KEY = Fernet.generate_key().decode()
+
+
+def login_latencies(verify_totp, purge_totp_cache, users, code, stop, latencies):
+    # 每次都清空 TOTP 缓存，使每次校验都读取用户记录并解密
+    i = 0
+    while not stop.is_set():
+        purge_totp_cache()
+        start = time.perf_counter()
+        verify_totp(f"user{i % users}", code)
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 7919
+        time.sleep(0.001)
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return (f"{len(latencies)} 次  p50 {statistics.median(latencies):.3f} ms  "
+            f"p99 {latencies[max(int(len(latencies) * 0.99) - 1, 0)]:.3f} ms  "
+            f"最大 {latencies[-1]:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="密钥轮换基准")
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--pause", type=float, default=0.05)
+    args = parser.parse_args()
+
+    import config
+    config.RATE_LIMITS = {name: (10 ** 12, window) for name, (_, window) in config.RATE_LIMITS.items()}
+
+    import pyotp
+    from data_store import get_store
+
+    secret = pyotp.random_base32()
+    old = Fernet(OLD_KEY.encode())
+    store = get_store()
+    for offset in range(0, args.users, 10000):
+        store.put_many(
+            (f"user{i}", {"secret": old.encrypt(secret.encode()).decode(), "password": "", "recovery_codes": []})
+            for i in range(offset, min(offset + 10000, args.users))
+        )
+
+    # 密钥在首次使用时才读取，此时切换为“新密钥,旧密钥”
+    os.environ["FERNET_KEYS"] = f"{NEW_KEY},{OLD_KEY}"
+    from totp_manager import verify_totp, purge_totp_cache
+    from key_rotation import KeyRotationJob
+
+    code = pyotp.TOTP(secret).now()
+
+    def measure_logins(seconds=None, job=None):
+        latencies, stop = [], threading.Event()
+        thread = threading.Thread(
+            target=login_latencies, args=(verify_totp, purge_totp_cache, args.users, code, stop, latencies)
+        )
+        thread.start()
+        if job is None:
+            time.sleep(seconds)
+        else:
+            job.run()
+        stop.set()
+        thread.join()
+        return latencies
+
+    print(f"空闲时 TOTP 校验：{summary(measure_logins(seconds=3))}")
+
+    job = KeyRotationJob(args.batch_size, args.pause, store=store, verbose=False)
+    start = time.perf_counter()
+    latencies = measure_logins(job=job)
+    elapsed = time.perf_counter() - start
+    progress = job.progress()
+    print(f"轮换期间 TOTP 校验：{summary(latencies)}")
+    print(f"重新加密 {progress['rotated']} / {args.users} 个用户：{elapsed:.2f} s，"
+          f"{progress['rotated'] / elapsed:.0f} 个/秒（批量 {args.batch_size}，暂停 {args.pause} s）")
+
+    job = KeyRotationJob(args.batch_size, 0, store=store, verbose=False)
+    job.restart()
+    start = time.perf_counter()
+    job.run()
+    elapsed = time.perf_counter() - start
+    print(f"已全部轮换后再扫描一遍（无暂停）：{job.progress()['scanned']} 个用户 {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
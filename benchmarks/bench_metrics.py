@@ -0,0 +1,122 @@
+# benchmarks/bench_metrics.py
+#
+# 指标采集的开销：单次计时 / 计数的成本（开启与关闭），
+# 以及开启与关闭时完整两步登录（AuthService）的端到端耗时对比。
+# 用法: python benchmarks/bench_metrics.py [--calls 200000] [--logins 300]
+#
+# 端到端对比在两个子进程中分别以 METRICS_ENABLED = True / False 运行。
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import measure, report
+
+
+def noop():
+    pass
+
+
+def micro(calls):
+    import metrics
+
+    for enabled in (False, True):
+        metrics.ENABLED = enabled
+        label = "开启" if enabled else "关闭"
+        timed_noop = metrics.timed(f"bench_{int(enabled)}")(noop)
+
+        base = measure(noop, calls)
+        seconds = measure(timed_noop, calls)
+        report(f"timed 包装的空函数（{label}）", calls, seconds)
+        print(f"{'':<40} 每次额外 {(seconds - base) / calls * 1e9:>8.0f} ns")
+
+        def spanned():
+            with metrics.span("bench_span"):
+                pass
+
+        report(f"span 代码块（{label}）", calls, measure(spanned, calls))
+        report(f"event 计数（{label}）", calls, measure(lambda: metrics.event("bench"), calls))
+
+    start = time.perf_counter()
+    text = metrics.render()
+    print(f"render：{len(text.splitlines())} 行，{(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+def run_logins(enabled, logins):
+    """
+    在当前（子）进程中完成 logins 次两步登录，返回每次登录耗时（毫秒）。
+    """
+    from common import setup_workdir
+    setup_workdir()
+
+    # 必须在导入项目模块之前修改配置
+    import config
+    config.METRICS_ENABLED = enabled
+    config.RATE_LIMITS = {name: (10 ** 12, window) for name, (_, window) in config.RATE_LIMITS.items()}
+    # 降低 scrypt 成本，避免哈希耗时淹没指标本身的开销
+    config.PASSWORD_SCRYPT_N = 2 ** 10
+
+    import pyotp
+    from user_manager import add_user
+    from auth_service import AuthService
+    from logger import flush_logs
+
+    # 同一 TOTP 验证码不能重复用于登录，每次登录使用不同账户
+    secret = pyotp.random_base32()
+    for i in range(logins):
+        add_user(f"bench{i}", secret, "password123")
+
+    service = AuthService()
+    code = pyotp.TOTP(secret).now()
+    latencies = []
+    for i in range(logins):
+        start = time.perf_counter()
+        result = service.begin_login(f"bench{i}", "password", "password123")
+        result = service.complete_login(result.session, code)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert result.status == "ok", result
+    flush_logs()
+    return latencies
+
+
+def end_to_end(logins):
+    medians = {}
+    for enabled in (False, True):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--enabled", str(int(enabled)),
+             "--logins", str(logins)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        latencies = sorted(json.loads(output.splitlines()[-1]))
+        medians[enabled] = statistics.median(latencies)
+        print(f"两步登录（指标{'开启' if enabled else '关闭'}）  {logins} 次  "
+              f"p50 {medians[enabled]:.3f} ms  平均 {statistics.mean(latencies):.3f} ms")
+
+    overhead = medians[True] - medians[False]
+    print(f"开启指标的额外开销：p50 {overhead * 1000:+.1f} us（{overhead / medians[False] * 100:+.2f}%）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标采集开销基准")
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--logins", type=int, default=300)
+    # 以下参数仅供子进程使用
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--enabled", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_logins(bool(args.enabled), args.logins)))
+        return
+
+    micro(args.calls)
+    print()
+    end_to_end(args.logins)
+
+
+if __name__ == "__main__":
+    main()
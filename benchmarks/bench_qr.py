@@ -0,0 +1,50 @@
+# benchmarks/bench_qr.py
+#
+# 二维码渲染与批量配置包：单次 PNG / SVG 编码耗时、缓存命中耗时，以及批量生成配置包的吞吐量。
+# 用法: python benchmarks/bench_qr.py [--renders 50] [--users 2000] [--workers 0]
+
+import argparse
+import os
+
+from common import setup_workdir, measure, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="二维码渲染与批量配置包基准")
+    parser.add_argument("--renders", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=0, help="工作进程数（0 表示 CPU 核数）")
+    args = parser.parse_args()
+
+    setup_workdir()
+
+    import pyotp
+    from totp_manager import encode_qr, render_qr, provisioning_uri, encrypt_secret
+    from user_manager import generate_recovery_codes
+    from data_store import get_store
+    from provisioning import generate_packs
+
+    uris = [provisioning_uri(f"user{i}", pyotp.random_base32()) for i in range(args.renders)]
+
+    # 首次导入 qrcode / PIL 的开销不计入
+    encode_qr(uris[0])
+    for fmt in ("png", "svg"):
+        it = iter(uris)
+        report(f"encode_qr（{fmt}，不缓存）", args.renders, measure(lambda: encode_qr(next(it), fmt), args.renders))
+
+    render_qr(uris[0])
+    report("render_qr（缓存命中）", 100000, measure(lambda: render_qr(uris[0]), 100000))
+
+    get_store().put_many(
+        (f"user{i}", {"secret": encrypt_secret(pyotp.random_base32()), "recovery_codes": generate_recovery_codes()})
+        for i in range(args.users)
+    )
+    for fmt in ("png", "svg"):
+        result = generate_packs(f"packs-{fmt}", fmt=fmt, workers=args.workers)
+        size = sum(entry.stat().st_size for entry in os.scandir(f"packs-{fmt}"))
+        print(f"批量配置包（{fmt}）：{result['written']} 个 {result['seconds']:.2f} s，"
+              f"{result['written'] / result['seconds']:.0f} 个/秒，共 {size / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_rate_limiter.py
+#
+# 限流检查的单次开销与每个键的内存占用。
+# 用法: python benchmarks/bench_rate_limiter.py [--checks 200000] [--keys 100000]
+
+import argparse
+import threading
+import tracemalloc
+
+from common import setup_workdir, measure, report
+
+setup_workdir()
+
+from rate_limiter import SlidingWindowCounter, RateLimiter, RateLimitExceeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="滑动窗口限流检查开销基准")
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=100000)
+    args = parser.parse_args()
+
+    # 同一个键反复检查（额度足够，全部放行）
+    counter = SlidingWindowCounter(limit=10 ** 9, window=60, max_keys=args.keys)
+    report("单键 hit", args.checks, measure(lambda: counter.hit("user0"), args.checks))
+
+    # 大量不同的键（每次都要查字典、调整顺序）
+    keys = [f"user{i}" for i in range(args.keys)]
+    counter = SlidingWindowCounter(limit=10 ** 9, window=60, max_keys=args.keys)
+
+    def cycle():
+        hit = counter.hit
+        for key in keys:
+            hit(key)
+
+    report(f"{args.keys} 个键轮流 hit", args.keys, measure(cycle))
+    report(f"{args.keys} 个键再次轮流 hit", args.keys, measure(cycle))
+
+    # 超出限额时的拒绝路径
+    counter = SlidingWindowCounter(limit=1, window=60)
+    counter.hit("user0")
+    report("超额拒绝", args.checks, measure(lambda: counter.hit("user0"), args.checks))
+
+    # 经 RateLimiter.check 的完整调用（含规则查找）
+    limiter = RateLimiter({"login_user": (10 ** 9, 60)}, evict_interval=None)
+    report("RateLimiter.check", args.checks, measure(lambda: limiter.check("login_user", "user0"), args.checks))
+
+    limiter = RateLimiter({"login_user": (1, 60)}, evict_interval=None)
+    limiter.check("login_user", "user0")
+
+    def rejected():
+        try:
+            limiter.check("login_user", "user0")
+        except RateLimitExceeded:
+            pass
+
+    report("RateLimiter.check（抛出异常）", args.checks, measure(rejected, args.checks))
+
+    # 多线程并发检查不同的键
+    counter = SlidingWindowCounter(limit=10 ** 9, window=60, max_keys=args.keys)
+    per_thread = args.checks // 4
+
+    def worker(offset):
+        hit = counter.hit
+        for i in range(per_thread):
+            hit(keys[(offset + i) % len(keys)])
+
+    def run_threads():
+        threads = [threading.Thread(target=worker, args=(i * 1000,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    report("4 线程并发 hit", per_thread * 4, measure(run_threads))
+
+    # 每个键的内存占用
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    counter = SlidingWindowCounter(limit=10, window=60, max_keys=args.keys)
+    for key in keys:
+        counter.hit(key)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f"{args.keys} 个键占用约 {used / 1024 / 1024:.1f} MiB，"
+          f"每个键约 {used / args.keys:.0f} 字节（不含键字符串本身）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_sms_routing.py
+#
+# 用注入延迟和错误的本地假供应商验证短信路由：
+# 延迟感知选路、故障切换与对冲发送对尾延迟的影响。
+# 用法: python benchmarks/bench_sms_routing.py [--sends 200]
+
+import argparse
+import random
+import time
+
+from common import setup_workdir
+
+setup_workdir()
+
+from sms_providers import SMSProvider, SMSRouter
+
+
+class FakeProvider(SMSProvider):
+    """
+    假供应商：每次发送休眠 latency 秒，以 slow_rate 的概率休眠 slow_latency 秒，
+    以 error_rate 的概率抛出临时性错误。
+    """
+
+    def __init__(self, name, latency, error_rate=0.0, slow_rate=0.0, slow_latency=0.0):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.calls = 0
+
+    def _send(self, to_phone, code):
+        self.calls += 1
+        slow = random.random() < self.slow_rate
+        time.sleep(self.slow_latency if slow else self.latency)
+        if random.random() < self.error_rate:
+            raise ConnectionError(f"{self.name} 注入的错误")
+        return f"{self.name}-{self.calls}"
+
+
+def run(label, router, sends):
+    latencies = []
+    failures = 0
+    for i in range(sends):
+        start = time.perf_counter()
+        result = router.send(f"+100{i}", "123456")
+        latencies.append((time.perf_counter() - start) * 1000)
+        failures += not result.ok
+    latencies.sort()
+    calls = ", ".join(f"{p.name}={p.calls}" for p in router.providers)
+    print(f"{label:<28} p50 {latencies[len(latencies) // 2]:7.1f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:7.1f} ms  失败 {failures}  调用 {calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="短信多供应商路由验证")
+    parser.add_argument("--sends", type=int, default=200)
+    args = parser.parse_args()
+
+    # 1. 延迟感知：流量应集中到更快的供应商
+    run("延迟感知选路", SMSRouter([FakeProvider("slow", 0.02), FakeProvider("fast", 0.002)]), args.sends)
+
+    # 2. 故障切换：首选供应商持续出错，发送仍应成功并转向备用供应商
+    run("故障切换", SMSRouter(
+        [FakeProvider("broken", 0.001, error_rate=1.0), FakeProvider("backup", 0.005)], cooldown=1
+    ), args.sends)
+
+    # 3. 对冲：首选供应商有 10% 的慢请求，对比不对冲与 10ms 后对冲的尾延迟
+    def tail_providers():
+        return [FakeProvider("primary", 0.002, slow_rate=0.1, slow_latency=0.1), FakeProvider("secondary", 0.02)]
+
+    run("不对冲", SMSRouter(tail_providers()), args.sends)
+    run("10ms 后对冲", SMSRouter(tail_providers(), hedge_after=0.01), args.sends)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_smtp_pool.py
+#
+# 对比“每封邮件新建连接 + 登录”与连接池复用会话的单封发送延迟。
+# 用法: python benchmarks/bench_smtp_pool.py [--messages 200] [--connect-delay-ms 20]
+
+import argparse
+import smtplib
+import statistics
+import time
+
+from common import setup_workdir
+
+setup_workdir()
+
+from fake_smtp import FakeSMTPServer
+from smtp_pool import SMTPConnectionPool
+
+MESSAGE = "Subject: code\r\n\r\n123456"
+
+
+def send_fresh(port):
+    # 与旧版 send_email_code 相同：每次新建连接、登录、发送、断开
+    with smtplib.SMTP("127.0.0.1", port) as smtp:
+        smtp.login("sender@example.com", "password")
+        smtp.sendmail("sender@example.com", "user@example.com", MESSAGE)
+
+
+def run(label, send, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        send()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    print(f"{label:<12} 平均 {statistics.mean(latencies):8.2f} ms  "
+          f"p50 {latencies[len(latencies) // 2]:8.2f} ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SMTP 连接池发送延迟基准")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--connect-delay-ms", type=float, default=20,
+                        help="模拟的握手/登录单程耗时（毫秒）")
+    args = parser.parse_args()
+
+    server = FakeSMTPServer(connect_delay=args.connect_delay_ms / 1000).start()
+
+    run("新建连接", lambda: send_fresh(server.port), args.messages)
+    fresh_connections = server.connections
+
+    pool = SMTPConnectionPool(
+        host="127.0.0.1", port=server.port, username="sender@example.com",
+        password="password", use_ssl=False, size=2
+    )
+    run("连接池", lambda: pool.send("sender@example.com", "user@example.com", MESSAGE), args.messages)
+    pool.close()
+
+    print(f"建立连接数：新建连接 {fresh_connections}，连接池 {server.connections - fresh_connections}")
+    print(f"连接池统计：{pool.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
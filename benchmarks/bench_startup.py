@@ -0,0 +1,103 @@
+# benchmarks/bench_startup.py
+#
+# 冷启动基准：导入耗时分解（python -X importtime）与“进程启动 -> 主菜单首帧绘制完成”的墙钟时间。
+# 每次测量都在新的子进程中进行，结果取中位数。
+# 用法: python benchmarks/bench_startup.py [--runs 10] [--top 15] [--max-ms 300]
+#
+# --max-ms 设置首帧时间（无显示环境时为 import gui 时间）的上限，超出时以非零状态退出，
+# 可用于在 CI 中发现冷启动回退。
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import REPO_ROOT, setup_workdir
+
+# 子进程：导入主界面并绘制第一帧，打印绘制完成时的时间戳（无显示环境时打印 NODISPLAY）
+FIRST_FRAME_SCRIPT = """
+import time
+import tkinter as tk
+from gui import TwoFAGUI
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("NODISPLAY", time.time())
+    raise SystemExit(0)
+TwoFAGUI(root)
+root.update()
+print("FRAME", time.time())
+root.destroy()
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_breakdown(top):
+    """
+    返回 import gui 的累计耗时最高的 top 个模块：[(累计微秒, 自身微秒, 模块名)]
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gui"],
+        capture_output=True, text=True, env=child_env(), check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def first_frame_ms():
+    """
+    在新进程中测量启动到首帧的时间（毫秒），返回 (毫秒, 是否有显示环境)。
+    """
+    start = time.time()
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_FRAME_SCRIPT],
+        capture_output=True, text=True, env=child_env(), check=True
+    )
+    tag, stamp = result.stdout.split()[-2:]
+    return (float(stamp) - start) * 1000, tag == "FRAME"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GUI 冷启动基准")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="导入耗时分解显示的模块数")
+    parser.add_argument("--max-ms", type=float, default=None, help="首帧时间上限（毫秒），超出时失败")
+    args = parser.parse_args()
+
+    print(f"import gui 累计耗时最高的 {args.top} 个模块：")
+    print(f"{'累计 ms':>10} {'自身 ms':>10}  模块")
+    for cumulative_us, self_us, name in import_breakdown(args.top):
+        print(f"{cumulative_us / 1000:>10.2f} {self_us / 1000:>10.2f}  {name}")
+
+    samples = []
+    has_display = True
+    for _ in range(args.runs):
+        ms, has_display = first_frame_ms()
+        samples.append(ms)
+
+    label = "启动到首帧" if has_display else "启动到 import gui 完成（无显示环境）"
+    median = statistics.median(samples)
+    print(f"{label}：中位数 {median:.1f} ms  最小 {min(samples):.1f} ms  "
+          f"最大 {max(samples):.1f} ms（{args.runs} 次）")
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"冷启动回退：{median:.1f} ms 超过上限 {args.max_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    setup_workdir()
+    main()
@@ -0,0 +1,284 @@
+# benchmarks/bench_suite.py
+#
+# 认证热路径基准套件：按不同用户规模生成合成用户库，测量
+#   add_user / get_user / verify_first_factor（密码、验证码）/ verify_totp /
+#   verify_recovery_code / send_code（短信、邮件，发送函数替换为空实现）/ log_login_attempt
+# 的单次延迟，结果保存为 JSON，并可与基线比较。
+#
+# 用法:
+#   python benchmarks/bench_suite.py --sizes 1000,100000 --output results.json
+#   python benchmarks/bench_suite.py --sizes 1000,100000,1000000 --baseline results.json
+#
+# 每个规模在独立的子进程和临时目录中运行，互不影响缓存与单例。
+# 与基线相比 p50 变慢超过 --tolerance 倍，或同一路径在最大与最小规模之间的 p50 之比
+# 超过 --max-scaling 倍（热路径从 O(1) 退化为 O(n) 的典型表现）时，以非零状态退出。
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from common import setup_workdir
+
+PASSWORD = "bench-password"
+GENERATE_CHUNK = 10000
+
+# 路径名 -> 说明（输出顺序即测量顺序）
+PATHS = {
+    "get_user": "按用户名读取",
+    "verify_password": "verify_first_factor（密码）",
+    "send_code_email": "send_code（邮件）",
+    "verify_code_email": "verify_first_factor（邮件验证码）",
+    "send_code_sms": "send_code（短信）",
+    "verify_code_sms": "verify_first_factor（短信验证码）",
+    "verify_totp": "verify_totp",
+    "verify_recovery_code": "verify_recovery_code",
+    "log_login_attempt": "log_login_attempt",
+    "add_user": "add_user",
+}
+
+# 每次调用都包含一次 scrypt 的路径，使用较少的次数
+SLOW_PATHS = {"verify_password", "add_user"}
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "ops": len(latencies),
+        "mean_us": statistics.mean(latencies),
+        "p50_us": latencies[len(latencies) // 2],
+        "p99_us": latencies[max(int(len(latencies) * 0.99) - 1, 0)],
+    }
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    return summarize(latencies)
+
+
+def run_worker(size, backend, ops, slow_ops, scrypt_n, seed):
+    """
+    在当前（子）进程中生成 size 个合成用户并测量各路径，返回 {"generate_s", "paths"}。
+    """
+    setup_workdir()
+
+    # 必须在导入项目模块之前修改配置
+    import config
+    config.USER_STORE_BACKEND = backend
+    config.SMS_ASYNC = False
+    if scrypt_n:
+        config.PASSWORD_SCRYPT_N = scrypt_n
+    # 基准反复访问同一批用户，放宽限流额度（仍计入检查本身的开销）
+    config.RATE_LIMITS = {name: (10 ** 12, window) for name, (_, window) in config.RATE_LIMITS.items()}
+
+    import pyotp
+    import password_kdf
+    import verification_manager
+    from data_store import get_store
+    from user_manager import add_user, get_user, verify_recovery_code
+    from verification_manager import send_code, verify_first_factor
+    from totp_manager import encrypt_secret, verify_totp
+    from logger import log_login_attempt, flush_logs
+
+    # 替换实际的发送函数，只记录最后一次发给每个联系方式的验证码
+    sent = {}
+    verification_manager.send_email_code = lambda contact, code: sent.__setitem__(contact, code)
+    verification_manager.send_sms_code = lambda contact, code: sent.__setitem__(contact, code)
+
+    # 合成用户共用同一个 TOTP 密钥与密码哈希，避免生成阶段逐个计算 scrypt
+    secret = pyotp.random_base32()
+    enc_secret = encrypt_secret(secret)
+    password_hash = password_kdf.hash_password_sync(PASSWORD)
+
+    def record(i):
+        return {
+            "secret": enc_secret,
+            "password": password_hash,
+            "email": f"user{i}@example.com",
+            "phone": f"+1555{i:07d}",
+            "recovery_codes": [f"{i:07x}{j}" for j in range(5)],
+            "failed_attempts": 0,
+            "locked_until": 0,
+            "last_verified_time": 0,
+        }
+
+    start = time.perf_counter()
+    store = get_store()
+    for offset in range(0, size, GENERATE_CHUNK):
+        store.put_many((f"user{i}", record(i)) for i in range(offset, min(offset + GENERATE_CHUNK, size)))
+    generate_s = time.perf_counter() - start
+
+    rng = random.Random(seed)
+
+    def users(n):
+        return rng.sample(range(size), min(n, size))
+
+    paths = {}
+    paths["get_user"] = time_calls(get_user, [(f"user{i}",) for i in users(ops)])
+    paths["verify_password"] = time_calls(
+        verify_first_factor, [(f"user{i}", "password", PASSWORD) for i in users(slow_ops)]
+    )
+
+    for method, contact in (("email", "user{}@example.com"), ("sms", "+1555{:07d}")):
+        targets = users(ops)
+        paths[f"send_code_{method}"] = time_calls(send_code, [(contact.format(i), method) for i in targets])
+        paths[f"verify_code_{method}"] = time_calls(
+            verify_first_factor, [(f"user{i}", method, sent[contact.format(i)]) for i in targets]
+        )
+
+    code = pyotp.TOTP(secret).now()
+    paths["verify_totp"] = time_calls(verify_totp, [(f"user{i}", code) for i in users(ops)])
+    paths["verify_recovery_code"] = time_calls(
+        verify_recovery_code, [(f"user{i}", f"{i:07x}0") for i in users(ops)]
+    )
+    paths["log_login_attempt"] = time_calls(
+        log_login_attempt, [(f"user{i}", False, "bench") for i in users(ops)]
+    )
+    flush_logs()
+    paths["add_user"] = time_calls(
+        add_user, [(f"new{k}", secret, PASSWORD) for k in range(slow_ops)]
+    )
+
+    return {"generate_s": generate_s, "paths": paths}
+
+
+def run_size(size, args):
+    """
+    在子进程中运行一个规模的测量。
+    """
+    fd, output = tempfile.mkstemp(prefix="bench-suite-", suffix=".json")
+    os.close(fd)
+    try:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--size", str(size),
+             "--backend", args.backend, "--ops", str(args.ops), "--slow-ops", str(args.slow_ops),
+             "--scrypt-n", str(args.scrypt_n or 0), "--seed", str(args.seed), "--worker-output", output],
+            check=True, stdout=subprocess.DEVNULL
+        )
+        with open(output, "r", encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(output)
+
+
+def print_results(results):
+    sizes = list(results["results"])
+    print(f"{'路径':<40}" + "".join(f"{'p50 @ ' + size:>16}" for size in sizes))
+    for path, label in PATHS.items():
+        row = [results["results"][size]["paths"][path]["p50_us"] for size in sizes]
+        print(f"{label:<40}" + "".join(f"{value:>13.1f} us" for value in row))
+    print(f"{'生成合成用户库':<40}" + "".join(
+        f"{results['results'][size]['generate_s']:>14.2f} s" for size in sizes
+    ))
+
+
+def compare(results, baseline, tolerance):
+    """
+    与基线逐项比较 p50，返回变慢超过 tolerance 倍的 (规模, 路径, 比值) 列表。
+    """
+    regressions = []
+    print(f"\n与基线比较（p50 当前 / 基线，基线时间 {baseline['meta'].get('date')}）：")
+    for size, current in results["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            continue
+        for path in PATHS:
+            if path not in base["paths"] or path not in current["paths"]:
+                continue
+            ratio = current["paths"][path]["p50_us"] / base["paths"][path]["p50_us"]
+            flag = "  <-- 变慢" if ratio > tolerance else ""
+            print(f"  {size:>8}  {PATHS[path]:<40} {ratio:6.2f}x{flag}")
+            if ratio > tolerance:
+                regressions.append((size, path, ratio))
+    return regressions
+
+
+def check_scaling(results, max_scaling):
+    """
+    比较同一路径在最大与最小规模下的 p50，返回增长超过 max_scaling 倍的路径。
+    """
+    sizes = sorted(results["results"], key=int)
+    if len(sizes) < 2:
+        return []
+    small, large = results["results"][sizes[0]], results["results"][sizes[-1]]
+    print(f"\n规模扩展（p50 @ {sizes[-1]} / p50 @ {sizes[0]}）：")
+    flagged = []
+    for path in PATHS:
+        ratio = large["paths"][path]["p50_us"] / small["paths"][path]["p50_us"]
+        flag = "  <-- 随用户数增长" if ratio > max_scaling else ""
+        print(f"  {PATHS[path]:<40} {ratio:6.2f}x{flag}")
+        if ratio > max_scaling:
+            flagged.append((path, ratio))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="认证热路径基准套件")
+    parser.add_argument("--sizes", default="1000,100000", help="用户规模，逗号分隔（如 1000,100000,1000000）")
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--ops", type=int, default=500, help="每个快速路径的调用次数")
+    parser.add_argument("--slow-ops", type=int, default=20, help="包含 scrypt 的路径的调用次数")
+    parser.add_argument("--scrypt-n", type=int, default=None, help="覆盖 PASSWORD_SCRYPT_N（默认使用配置值）")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json", help="结果输出路径")
+    parser.add_argument("--baseline", default=None, help="用于比较的基线结果文件")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="相对基线允许的 p50 变慢倍数")
+    parser.add_argument("--max-scaling", type=float, default=3.0, help="最大与最小规模之间允许的 p50 增长倍数")
+    # 以下参数仅供子进程使用
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(args.size, args.backend, args.ops, args.slow_ops, args.scrypt_n, args.seed)
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        return
+
+    results = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "ops": args.ops,
+            "slow_ops": args.slow_ops,
+            "scrypt_n": args.scrypt_n,
+        },
+        "results": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"[Bench] 规模 {size} ...", flush=True)
+        results["results"][str(size)] = run_size(size, args)
+
+    print()
+    print_results(results)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存到 {args.output}")
+
+    failed = bool(check_scaling(results, args.max_scaling))
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = bool(compare(results, baseline, args.tolerance)) or failed
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
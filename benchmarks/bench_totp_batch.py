@@ -0,0 +1,59 @@
+# benchmarks/bench_totp_batch.py
+#
+# 对比逐个调用 verify_totp 与 verify_totp_batch 的吞吐量。
+# 用法: python benchmarks/bench_totp_batch.py [--users 1000] [--submissions 20000]
+
+import argparse
+import random
+
+from common import setup_workdir, measure, report
+
+setup_workdir()
+
+# 逐个验证与批量验证都计入 TOTP 限流：基准只比较验证本身的吞吐量，放宽限额
+import config
+config.RATE_LIMITS = {name: (10 ** 12, window) for name, (_, window) in config.RATE_LIMITS.items()}
+
+import pyotp
+
+from data_store import get_store
+from totp_manager import verify_totp, verify_totp_batch, encrypt_secret, purge_totp_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TOTP 批量验证吞吐量基准")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--submissions", type=int, default=20000)
+    args = parser.parse_args()
+
+    # 直接写入合成用户记录，避免逐个 add_user 的密码哈希开销
+    secrets = {f"user{i}": pyotp.random_base32() for i in range(args.users)}
+    get_store().put_many(
+        (username, {"secret": encrypt_secret(secret), "failed_attempts": 0})
+        for username, secret in secrets.items()
+    )
+
+    # 一半正确、一半错误的提交，用户名随机重复（同一用户一个周期内多次提交）
+    usernames = list(secrets)
+    items = []
+    for _ in range(args.submissions):
+        username = random.choice(usernames)
+        code = pyotp.TOTP(secrets[username]).now() if random.random() < 0.5 else "000000"
+        items.append((username, code))
+
+    def loop():
+        return [verify_totp(username, code) for username, code in items]
+
+    def batch():
+        return verify_totp_batch(items)
+
+    assert loop() == batch(), "批量结果与逐个验证不一致"
+
+    for label, fn in (("verify_totp 逐个调用", loop), ("verify_totp_batch", batch)):
+        purge_totp_cache()
+        report(label + "（冷缓存）", len(items), measure(fn))
+        report(label + "（热缓存）", len(items), measure(fn))
+
+
+if __name__ == "__main__":
+    main()
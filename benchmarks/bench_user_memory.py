@@ -0,0 +1,113 @@
+# benchmarks/bench_user_memory.py
+#
+# 整表加载后的内存占用：普通 dict 与 UserRecord 每个用户占用的字节数，
+# 经 load_users() 从 SQLite 存储加载时的占用与峰值，以及两种表示的字段读取耗时。
+# 用法: python benchmarks/bench_user_memory.py [--users 100000]
+
+import argparse
+import base64
+import json
+import os
+import tracemalloc
+
+from common import setup_workdir, measure, report
+
+setup_workdir()
+
+from user_record import UserRecord
+
+
+def synthetic_rows(count):
+    """
+    生成与真实记录大小相同的 JSON 行（Fernet 密文、scrypt 哈希、邮箱、手机号、5 个恢复码）。
+    """
+    from totp_manager import encrypt_secret, generate_secret
+
+    # 所有用户使用各自不同的随机值，避免字符串被共享而低估占用
+    for i in range(count):
+        salt = base64.b64encode(os.urandom(16)).decode()
+        digest = base64.b64encode(os.urandom(32)).decode()
+        yield f"user{i:07d}", json.dumps({
+            "secret": encrypt_secret(generate_secret()),
+            "password": f"scrypt$16384$8$1${salt}${digest}",
+            "email": f"user{i:07d}@example.com",
+            "phone": f"+8613{i:09d}",
+            "recovery_codes": [os.urandom(4).hex() for _ in range(5)],
+            "failed_attempts": 0,
+            "locked_until": 0,
+            "last_verified_time": 0,
+        }, separators=(",", ":"))
+
+
+def traced(build):
+    """
+    执行 build()，返回 (结果, 结果占用的字节数, 执行期间的峰值字节数)。
+    """
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户记录内存占用基准")
+    parser.add_argument("--users", type=int, default=100000)
+    args = parser.parse_args()
+    n = args.users
+
+    rows = list(synthetic_rows(n))
+
+    # 与 SQLite 后端一致：每行单独 json.loads，字段名字符串每条记录各一份
+    dicts, dict_bytes, _ = traced(lambda: {username: json.loads(data) for username, data in rows})
+    records, record_bytes, _ = traced(
+        lambda: {username: UserRecord.from_dict(json.loads(data)) for username, data in rows}
+    )
+    # 用户名字符串两种表示都需要，单独计算以便给出“每条记录”的占用
+    _, key_bytes, _ = traced(lambda: {username: None for username, _ in rows})
+
+    print(f"{n} 个用户（含用户名与外层字典）：")
+    print(f"  dict        {dict_bytes / 1024 / 1024:8.1f} MiB  每个用户 {dict_bytes / n:6.0f} 字节  "
+          f"（不含用户名 {(dict_bytes - key_bytes) / n:.0f} 字节）")
+    print(f"  UserRecord  {record_bytes / 1024 / 1024:8.1f} MiB  每个用户 {record_bytes / n:6.0f} 字节  "
+          f"（不含用户名 {(record_bytes - key_bytes) / n:.0f} 字节）")
+    print(f"  节省 {(1 - record_bytes / dict_bytes) * 100:.0f}%，按此估算 100 万用户："
+          f"dict {dict_bytes / n * 1e6 / 1024 ** 3:.2f} GiB，UserRecord {record_bytes / n * 1e6 / 1024 ** 3:.2f} GiB")
+
+    # 两种表示的内容一致
+    sample = rows[0][0]
+    assert records[sample].to_dict() == dicts[sample]
+
+    # 字段读取耗时
+    user, record = dicts[sample], records[sample]
+    count = 200000
+    print()
+    report("dict['secret']", count, measure(lambda: user["secret"], count))
+    report("UserRecord['secret']（还原为文本）", count, measure(lambda: record["secret"], count))
+    report("dict['email']", count, measure(lambda: user["email"], count))
+    report("UserRecord['email']", count, measure(lambda: record["email"], count))
+    report("UserRecord['recovery_codes']", count, measure(lambda: record["recovery_codes"], count))
+    del dicts, records
+
+    # 经 load_users() 从 SQLite 存储整表加载
+    import config
+    config.USER_STORE_BACKEND = "sqlite"
+    config.USER_CACHE_SIZE = 0
+    from data_store import get_store, load_users
+
+    store = get_store()
+    for offset in range(0, n, 10000):
+        store.put_many((username, json.loads(data)) for username, data in rows[offset:offset + 10000])
+    del rows
+
+    print()
+    for compact in (False, True):
+        users, used, peak = traced(lambda: load_users(compact=compact))
+        label = "UserRecord" if compact else "dict"
+        print(f"load_users(compact={compact!s:<5}) {label:<10} 占用 {used / 1024 / 1024:7.1f} MiB  "
+              f"峰值 {peak / 1024 / 1024:7.1f} MiB  每个用户 {used / len(users):.0f} 字节")
+        del users
+
+
+if __name__ == "__main__":
+    main()
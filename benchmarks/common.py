@@ -0,0 +1,43 @@
+# benchmarks/common.py
+
+import os
+import sys
+import tempfile
+import time
+
+# 仓库根目录加入模块搜索路径，使基准脚本可以直接 import 项目模块
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def setup_workdir(prefix="2fa-bench-"):
+    """
+    切换到一个临时工作目录（配置中的数据文件均为相对路径，不会碰到真实数据），
+    并在未设置 FERNET_KEY 时生成一个临时密钥。必须在导入项目模块之前调用。
+
+    返回值:
+        str: 临时目录路径
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    os.chdir(workdir)
+
+    if not os.getenv("FERNET_KEY"):
+        from cryptography.fernet import Fernet
+        os.environ["FERNET_KEY"] = Fernet.generate_key().decode()
+    return workdir
+
+
+def measure(fn, repeat=1):
+    """
+    执行 fn repeat 次，返回总耗时（秒）。
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return time.perf_counter() - start
+
+
+def report(name, count, seconds):
+    print(f"{name:<40} {count:>8} 次  {seconds * 1000:>10.2f} ms  "
+          f"{count / seconds if seconds else float('inf'):>12.0f} 次/秒")
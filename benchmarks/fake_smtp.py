@@ -0,0 +1,68 @@
+# benchmarks/fake_smtp.py
+#
+# 本地 SMTP 替身：只实现 smtplib 发送一封邮件所需的最少命令，
+# 可通过 connect_delay 模拟 TLS 握手 + 登录的往返耗时。
+
+import socketserver
+import threading
+import time
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        time.sleep(server.connect_delay)
+        with server.lock:
+            server.connections += 1
+        self.reply("220 localhost fake smtp")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN LOGIN")
+            elif verb == "AUTH":
+                time.sleep(server.connect_delay)
+                self.reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self.reply("250 OK queued")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay=0.0):
+        super().__init__(("127.0.0.1", 0), FakeSMTPHandler)
+        self.connect_delay = connect_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
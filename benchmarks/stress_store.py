@@ -0,0 +1,102 @@
+# benchmarks/stress_store.py
+#
+# 多进程并发写入压力测试：N 个工作进程同时对一组用户执行
+#   - 失败次数加一（读 - 改 - 写事务）
+#   - 消耗恢复码（每个恢复码只能被成功消耗一次）
+# 结束后核对：每个用户的失败次数等于所有进程累计的加一次数，每个恢复码恰好被消耗一次。
+# 用法: python benchmarks/stress_store.py [--backend sqlite|json] [--processes 8] [--ops 200] [--users 8]
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from common import setup_workdir
+
+CODES_PER_USER = 20
+
+
+def worker(workdir, backend, usernames, ops, seed):
+    os.chdir(workdir)
+    import config
+    config.USER_STORE_BACKEND = backend
+
+    from user_manager import increment_failed_attempts, verify_recovery_code
+
+    rng = random.Random(seed)
+    increments = Counter()
+    consumed = []
+    for i in range(ops):
+        username = rng.choice(usernames)
+        increment_failed_attempts(username)
+        increments[username] += 1
+
+        # 所有进程按相同顺序争抢同一批恢复码
+        code = f"{username}-{i % CODES_PER_USER}"
+        if verify_recovery_code(username, code):
+            consumed.append(code)
+    return increments, consumed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程用户存储压力测试（检查丢失更新）")
+    parser.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="每个进程的操作次数")
+    parser.add_argument("--users", type=int, default=8, help="用户数越少，同一用户上的争用越多")
+    args = parser.parse_args()
+
+    workdir = setup_workdir()
+    import config
+    config.USER_STORE_BACKEND = args.backend
+    from data_store import get_store
+
+    usernames = [f"user{i}" for i in range(args.users)]
+    get_store().put_many(
+        (username, {
+            "failed_attempts": 0,
+            "locked_until": 0,
+            "recovery_codes": [f"{username}-{i}" for i in range(CODES_PER_USER)],
+        })
+        for username in usernames
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(
+            worker,
+            [(workdir, args.backend, usernames, args.ops, seed) for seed in range(args.processes)]
+        )
+    elapsed = time.perf_counter() - start
+
+    increments = Counter()
+    consumed = Counter()
+    for worker_increments, worker_consumed in results:
+        increments.update(worker_increments)
+        consumed.update(worker_consumed)
+
+    store = get_store()
+    lost_increments = 0
+    for username in usernames:
+        user = store.get(username)
+        lost_increments += increments[username] - user["failed_attempts"]
+        if user["recovery_codes"]:
+            print(f"{username} 仍有未被消耗的恢复码：{user['recovery_codes']}")
+
+    double_spent = sum(count - 1 for count in consumed.values() if count > 1)
+    total_ops = args.processes * args.ops
+    print(f"后端 {args.backend}，{args.processes} 个进程 x {args.ops} 次操作，{args.users} 个用户："
+          f"{elapsed:.2f} s（{total_ops / elapsed:.0f} 次/秒）")
+    print(f"丢失的失败次数更新：{lost_increments}  被重复消耗的恢复码：{double_spent}  "
+          f"被消耗的恢复码：{len(consumed)} / {args.users * CODES_PER_USER}")
+
+    if lost_increments or double_spent:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
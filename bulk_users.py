@@ -0,0 +1,503 @@
+# bulk_users.py
+#
+# 批量导入 / 导出用户（CSV 或 JSONL，按扩展名识别，也可用 --format 指定）。
+# 用法:
+#   python bulk_users.py import users.csv [--workers 8] [--chunk-size 1000]
+#   python bulk_users.py export users.jsonl
+#
+# 导入的每行字段：
+#   username            必填
+#   password            明文密码（导入时计算 scrypt 哈希），或 password_hash（已有哈希，原样保存）
+#   secret              TOTP 密钥（Base32 明文，导入时加密），或 encrypted_secret（已加密，原样保存）；
+#                       都没有时生成新密钥
+#   email / phone       可选，不能与已有用户重复
+#   recovery_codes      可选（CSV 中以 ; 分隔），没有时生成
+#   failed_attempts / locked_until / last_verified_time   可选
+# 导出的字段与上面一致（password_hash、encrypted_secret），导出文件可以直接再导入。
+#
+# 密码哈希、密钥加密与恢复码生成在进程池中完成；主进程按批检查重名与联系方式冲突，
+# 每批在一个事务中写入，并把进度记录到检查点文件（默认 <输入文件>.progress），
+# 中断后再次运行同一命令会从上次提交的位置继续。被拒绝的行写入 <输入文件>.rejected.jsonl。
+# 每批写入前先在检查点中记下写入意图（各用户记录的指纹）：写入之后、保存进度之前中断时，
+# 下次运行据此确认该批已提交并补记进度，不会把已导入的用户当作重名拒绝。
+# 检查之后其他进程抢先绑定了同一邮箱/手机号时，存储的唯一约束会拒绝整批写入，此时该批逐行重试，
+# 只拒绝冲突的行。
+#
+# JSON 存储后端每批都要重写整个文件，大规模导入前请先切换到 sqlite 后端。
+
+import argparse
+import base64
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyotp
+
+# 导入存储引擎
+from data_store import get_store
+
+# 导入加密器、密码哈希与恢复码生成
+from crypto_utils import get_fernet
+import password_kdf
+from user_manager import generate_recovery_codes
+
+# 导入检查点写入与工作进程初始化
+from job_utils import save_json_atomic, init_worker
+
+# 导入批量导入配置
+from config import BULK_CHUNK_SIZE, BULK_WORKERS
+
+# 导出（以及可原样导入）的字段顺序
+EXPORT_FIELDS = (
+    "username", "email", "phone", "password_hash", "encrypted_secret",
+    "recovery_codes", "failed_attempts", "locked_until", "last_verified_time",
+)
+
+# 至少间隔多少秒输出一次进度
+PROGRESS_INTERVAL = 5
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return "csv"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    raise ValueError(f"无法从扩展名判断文件格式：{path}（请使用 --format csv / jsonl）")
+
+
+def read_rows(path, fmt):
+    """
+    逐行读取输入文件，生成 dict（不会把整个文件读入内存）。
+    JSONL 中无法解析的行生成 None，由 prepare_user 拒绝，不中断整个导入。
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+
+
+def _optional(row, field):
+    # CSV 中的空单元格视为未提供
+    value = row.get(field)
+    return value if value not in (None, "") else None
+
+
+def _text_field(row, field):
+    # JSONL 中的字段可能是任意 JSON 类型，文本字段只接受字符串
+    value = _optional(row, field)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{field} 必须是字符串")
+    return value
+
+
+def _number_field(row, field):
+    # 时间戳保留小数部分；整数值仍保存为 int，与 add_user 写入的记录一致
+    value = _optional(row, field)
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        raise ValueError(f"{field} 不是数字")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} 不是数字")
+    if not math.isfinite(number):
+        raise ValueError(f"{field} 不是数字")
+    return int(number) if number.is_integer() else number
+
+
+def _int_field(row, field):
+    return int(_number_field(row, field))
+
+
+def prepare_user(row):
+    """
+    把一行输入转换为 (username, 用户记录)：计算密码哈希、加密 TOTP 密钥、生成恢复码。
+    在工作进程中执行，不访问存储。
+    异常:
+        ValueError: 行内容无效
+    """
+    if not isinstance(row, dict):
+        raise ValueError("该行不是合法的 JSON 对象")
+
+    username = (_text_field(row, "username") or "").strip()
+    if not username:
+        raise ValueError("缺少用户名")
+
+    if _text_field(row, "password_hash"):
+        password = row["password_hash"]
+    elif _text_field(row, "password"):
+        password = password_kdf.hash_password_sync(row["password"])
+    else:
+        raise ValueError("缺少密码")
+
+    if _text_field(row, "encrypted_secret"):
+        secret = row["encrypted_secret"]
+    else:
+        plain = (_text_field(row, "secret") or pyotp.random_base32()).replace(" ", "").upper()
+        try:
+            base64.b32decode(plain + "=" * (-len(plain) % 8))
+        except ValueError:
+            raise ValueError("TOTP 密钥不是有效的 Base32 字符串")
+        secret = get_fernet().encrypt(plain.encode()).decode()
+
+    codes = _optional(row, "recovery_codes")
+    if codes is None:
+        codes = generate_recovery_codes()
+    elif isinstance(codes, str):
+        codes = [code for code in codes.split(";") if code]
+    elif not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        raise ValueError("recovery_codes 必须是字符串列表")
+
+    # 字段顺序与 user_manager.add_user 一致
+    return username, {
+        "secret": secret,
+        "password": password,
+        "email": _text_field(row, "email"),
+        "phone": _text_field(row, "phone"),
+        "recovery_codes": list(codes),
+        "failed_attempts": _int_field(row, "failed_attempts"),
+        "locked_until": _number_field(row, "locked_until"),
+        "last_verified_time": _number_field(row, "last_verified_time"),
+    }
+
+
+def _prepare_chunk(start, rows):
+    """
+    工作进程：处理一批行，返回 [(行号, username, 记录或 None, 拒绝原因或 None), ...]。
+    任何一行出错都只拒绝该行，不影响同一批的其他行。
+    """
+    results = []
+    for number, row in enumerate(rows, start):
+        try:
+            username, user = prepare_user(row)
+            results.append((number, username, user, None))
+        except ValueError as e:
+            results.append((number, _row_username(row), None, str(e)))
+        except Exception as e:
+            results.append((number, _row_username(row), None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _row_username(row):
+    username = row.get("username") if isinstance(row, dict) else None
+    return username if isinstance(username, str) else None
+
+
+def _chunks(rows, size, start):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield start, chunk
+            start += len(chunk)
+            chunk = []
+    if chunk:
+        yield start, chunk
+
+
+def record_fingerprint(user):
+    """
+    用户记录的指纹：记录中含随机盐与随机 IV，指纹相同即可认定是同一次导入写入的记录。
+    """
+    data = json.dumps(user, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=dict)
+    return hashlib.sha256(data.encode()).hexdigest()[:32]
+
+
+def commit_chunk(store, prepared, before_write=None, imported_before=()):
+    """
+    在一批用户的锁内检查冲突并一次写入；before_write(accepted, rejected) 在写入前调用（用于记录写入意图）。
+    整批写入被存储拒绝（并发绑定了相同的联系方式）时逐行重试，仍失败的行按存储给出的原因拒绝。
+    imported_before 为上次中断前本次导入已经写入的用户名，这些行计为已导入，不再写入。
+    返回值:
+        (int, list): 导入的用户数，以及 [(行号, username, 拒绝原因), ...]
+    """
+    rejected = [(number, username, reason) for number, username, user, reason in prepared if user is None]
+    candidates = [(number, username, user) for number, username, user, _ in prepared if user is not None]
+
+    accepted = []
+    numbers = {}
+    restored = 0
+    with store.lock_users([username for _, username, _ in candidates]):
+        seen = {"username": set(), "email": set(), "phone": set()}
+        for number, username, user in candidates:
+            if username in imported_before and username not in seen["username"]:
+                seen["username"].add(username)
+                restored += 1
+                continue
+            if username in seen["username"] or store.exists(username):
+                rejected.append((number, username, "用户已存在"))
+                continue
+            reason = None
+            for field, label in (("email", "邮箱"), ("phone", "手机号")):
+                value = user.get(field)
+                if value and (value in seen[field] or store.find_by_contact(field, value) is not None):
+                    reason = f"该{label}已被其他用户绑定"
+                    break
+            if reason:
+                rejected.append((number, username, reason))
+                continue
+
+            seen["username"].add(username)
+            for field in ("email", "phone"):
+                if user.get(field):
+                    seen[field].add(user[field])
+            accepted.append((username, user))
+            numbers[username] = number
+
+        rejected.sort()
+        written = 0
+        if accepted:
+            if before_write is not None:
+                before_write(accepted, rejected)
+            try:
+                store.put_many(accepted)
+                written = len(accepted)
+            except ValueError:
+                # put_many 是原子的：整批都没有写入，逐行重试
+                for username, user in accepted:
+                    try:
+                        store.put(username, user)
+                        written += 1
+                    except ValueError as e:
+                        rejected.append((numbers[username], username, str(e)))
+                rejected.sort()
+
+    return restored + written, rejected
+
+
+def _load_checkpoint(path, source):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != source:
+        raise ValueError(f"检查点 {path} 属于另一个输入文件：{checkpoint.get('input')}")
+    return checkpoint
+
+
+def _committed_users(store, intent):
+    """
+    写入意图中已按意图写入的用户名（整批写入时要么全部写入、要么都没有；逐行重试时可能只写入一部分）。
+    """
+    committed = set()
+    for username, fingerprint in intent["users"].items():
+        user = store.get(username)
+        if user is not None and record_fingerprint(user) == fingerprint:
+            committed.add(username)
+    return committed
+
+
+def import_users(path, fmt=None, workers=BULK_WORKERS, chunk_size=BULK_CHUNK_SIZE,
+                 checkpoint_path=None, rejects_path=None, restart=False):
+    """
+    从 CSV / JSONL 文件批量导入用户，可中断后继续。
+
+    返回值:
+        dict: {"rows", "imported", "rejected", "seconds"}（rows / imported / rejected 含之前运行的部分）
+    """
+    fmt = detect_format(path, fmt)
+    source = os.path.abspath(path)
+    checkpoint_path = checkpoint_path or path + ".progress"
+    rejects_path = rejects_path or path + ".rejected.jsonl"
+    workers = workers or os.cpu_count() or 1
+
+    # 主进程先检查一次 FERNET_KEY，避免工作进程逐个失败
+    get_fernet()
+    store = get_store()
+
+    checkpoint = None if restart else _load_checkpoint(checkpoint_path, source)
+    if checkpoint is None:
+        checkpoint = {"input": source, "rows": 0, "imported": 0, "rejected": 0, "rejects_bytes": 0}
+        if os.path.exists(rejects_path):
+            os.remove(rejects_path)
+    else:
+        print(f"[BulkUsers] 从检查点继续：已处理 {checkpoint['rows']} 行")
+        # 丢弃上次保存进度之后才写入的拒绝记录，避免重复
+        if os.path.exists(rejects_path):
+            with open(rejects_path, "r+b") as f:
+                f.truncate(checkpoint.get("rejects_bytes", os.path.getsize(rejects_path)))
+
+    rejects_file = None
+
+    def finish_chunk(rows, imported, rejected):
+        # 一批已提交：追加拒绝记录并保存进度（同时清除写入意图）
+        nonlocal rejects_file
+        if rejected:
+            if rejects_file is None:
+                rejects_file = open(rejects_path, "a", encoding="utf-8")
+            for number, username, reason in rejected:
+                rejects_file.write(json.dumps(
+                    {"row": number, "username": username, "reason": reason}, ensure_ascii=False
+                ) + "\n")
+            rejects_file.flush()
+            checkpoint["rejects_bytes"] = rejects_file.tell()
+
+        checkpoint.pop("committing", None)
+        checkpoint["rows"] += rows
+        checkpoint["imported"] += imported
+        checkpoint["rejected"] += len(rejected)
+        save_json_atomic(checkpoint_path, checkpoint)
+
+    imported_before = set()
+    intent = checkpoint.get("committing")
+    if intent is not None:
+        committed = _committed_users(store, intent)
+        if committed and len(committed) == len(intent["users"]):
+            # 上次在写入之后、保存进度之前中断：该批已导入，补记进度
+            print(f"[BulkUsers] 上次中断前的一批（{intent['rows']} 行）已提交，补记进度")
+            finish_chunk(intent["rows"], len(intent["users"]), [tuple(item) for item in intent["rejected"]])
+        else:
+            # 该批没有写入，或在逐行重试时中断：重新处理，已写入的用户计为导入
+            imported_before = committed
+            del checkpoint["committing"]
+
+    rows = read_rows(path, fmt)
+    for _ in range(checkpoint["rows"]):
+        next(rows, None)
+
+    start_rows = checkpoint["rows"]
+    start = last_report = time.perf_counter()
+    pending = deque()
+
+    def commit(future):
+        nonlocal last_report
+        prepared = future.result()
+
+        def record_intent(accepted, rejected):
+            checkpoint["committing"] = {
+                "rows": len(prepared),
+                "rejected": rejected,
+                "users": {username: record_fingerprint(user) for username, user in accepted},
+            }
+            save_json_atomic(checkpoint_path, checkpoint)
+
+        imported, rejected = commit_chunk(store, prepared, record_intent, imported_before)
+        imported_before.clear()
+        finish_chunk(len(prepared), imported, rejected)
+
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            rate = (checkpoint["rows"] - start_rows) / (now - start)
+            print(f"[BulkUsers] 已处理 {checkpoint['rows']} 行（导入 {checkpoint['imported']}，"
+                  f"拒绝 {checkpoint['rejected']}），{rate:.0f} 行/秒", flush=True)
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    try:
+        # 行号从 1 开始（不含 CSV 表头）；最多保留 2 * workers 批在途，内存占用与输入大小无关
+        for first, chunk in _chunks(rows, chunk_size, checkpoint["rows"] + 1):
+            pending.append(executor.submit(_prepare_chunk, first, chunk))
+            if len(pending) >= workers * 2:
+                commit(pending.popleft())
+        # 按提交顺序写入，检查点之前的行都已落盘
+        while pending:
+            commit(pending.popleft())
+    finally:
+        # 中断时丢弃尚未开始的批次，下次从检查点重新处理
+        executor.shutdown(cancel_futures=True)
+        if rejects_file is not None:
+            rejects_file.close()
+
+    os.remove(checkpoint_path)
+    seconds = time.perf_counter() - start
+    print(f"[BulkUsers] 导入完成：共 {checkpoint['rows']} 行，导入 {checkpoint['imported']}，"
+          f"拒绝 {checkpoint['rejected']}，本次耗时 {seconds:.1f} s")
+    if checkpoint["rejected"]:
+        print(f"[BulkUsers] 被拒绝的行见 {rejects_path}")
+    return {
+        "rows": checkpoint["rows"],
+        "imported": checkpoint["imported"],
+        "rejected": checkpoint["rejected"],
+        "seconds": seconds,
+    }
+
+
+def export_row(username, user):
+    return {
+        "username": username,
+        "email": user.get("email"),
+        "phone": user.get("phone"),
+        "password_hash": user.get("password"),
+        "encrypted_secret": user.get("secret"),
+        "recovery_codes": user.get("recovery_codes", []),
+        "failed_attempts": user.get("failed_attempts", 0),
+        "locked_until": user.get("locked_until", 0),
+        "last_verified_time": user.get("last_verified_time", 0),
+    }
+
+
+def export_users(path, fmt=None):
+    """
+    把所有用户逐条写出到 CSV / JSONL 文件（SQLite 后端按游标逐行读取，不整表载入内存）。
+    密钥保持加密状态，密码只导出哈希。
+
+    返回值:
+        int: 导出的用户数
+    """
+    fmt = detect_format(path, fmt)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+        for username, user in get_store().iter_items():
+            row = export_row(username, user)
+            if writer is not None:
+                row["recovery_codes"] = ";".join(row["recovery_codes"])
+                writer.writerow(row)
+            else:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+
+    print(f"[BulkUsers] 已导出 {count} 个用户到 {path}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入 / 导出用户")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="从 CSV / JSONL 文件导入用户")
+    p_import.add_argument("path")
+    p_import.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    p_import.add_argument("--workers", type=int, default=BULK_WORKERS, help="工作进程数（0 表示 CPU 核数）")
+    p_import.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="每批提交的用户数")
+    p_import.add_argument("--checkpoint", default=None, help="进度文件路径（默认 <输入文件>.progress）")
+    p_import.add_argument("--rejects", default=None, help="被拒绝行的输出路径（默认 <输入文件>.rejected.jsonl）")
+    p_import.add_argument("--restart", action="store_true", help="忽略已有进度，从头开始")
+
+    p_export = sub.add_parser("export", help="导出所有用户到 CSV / JSONL 文件")
+    p_export.add_argument("path")
+    p_export.add_argument("--format", choices=["csv", "jsonl"], default=None)
+
+    args = parser.parse_args()
+    try:
+        if args.command == "import":
+            import_users(args.path, args.format, args.workers, args.chunk_size,
+                         args.checkpoint, args.rejects, args.restart)
+        else:
+            export_users(args.path, args.format)
+    except ValueError as e:
+        print(f"[BulkUsers] {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
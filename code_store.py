@@ -0,0 +1,222 @@
+# code_store.py
+
+import heapq
+import hmac
+import sqlite3
+import threading
+import time
+
+# 导入验证码有效期与存储后端配置
+from config import VERIFICATION_CODE_EXPIRY, CODE_STORE_BACKEND, CODE_DB_FILE
+
+# 导入指标采集
+import metrics
+
+
+def code_key(username, method):
+    """
+    登录验证码的存储键：每个用户每种发送方式同时只有一个有效验证码。
+    """
+    return f"{method}:{username}"
+
+
+class CodeStore:
+    """
+    一次性验证码存储接口：
+
+    - put：保存验证码，ttl 秒后过期（覆盖同一键上的旧验证码）；
+    - consume：验证码匹配且未过期时删除并返回 True，每个验证码只能成功使用一次；
+      不匹配时保留，用户可以重新输入。
+    """
+
+    def put(self, key, code, ttl=VERIFICATION_CODE_EXPIRY):
+        raise NotImplementedError
+
+    def consume(self, key, code):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """
+        清理已过期的验证码，返回清理的条数。
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemoryCodeStore(CodeStore):
+    """
+    进程内验证码存储：字典保存当前验证码，最小堆按过期时间排序。
+
+    每次写入时顺带从堆顶弹出已过期的条目，不需要后台线程，
+    内存占用与有效期内发出的验证码数量成正比。验证码只存在于当前进程，
+    多进程部署（如多个认证服务进程）请使用 SQLiteCodeStore。
+    """
+
+    def __init__(self):
+        self._codes = {}   # key -> (code, 过期时间, 版本号)
+        self._heap = []    # (过期时间, 版本号, key)；被覆盖或已消耗的条目在弹出时按版本号识别并跳过
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        removed = 0
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, version, key = heapq.heappop(heap)
+            entry = self._codes.get(key)
+            if entry is not None and entry[2] == version:
+                del self._codes[key]
+                removed += 1
+        return removed
+
+    def put(self, key, code, ttl=VERIFICATION_CODE_EXPIRY):
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            self._version += 1
+            expires_at = now + ttl
+            self._codes[key] = (code, expires_at, self._version)
+            heapq.heappush(self._heap, (expires_at, self._version, key))
+
+    def consume(self, key, code):
+        with self._lock:
+            entry = self._codes.get(key)
+            if entry is None:
+                metrics.event("code_missing")
+                return False
+            stored, expires_at, _ = entry
+            if expires_at <= time.monotonic():
+                del self._codes[key]
+                metrics.event("code_expired")
+                return False
+            if not hmac.compare_digest(str(code).encode(), stored.encode()):
+                metrics.event("code_mismatch")
+                return False
+            del self._codes[key]
+            metrics.event("code_ok")
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._codes.pop(key, None)
+
+    def purge_expired(self):
+        with self._lock:
+            return self._purge(time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._codes)
+
+
+class SQLiteCodeStore(CodeStore):
+    """
+    持久化验证码存储：进程重启后仍有效，且可由多个进程共享。
+    consume 用一条带条件的 DELETE 完成“比对 + 删除”，多个进程同时提交同一验证码时只有一个成功。
+    过期时间使用墙钟时间（time.time），以便跨进程比较。
+    """
+
+    # 每写入多少次顺带清理一次过期验证码
+    PURGE_EVERY = 256
+
+    def __init__(self, path=CODE_DB_FILE):
+        self.path = path
+        self._local = threading.local()  # sqlite3 连接不能跨线程共享，每个线程一个
+        self._puts = 0
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS codes ("
+                "key TEXT PRIMARY KEY, "
+                "code TEXT NOT NULL, "
+                "expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_codes_expires ON codes (expires_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level="IMMEDIATE")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, key, code, ttl=VERIFICATION_CODE_EXPIRY):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO codes (key, code, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET code = excluded.code, expires_at = excluded.expires_at",
+                (key, code, time.time() + ttl)
+            )
+        self._puts += 1
+        if self._puts % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def consume(self, key, code):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM codes WHERE key = ? AND code = ? AND expires_at > ?",
+                (key, str(code), time.time())
+            )
+        if cursor.rowcount == 1:
+            metrics.event("code_ok")
+            return True
+        if metrics.ENABLED:
+            self._count_failure(conn, key)
+        return False
+
+    def _count_failure(self, conn, key):
+        # 仅在采集指标时多查一次，区分失败原因
+        row = conn.execute("SELECT expires_at FROM codes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            metrics.event("code_missing")
+        elif row[0] <= time.time():
+            metrics.event("code_expired")
+        else:
+            metrics.event("code_mismatch")
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM codes WHERE key = ?", (key,))
+
+    def purge_expired(self):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute("DELETE FROM codes WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM codes WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_code_store():
+    """
+    获取当前配置的验证码存储（进程内单例）。
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if CODE_STORE_BACKEND == "memory":
+                    _store = MemoryCodeStore()
+                elif CODE_STORE_BACKEND == "sqlite":
+                    _store = SQLiteCodeStore(CODE_DB_FILE)
+                else:
+                    raise ValueError(f"不支持的验证码存储后端：{CODE_STORE_BACKEND}")
+    return _store
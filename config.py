@@ -1,34 +1,158 @@
 # config.py
 
-from dotenv import load_dotenv
-import os
-
-# 加载 .env 文件中的环境变量
-load_dotenv()
-
 # 验证码有效期（秒）
 VERIFICATION_CODE_EXPIRY = 300
 
-# 日志文件路径
+# 登录验证码存储："memory"（进程内，重启后失效）或 "sqlite"（持久化，可由多个进程共享）
+CODE_STORE_BACKEND = "memory"
+CODE_DB_FILE = "codes.db"
+
+# 旧版日志文件路径（JSON 数组格式，首次写日志时自动转换到 LOG_DIR）
 LOG_FILE = "login_logs.json"
 
+# 登录日志目录：追加写入的 JSON Lines 分段文件
+LOG_DIR = "login_logs"
+
+# 日志分段滚动条件：单段大小上限（字节）与单段时间跨度上限（秒）
+LOG_SEGMENT_MAX_BYTES = 10 * 1024 * 1024
+LOG_SEGMENT_MAX_AGE = 24 * 3600
+
+# 异步日志：开启后登录路径只把日志放入内存队列，由后台线程批量写盘
+LOG_ASYNC = False
+LOG_QUEUE_SIZE = 10000          # 队列容量（条）
+LOG_BATCH_SIZE = 256            # 攒够多少条立即写盘
+LOG_FLUSH_INTERVAL = 0.2        # 最长攒批时间（秒）
+LOG_BACKPRESSURE = "block"      # 队列满时的策略："block" / "drop_oldest" / "drop_new"
+
 # 邮件配置（替换为自己的相关信息）
 EMAIL_SENDER = "邮箱"
 EMAIL_PASSWORD = "授权码/应用码"
 
+# SMTP 服务器与连接池配置
+SMTP_HOST = "smtp.qq.com"
+SMTP_PORT = 587
+SMTP_USE_SSL = True
+SMTP_TIMEOUT = 10               # 连接与读写超时（秒）
+SMTP_POOL_SIZE = 4              # 最多同时保持的已登录会话数
+SMTP_MAX_IDLE = 60              # 会话空闲超过该时间（秒）后不再复用
+SMTP_MAX_AGE = 600              # 会话最长存活时间（秒）
+SMTP_MAX_USES = 100             # 单个会话最多发送的邮件数
+SMTP_CHECK_AFTER = 5            # 会话空闲超过该时间（秒）后复用前先发 NOOP 检查
+
 # Twilio 配置（替换为自己的相关信息）
 TWILIO_SID = "twilio-sid"
 TWILIO_TOKEN = "twilio-token"
 TWILIO_PHONE = "twilio-phone"
 
+# 短信供应商（按默认优先级排列）与路由配置
+SMS_PROVIDERS = ["twilio", "aliyun"]
+SMS_HEDGE_AFTER = None          # 首选供应商超过该时间（秒）未返回时向下一个供应商对冲发送，None 表示不对冲
+SMS_EWMA_ALPHA = 0.2            # 延迟/错误率滑动平均的权重
+SMS_PROVIDER_MAX_FAILURES = 3   # 连续失败达到该次数后暂停使用该供应商
+SMS_PROVIDER_COOLDOWN = 30      # 暂停时长（秒）
+
+# 短信发送管道：开启异步后 send_code 只入队即返回，由工作线程发送
+SMS_ASYNC = True
+SMS_WORKERS = 4                 # 发送线程数
+SMS_QUEUE_SIZE = 1000           # 待发送队列容量
+SMS_MAX_RETRIES = 3             # 临时性错误最多重试次数
+SMS_RETRY_BASE_DELAY = 0.5      # 首次重试等待（秒），之后指数增长
+SMS_RETRY_MAX_DELAY = 8         # 单次重试等待上限（秒）
+SMS_RATE_LIMIT = 1.0            # 供应商允许的平均发送速率（条/秒）
+SMS_RATE_BURST = 5              # 允许的瞬时突发条数
+
 # # 加密密钥
 # FERNET_KEY = os.getenv("FERNET_KEY")
 # if not FERNET_KEY:
 #     raise ValueError("未设置 FERNET_KEY")
+# 更换密钥：在 .env 中设置 FERNET_KEYS=新密钥,旧密钥（新密钥在前），重启服务后运行 python key_rotation.py，
+# 完成后即可删除旧密钥
+
+# 密钥轮换（key_rotation.py）：每批重新加密的用户数、两批之间的暂停（秒，避免占满存储影响登录）与进度文件
+KEY_ROTATION_BATCH_SIZE = 200
+KEY_ROTATION_PAUSE = 0.05
+KEY_ROTATION_CHECKPOINT = "key_rotation.progress"
 
-# 用户数据文件路径
+# 用户数据文件路径（旧版 JSON 存储，使用 SQLite 时作为迁移来源）
 USER_DATA_FILE = "users.json"
 
+# 用户存储后端："sqlite"（按用户名索引，单条读写）或 "json"（旧版整文件读写）
+USER_STORE_BACKEND = "sqlite"
+
+# SQLite 用户数据库路径
+USER_DB_FILE = "users.db"
+
+# 进程内用户缓存容量（条），0 表示关闭缓存
+USER_CACHE_SIZE = 10000
+
+# 落盘策略："full"（每次写入都 fsync，JSON 存储还会 fsync 所在目录，断电不丢已提交数据）、
+# "normal"（SQLite WAL 下断电可能丢失最近的提交；JSON 存储只 fsync 临时文件，保证不会写出残缺文件）、
+# "off"（不主动 fsync，交由操作系统）
+USER_STORE_SYNC = "normal"
+
+# 跨进程用户锁的槽数量：用户名按哈希分配到锁文件（数据文件名 + ".lock"）中的不同字节，
+# 不同用户的登录互不阻塞
+USER_LOCK_SLOTS = 4096
+
+# 已解密 TOTP 对象缓存：容量（条，0 表示关闭）与有效期（秒）
+TOTP_CACHE_SIZE = 10000
+TOTP_CACHE_TTL = 300
+
+# 密码哈希（scrypt）参数：N 为开销因子（2 的幂），可运行 python password_kdf.py --target-ms 100 在本机标定
+PASSWORD_SCRYPT_N = 2 ** 14
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
+PASSWORD_HASH_WORKERS = 4       # 密码哈希线程池大小（同时也是并发哈希上限）
+
+# TOTP 二维码：账户发行方名称、每个模块的像素数，以及按 otpauth URI 缓存的已渲染图像数量
+TOTP_ISSUER = "MyApp"
+QR_BOX_SIZE = 6
+QR_CACHE_SIZE = 64
+
+# 批量生成配置包（provisioning.py）：每批用户数与工作进程数（0 表示与 CPU 核数相同）
+PROVISION_CHUNK_SIZE = 200
+PROVISION_WORKERS = 0
+
+# 批量导入（bulk_users.py）：每批用户数（每批在一个事务中提交并记录一次进度），
+# 以及计算密码哈希、加密密钥的工作进程数（0 表示与 CPU 核数相同）
+BULK_CHUNK_SIZE = 1000
+BULK_WORKERS = 0
+
+# 指标采集：关闭时计时装饰器不包装函数，几乎没有开销；可通过认证服务的 /metrics 查看
+METRICS_ENABLED = True
+# 延迟直方图分桶上限（秒）
+METRICS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
 # 登录尝试限制
 MAX_FAILED_ATTEMPTS = 5         # 最大失败次数
 LOCK_DURATION = 300             # 锁定时间（秒）
+
+# 请求限流（进程内滑动窗口）：规则名 -> (次数上限, 窗口秒数)
+RATE_LIMITS = {
+    "send_code_user": (3, 60),          # 每个用户每分钟最多发送 3 次登录验证码
+    "send_code_contact": (10, 3600),    # 每个手机号/邮箱每小时最多 10 次（含注册）
+    "send_code_caller": (30, 3600),     # 每个调用方（如客户端 IP）每小时最多 30 次
+    "login_user": (20, 60),             # 每个用户每分钟最多 20 次第一因子校验
+    "login_caller": (60, 60),           # 每个调用方每分钟最多 60 次第一因子校验（防止轮换用户名）
+    "totp_user": (10, 60),              # 每个用户每分钟最多 10 次 TOTP 校验
+    "totp_caller": (60, 60),            # 每个调用方每分钟最多 60 次 TOTP 校验
+}
+RATE_LIMIT_MAX_KEYS = 100000            # 每条规则最多跟踪的键数，超出时淘汰最久未请求的键
+RATE_LIMIT_EVICT_INTERVAL = 60          # 后台清理空闲键的间隔（秒）
+
+# 登录会话：通过第一因子后等待第二因子的有效期，以及登录成功后会话令牌的有效期（秒）
+AUTH_PENDING_TTL = 300
+AUTH_SESSION_TTL = 3600
+
+# 认证服务在后台查找用户并发送登录验证码的线程数（接口不等待发送完成）
+AUTH_CODE_SEND_WORKERS = 4
+
+# 认证服务（auth_server.py）：监听地址、执行阻塞操作的线程数、请求体上限（字节）与读取超时（秒）
+AUTH_SERVER_HOST = "127.0.0.1"
+AUTH_SERVER_PORT = 8080
+AUTH_SERVER_WORKERS = 16
+AUTH_SERVER_MAX_BODY = 16 * 1024
+AUTH_SERVER_TIMEOUT = 10
+
+# 访问认证服务 /metrics 所需的令牌（请求头 Authorization: Bearer <令牌>）；None 时不提供 /metrics
+AUTH_SERVER_METRICS_TOKEN = None
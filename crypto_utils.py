@@ -1,15 +1,81 @@
 # crypto_utils.py
 
 import os
-from dotenv import load_dotenv
+import threading
 
-# 对称加密工具 Fernet
-from cryptography.fernet import Fernet
+# 加密器在首次使用时才创建：导入本模块不会加载 cryptography 或读取 .env
+_fernet = None
+_primary = None
+_fernet_lock = threading.Lock()
 
-# 加载 .env 文件中的环境变量到系统环境中
-load_dotenv()
 
-FERNET_KEY = os.getenv("FERNET_KEY")
-if not FERNET_KEY:
-    raise ValueError("未设置 FERNET_KEY")
-fernet = Fernet(FERNET_KEY.encode())
+def load_keys():
+    """
+    读取加密密钥列表（新密钥在前）：优先使用 FERNET_KEYS（逗号分隔），否则使用单个 FERNET_KEY。
+    异常:
+        ValueError: 未设置 FERNET_KEYS / FERNET_KEY
+    """
+    from dotenv import load_dotenv
+
+    # 加载 .env 文件中的环境变量到系统环境中
+    load_dotenv()
+
+    keys = [key.strip() for key in os.getenv("FERNET_KEYS", "").split(",") if key.strip()]
+    if not keys and os.getenv("FERNET_KEY"):
+        keys = [os.getenv("FERNET_KEY")]
+    if not keys:
+        raise ValueError("未设置 FERNET_KEY")
+    return keys
+
+
+def get_fernet():
+    """
+    获取对称加密器（首次调用时加载 .env 并读取密钥）。
+
+    返回 MultiFernet：用第一个（最新的）密钥加密，用任一已配置的密钥解密，
+    因此更换密钥时把新密钥放在 FERNET_KEYS 最前面，旧数据仍可读取，
+    再由 key_rotation.py 在后台逐步重新加密。
+    异常:
+        ValueError: 未设置 FERNET_KEY
+    """
+    global _fernet, _primary
+
+    if _fernet is None:
+        with _fernet_lock:
+            if _fernet is None:
+                from cryptography.fernet import Fernet, MultiFernet
+
+                fernets = [Fernet(key.encode()) for key in load_keys()]
+                _primary = fernets[0]
+                _fernet = MultiFernet(fernets)
+    return _fernet
+
+
+def is_current(token):
+    """
+    判断密文是否已用最新的密钥加密（无需重新加密）。
+    """
+    from cryptography.fernet import InvalidToken
+
+    get_fernet()
+    try:
+        _primary.decrypt(token.encode())
+    except InvalidToken:
+        return False
+    return True
+
+
+def rotate(token):
+    """
+    用最新的密钥重新加密密文（明文不变）。
+    异常:
+        cryptography.fernet.InvalidToken: 没有任何已配置的密钥能解密该密文
+    """
+    return get_fernet().rotate(token.encode()).decode()
+
+
+def __getattr__(name):
+    # 兼容旧写法 crypto_utils.fernet（访问时才创建加密器）
+    if name == "fernet":
+        return get_fernet()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,35 +1,781 @@
 # data_store.py
 
+import copy
 import json
 import os
+import sqlite3
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
 
-# 导入用户数据文件路径
-from config import USER_DATA_FILE
+# 导入跨进程分槽锁
+from file_lock import RangeLockFile
 
-def load_users():
+# 导入指标采集
+import metrics
+
+# 导入紧凑的用户记录类型（整表加载时使用）
+from user_record import UserRecord
+
+# 导入用户数据文件路径与存储后端配置
+from config import (
+    USER_DATA_FILE,
+    USER_DB_FILE,
+    USER_STORE_BACKEND,
+    USER_CACHE_SIZE,
+    USER_STORE_SYNC,
+    USER_LOCK_SLOTS
+)
+
+# 落盘策略 -> SQLite synchronous 级别
+SYNC_MODES = {"full": "FULL", "normal": "NORMAL", "off": "OFF"}
+
+# 联系方式字段 -> 名称（同一联系方式只能绑定一个用户）
+CONTACT_LABELS = {"email": "邮箱", "phone": "手机号"}
+
+
+def _contact_taken(field):
+    return ValueError(f"该{CONTACT_LABELS[field]}已被其他用户绑定")
+
+
+def _check_sync(sync):
+    if sync not in SYNC_MODES:
+        raise ValueError(f"不支持的落盘策略：{sync}")
+    return sync
+
+
+class UserStore:
+    """
+    用户存储引擎接口：以用户名为主键，按单条记录读写。
+
+    所有后端都需要实现 get / put / delete / iter_items / count，
+    load_all / save_all 用于兼容旧的整表读写接口。
+
+    单条 put 本身是原子的；跨越“读 - 改 - 写”的操作需先用 lock_user 锁住该用户，
+    锁通过数据文件旁的 .lock 文件在进程之间生效（self.locks 由子类创建）。
+
+    写入时保证同一邮箱 / 手机号只绑定一个用户，冲突时抛出 ValueError。
+
+    version() 返回数据版本，任何进程写入后都会变化；put / put_many / delete / save_all
+    返回 (写入前版本, 写入后版本)，供缓存判断两次检查之间是否有其他进程写入（不支持时返回 None）。
+    """
+
+    locks = None
+
+    # version() 是否在每次写入后必然变化（而不只是很可能变化）
+    exact_version = False
+
+    def get(self, username):
+        raise NotImplementedError
+
+    def get_for_update(self, username):
+        """
+        读取即将被修改的记录：必须反映其他进程的最新写入（调用方应已持有该用户的锁）。
+        """
+        return self.get(username)
+
+    def lock_user(self, username):
+        """
+        跨进程锁住单个用户（上下文管理器，同一线程内可重入）。
+        """
+        return self.locks.lock_key(username)
+
+    def lock_users(self, usernames):
+        """
+        跨进程同时锁住一批用户（批量导入时使用）。
+        """
+        return self.locks.lock_keys(usernames)
+
+    def put(self, username, user):
+        raise NotImplementedError
+
+    def delete(self, username):
+        raise NotImplementedError
+
+    def iter_items(self):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def scan(self, after=None, limit=1000):
+        """
+        按用户名顺序返回 after 之后的至多 limit 条 (username, user)，用于分批遍历全部用户。
+        """
+        batch = []
+        for username, user in sorted(self.iter_items(), key=lambda item: item[0]):
+            if after is None or username > after:
+                batch.append((username, user))
+                if len(batch) >= limit:
+                    break
+        return batch
+
+    def exists(self, username):
+        return self.get(username) is not None
+
+    def load_all(self):
+        return dict(self.iter_items())
+
+    def save_all(self, users):
+        for username, _ in list(self.iter_items()):
+            if username not in users:
+                self.delete(username)
+        for username, user in users.items():
+            self.put(username, user)
+
+    def put_many(self, items):
+        for username, user in items:
+            self.put(username, user)
+
+    def find_by_contact(self, field, value):
+        """
+        按联系方式（field 为 "email" 或 "phone"）查找绑定的用户名，未找到返回 None。
+        """
+        raise NotImplementedError
+
+    def version(self):
+        """
+        返回当前的数据版本（可比较相等的值），不支持时返回 None。
+        """
+        return None
+
+
+class JSONUserStore(UserStore):
+    """
+    旧版存储：整个 users.json 一次读入、一次写回。
+    每次读写的开销与用户总数成正比，仅用于兼容和迁移。
+
+    写入时先写同目录下的临时文件、按落盘策略 fsync，再原子替换原文件，
+    崩溃时不会留下残缺的 users.json。每次写入都重写整个文件，
+    因此写入持有整库锁；单个用户的读 - 改 - 写仍只需锁住该用户。
+    数据版本为文件签名，在整库锁内取得，写入前后两次之间不会夹杂其他进程的写入。
+    联系方式的唯一性同样在整库锁内检查。
+    """
+
+    def __init__(self, path=USER_DATA_FILE, sync=USER_STORE_SYNC, lock_slots=USER_LOCK_SLOTS):
+        self.path = path
+        self.sync = _check_sync(sync)
+        self.locks = RangeLockFile(path + ".lock", lock_slots)
+
+    def version(self):
+        # 文件签名：每次写入都替换为新文件，mtime / size / inode 随之变化
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _write_atomic(self, users):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=os.path.basename(self.path) + ".", suffix=".tmp", dir=directory
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                # default=dict：记录也可以是 UserRecord 等映射类型
+                json.dump(users, f, indent=4, ensure_ascii=False, default=dict)
+                f.flush()
+                if self.sync != "off":
+                    os.fsync(f.fileno())
+            # 保留原文件的权限位（mkstemp 创建的文件默认为 0600）
+            if os.path.exists(self.path):
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        # 目录项也落盘后，替换操作本身在断电后才可见（Windows 不支持对目录 fsync）
+        if self.sync == "full" and os.name != "nt":
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def load_all(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f, metrics.span("json_parse"):
+                return json.load(f)
+        except json.JSONDecodeError:
+            return {}
+
+    @staticmethod
+    def _check_contacts(users, items):
+        """
+        检查写入 items 后是否有两个用户绑定同一联系方式。调用方需持有整库锁。
+        异常:
+            ValueError: 联系方式已被其他用户绑定
+        """
+        items = dict(items)
+        owners = {}
+        for username, user in users.items():
+            if username not in items:
+                for field in CONTACT_LABELS:
+                    if user.get(field):
+                        owners[(field, user[field])] = username
+        for username, user in items.items():
+            for field in CONTACT_LABELS:
+                value = user.get(field)
+                if value:
+                    if owners.get((field, value), username) != username:
+                        raise _contact_taken(field)
+                    owners[(field, value)] = username
+
+    def save_all(self, users):
+        with self.locks.lock_all():
+            before = self.version()
+            self._check_contacts({}, users.items())
+            self._write_atomic(users)
+            return before, self.version()
+
+    def get(self, username):
+        return self.load_all().get(username)
+
+    def put(self, username, user):
+        with self.locks.lock_all():
+            before = self.version()
+            users = self.load_all()
+            self._check_contacts(users, [(username, user)])
+            users[username] = user
+            self._write_atomic(users)
+            return before, self.version()
+
+    def put_many(self, items):
+        with self.locks.lock_all():
+            before = self.version()
+            users = self.load_all()
+            items = list(items)
+            self._check_contacts(users, items)
+            users.update(items)
+            self._write_atomic(users)
+            return before, self.version()
+
+    def delete(self, username):
+        with self.locks.lock_all():
+            before = self.version()
+            users = self.load_all()
+            if users.pop(username, None) is not None:
+                self._write_atomic(users)
+            return before, self.version()
+
+    def iter_items(self):
+        return iter(self.load_all().items())
+
+    def count(self):
+        return len(self.load_all())
+
+    def find_by_contact(self, field, value):
+        # 旧版存储没有索引，只能线性扫描
+        for username, user in self.load_all().items():
+            if user.get(field) == value:
+                return username
+        return None
+
+
+class SQLiteUserStore(UserStore):
+    """
+    SQLite 存储：username 为主键，每条用户记录以 JSON 文本保存在一行中。
+    查找与更新只涉及单行，开销不随用户总数线性增长。
+
+    email / phone 另存为独立列并建立部分唯一索引（空值不参与），写入记录时随之更新；
+    两个用户绑定同一联系方式时写入失败，转换为 ValueError。
+    meta 表中的 version 为数据版本，每次写入在同一事务内加一。
+
+    写事务以 BEGIN IMMEDIATE 开始，一开始就取得数据库写锁，
+    避免多个进程的事务从读锁升级为写锁时互相等待而失败。
+    """
+
+    exact_version = True
+
+    _UPSERT = (
+        "INSERT INTO users (username, data, email, phone) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(username) DO UPDATE SET "
+        "data = excluded.data, email = excluded.email, phone = excluded.phone"
+    )
+
+    def __init__(self, path=USER_DB_FILE, sync=USER_STORE_SYNC, lock_slots=USER_LOCK_SLOTS):
+        self.path = path
+        self.sync = _check_sync(sync)
+        self.locks = RangeLockFile(path + ".lock", lock_slots)
+        self._local = threading.local()  # sqlite3 连接不能跨线程共享，每个线程一个
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level="IMMEDIATE")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={SYNC_MODES[self.sync]}")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS users ("
+                "username TEXT PRIMARY KEY, "
+                "data TEXT NOT NULL, "
+                "email TEXT, "
+                "phone TEXT)"
+            )
+
+            # 旧版数据库没有联系方式列：补列并从记录中回填
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            if "email" not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN email TEXT")
+                conn.execute("ALTER TABLE users ADD COLUMN phone TEXT")
+                rows = conn.execute("SELECT username, data FROM users").fetchall()
+                conn.executemany(
+                    "UPDATE users SET email = ?, phone = ? WHERE username = ?",
+                    ((user.get("email") or None, user.get("phone") or None, username)
+                     for username, user in ((u, json.loads(d)) for u, d in rows))
+                )
+
+            # 旧版数据库的联系方式索引不是唯一索引：重建为部分唯一索引
+            unique = {row[1]: row[2] for row in conn.execute("PRAGMA index_list(users)")}
+            for field, label in CONTACT_LABELS.items():
+                name = f"idx_users_{field}"
+                if unique.get(name) == 1:
+                    continue
+                conn.execute(f"UPDATE users SET {field} = NULL WHERE {field} = ''")
+                conn.execute(f"DROP INDEX IF EXISTS {name}")
+                try:
+                    conn.execute(f"CREATE UNIQUE INDEX {name} ON users ({field}) WHERE {field} IS NOT NULL")
+                except sqlite3.IntegrityError:
+                    # 已有多个用户绑定同一联系方式：保留普通索引（仍由 user_manager 在写入前检查）
+                    conn.execute(f"CREATE INDEX {name} ON users ({field})")
+                    print(f"[DataStore] {self.path} 中已有多个用户绑定同一{label}，未能建立唯一索引，请先处理重复数据")
+
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+
+    def version(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    @staticmethod
+    def _bump_version(conn):
+        """
+        在当前写事务内把数据版本加一，返回 (写入前版本, 写入后版本)。
+        事务从 BEGIN IMMEDIATE 起持有写锁，其间不会有其他连接提交。
+        """
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        after = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        return after - 1, after
+
+    @staticmethod
+    def _encode(user):
+        return json.dumps(user, ensure_ascii=False, separators=(",", ":"), default=dict)
+
+    @classmethod
+    def _row(cls, username, user):
+        # 空字符串按未绑定保存，不参与唯一索引
+        return username, cls._encode(user), user.get("email") or None, user.get("phone") or None
+
+    @staticmethod
+    def _constraint_error(error):
+        """
+        唯一索引冲突（sqlite3.IntegrityError）-> 与应用层检查一致的 ValueError。
+        """
+        for field in CONTACT_LABELS:
+            if f"users.{field}" in str(error):
+                return _contact_taken(field)
+        return error
+
+    def get(self, username):
+        row = self._conn().execute(
+            "SELECT data FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, username):
+        row = self._conn().execute(
+            "SELECT 1 FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        return row is not None
+
+    def put(self, username, user):
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute(self._UPSERT, self._row(username, user))
+                return self._bump_version(conn)
+        except sqlite3.IntegrityError as e:
+            raise self._constraint_error(e) from e
+
+    def put_many(self, items):
+        """
+        在一个事务中批量写入 (username, user) 记录（任何一条冲突时整批不写入）。
+        """
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executemany(
+                    self._UPSERT,
+                    (self._row(username, user) for username, user in items)
+                )
+                return self._bump_version(conn)
+        except sqlite3.IntegrityError as e:
+            raise self._constraint_error(e) from e
+
+    def delete(self, username):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM users WHERE username = ?", (username,))
+            return self._bump_version(conn)
+
+    def iter_items(self):
+        cursor = self._conn().execute("SELECT username, data FROM users ORDER BY username")
+        for username, data in cursor:
+            yield username, json.loads(data)
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def scan(self, after=None, limit=1000):
+        # 按主键分页，每批只读取 limit 行
+        rows = self._conn().execute(
+            "SELECT username, data FROM users WHERE username > ? ORDER BY username LIMIT ?",
+            ("" if after is None else after, limit)
+        ).fetchall()
+        return [(username, json.loads(data)) for username, data in rows]
+
+    def find_by_contact(self, field, value):
+        if field not in ("email", "phone"):
+            raise ValueError(f"不支持的联系方式字段：{field}")
+
+        row = self._conn().execute(
+            f"SELECT username FROM users WHERE {field} = ? LIMIT 1", (value,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_all(self, users):
+        conn = self._conn()
+        try:
+            with conn:
+                conn.execute("DELETE FROM users")
+                conn.executemany(
+                    "INSERT INTO users (username, data, email, phone) VALUES (?, ?, ?, ?)",
+                    (self._row(username, user) for username, user in users.items())
+                )
+                return self._bump_version(conn)
+        except sqlite3.IntegrityError as e:
+            raise self._constraint_error(e) from e
+
+
+_MISSING = object()  # 缓存中“用户不存在”的占位值
+
+
+class CachedUserStore(UserStore):
+    """
+    带容量上限的进程内写穿（write-through）缓存，包装任意存储后端。
+
+    - 读：命中缓存时不读取用户记录，只读取一次数据版本（SQLite 为单行查询，JSON 存储为一次 stat）；
+    - 写：先写后端，再更新缓存；
+    - 失效：数据版本变化（其他进程写入）时清空缓存。自己写入时比较写入前的版本，
+      上次检查之后、本次写入之前夹杂了其他进程的写入时同样清空缓存。
+
+    返回给调用方的是记录副本，调用方修改记录不会污染缓存。
+    """
+
+    def __init__(self, backend, capacity=USER_CACHE_SIZE):
+        self.backend = backend
+        self.capacity = capacity
+        self._cache = OrderedDict()  # username -> 用户记录（或 _MISSING），按最近使用排序
+        self._lock = threading.RLock()
+        self._version = backend.version()  # 缓存内容对应的数据版本
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _invalidate(self):
+        if self._cache:
+            self._cache.clear()
+            self.invalidations += 1
+
+    def _validate(self):
+        """
+        数据版本变化时清空缓存。调用方需持有 self._lock。
+        """
+        version = self.backend.version()
+        if version is None or version != self._version:
+            self._invalidate()
+        self._version = version
+
+    def _written(self, versions):
+        """
+        自己的写入完成后更新缓存对应的版本。调用方需持有 self._lock。
+        写入前的版本不是缓存对应的版本时，其他进程的写入夹在中间，缓存整体作废。
+        """
+        if versions is None or versions[0] != self._version:
+            self._invalidate()
+        self._version = versions[1] if versions is not None else self.backend.version()
+
+    def _remember(self, username, user):
+        self._cache[username] = _MISSING if user is None else copy.deepcopy(user)
+        self._cache.move_to_end(username)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, username):
+        with self._lock:
+            self._validate()
+            cached = self._cache.get(username)
+            if cached is not None:
+                self.hits += 1
+                self._cache.move_to_end(username)
+                return None if cached is _MISSING else copy.deepcopy(cached)
+
+            self.misses += 1
+            user = self.backend.get(username)
+            self._remember(username, user)
+            return user
+
+    def exists(self, username):
+        return self.get(username) is not None
+
+    def get_for_update(self, username):
+        # 调用方持有该用户的锁，其他进程只能在此之前修改该用户，且修改必然改变数据版本：
+        # 版本可靠时，校验通过的缓存记录就是最新的
+        if self.backend.exact_version:
+            return self.get(username)
+
+        # 文件签名的时间精度有限，不能保证察觉其他进程刚刚完成的写入：绕过缓存直接读取后端
+        with self._lock:
+            self.misses += 1
+            user = self.backend.get(username)
+            self._remember(username, user)
+            return user
+
+    def lock_user(self, username):
+        return self.backend.lock_user(username)
+
+    def lock_users(self, usernames):
+        return self.backend.lock_users(usernames)
+
+    def put(self, username, user):
+        with self._lock:
+            versions = self.backend.put(username, user)
+            self._written(versions)
+            self._remember(username, user)
+            return versions
+
+    def put_many(self, items):
+        with self._lock:
+            items = list(items)
+            versions = self.backend.put_many(items)
+            self._written(versions)
+            for username, _ in items:
+                self._cache.pop(username, None)
+            return versions
+
+    def delete(self, username):
+        with self._lock:
+            versions = self.backend.delete(username)
+            self._written(versions)
+            self._remember(username, None)
+            return versions
+
+    def iter_items(self):
+        return self.backend.iter_items()
+
+    def count(self):
+        return self.backend.count()
+
+    def scan(self, after=None, limit=1000):
+        return self.backend.scan(after, limit)
+
+    def find_by_contact(self, field, value):
+        return self.backend.find_by_contact(field, value)
+
+    def load_all(self):
+        return self.backend.load_all()
+
+    def save_all(self, users):
+        with self._lock:
+            versions = self.backend.save_all(users)
+            self._cache.clear()
+            self._version = versions[1] if versions is not None else self.backend.version()
+            return versions
+
+    def version(self):
+        return self.backend.version()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        """
+        返回缓存命中统计，用于确认读路径是否仍在访问磁盘。
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "size": len(self._cache),
+                "capacity": self.capacity,
+            }
+
+
+def migrate_json_to_sqlite(json_path=USER_DATA_FILE, db_path=USER_DB_FILE):
     """
-    从用户数据文件中加载所有用户信息。
-    如果文件不存在或内容无效，返回一个空字典。
+    将旧版 users.json 中的用户一次性导入 SQLite 数据库。
+    仅在数据库为空时执行，导入完成后原文件重命名为 *.migrated 以免重复导入。
 
     返回值:
-        dict: 用户名 -> 用户信息的字典结构
+        int: 导入的用户数量
+    """
+    if not os.path.exists(json_path):
+        return 0
+
+    store = SQLiteUserStore(db_path)
+    with store.locks.lock_all():
+        # 多个进程同时启动时只有一个执行迁移
+        if not os.path.exists(json_path) or store.count() > 0:
+            return 0
+
+        users = JSONUserStore(json_path).load_all()
+        try:
+            store.put_many(users.items())
+        except ValueError:
+            # 旧数据中已有多个用户绑定同一联系方式：去掉唯一索引后导入，
+            # 再按旧版数据库的方式重建索引（无法建立唯一索引时保留普通索引并提示）
+            conn = store._conn()
+            with conn:
+                for field in CONTACT_LABELS:
+                    conn.execute(f"DROP INDEX IF EXISTS idx_users_{field}")
+            store.put_many(users.items())
+            store._init_schema()
+        os.replace(json_path, json_path + ".migrated")
+
+    print(f"[DataStore] 已从 {json_path} 迁移 {len(users)} 个用户到 {db_path}")
+    return len(users)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    获取当前配置的存储引擎（进程内单例）。
+    首次打开 SQLite 存储时会自动迁移旧版 users.json。
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if USER_STORE_BACKEND == "sqlite":
+                    migrate_json_to_sqlite(USER_DATA_FILE, USER_DB_FILE)
+                    store = SQLiteUserStore(USER_DB_FILE)
+                elif USER_STORE_BACKEND == "json":
+                    store = JSONUserStore(USER_DATA_FILE)
+                else:
+                    raise ValueError(f"不支持的用户存储后端：{USER_STORE_BACKEND}")
+
+                if USER_CACHE_SIZE > 0:
+                    store = CachedUserStore(store, USER_CACHE_SIZE)
+                _store = store
+    return _store
+
+
+def cache_stats():
+    """
+    返回用户缓存的命中/未命中计数；未启用缓存时返回 None。
+    """
+    store = get_store()
+    if isinstance(store, CachedUserStore):
+        return store.stats()
+    return None
+
+
+@metrics.timed("store_get")
+def get_user_record(username):
+    """
+    按用户名读取单个用户记录，不存在时返回 None。
+    """
+    return get_store().get(username)
+
+
+@metrics.timed("store_put")
+def save_user_record(username, user):
+    """
+    写入（新增或覆盖）单个用户记录。
     """
+    get_store().put(username, user)
 
-    if not os.path.exists(USER_DATA_FILE):
-        return {}
 
-    try:
-        with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return {}
+@metrics.timed("store_get_for_update")
+def get_user_record_for_update(username):
+    """
+    读取即将被修改的用户记录（缓存只在能确认未被其他进程修改时使用），调用方应已持有 lock_user(username)。
+    """
+    return get_store().get_for_update(username)
+
+
+def lock_user(username):
+    """
+    跨进程锁住单个用户，用于读 - 改 - 写事务：
+        with lock_user(username):
+            user = get_user_record_for_update(username)
+            ...
+            save_user_record(username, user)
+    """
+    return get_store().lock_user(username)
+
+
+def user_exists(username):
+    return get_store().exists(username)
+
+
+@metrics.timed("store_find_contact")
+def find_username_by_contact(field, value):
+    """
+    通过邮箱或手机号（field 为 "email" / "phone"）查找绑定的用户名。
+    """
+    if not value:
+        return None
+    return get_store().find_by_contact(field, value)
+
+
+@metrics.timed("store_load_all")
+def load_users(compact=True):
+    """
+    从存储引擎中加载所有用户信息。
+    整表读取的开销与用户总数成正比，热路径请使用 get_user_record。
+
+    参数:
+        compact (bool): 为 True 时每条记录为 UserRecord（可按 dict 方式读写，内存占用约为 dict 的一半以下），
+                        逐条转换，不会同时持有全部 dict；为 False 时返回普通 dict
+    返回值:
+        dict: 用户名 -> 用户信息
+    """
+    if not compact:
+        return get_store().load_all()
+    return {username: UserRecord.from_dict(user) for username, user in get_store().iter_items()}
+
 
 def save_users(users):
     """
-    将用户信息保存到用户数据文件中（覆盖写入）。
+    将用户信息整体保存到存储引擎中（覆盖写入）。
 
     参数:
         users (dict): 用户名 -> 用户信息的字典结构
     """
-    with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, indent=4, ensure_ascii=False)
+    get_store().save_all(users)
@@ -0,0 +1,117 @@
+# file_lock.py
+
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager, ExitStack
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+def _lock_byte(fd, offset, guard):
+    """
+    对锁文件中第 offset 个字节加跨进程排他锁（阻塞直到获得）。
+    guard 保护 Windows 下共享文件位置的 seek + locking。
+    """
+    if os.name == "nt":
+        # msvcrt.locking 从当前文件位置开始加锁；用非阻塞方式重试，等待期间不占用 guard
+        while True:
+            with guard:
+                os.lseek(fd, offset, os.SEEK_SET)
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.005)
+    else:
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset, os.SEEK_SET)
+
+
+def _unlock_byte(fd, offset, guard):
+    if os.name == "nt":
+        with guard:
+            os.lseek(fd, offset, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset, os.SEEK_SET)
+
+
+class RangeLockFile:
+    """
+    基于一个锁文件的分槽锁：每个槽对应锁文件中的一个字节，
+    对该字节加字节范围锁（POSIX fcntl.lockf / Windows msvcrt.locking）即可跨进程互斥，
+    不同槽互不影响。
+
+    字节范围锁归属于进程而非线程，因此每个槽另配一把进程内的可重入锁：
+    同一进程的线程之间由它互斥，只有最外层获取时才去加文件锁。
+    槽 0 保留给整库操作（如重写整个 JSON 文件），用户使用槽 1 ~ slots。
+    """
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self._fd = None
+        self._pid = None
+        self._guard = threading.Lock()      # 保护打开锁文件，以及 Windows 下的 seek + locking
+        self._locks = {}                    # 槽 -> threading.RLock
+        self._depth = {}                    # 槽 -> 本进程内的重入深度
+
+    def _file(self):
+        # fork 出的子进程不继承父进程的文件锁，需要重新打开锁文件
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+            self._locks = {}
+            self._depth = {}
+        return self._fd
+
+    def slot_for(self, key):
+        return 1 + zlib.crc32(key.encode()) % self.slots
+
+    @contextmanager
+    def locked(self, slot):
+        with self._guard:
+            fd = self._file()
+            lock = self._locks.get(slot)
+            if lock is None:
+                lock = self._locks[slot] = threading.RLock()
+
+        with lock:
+            depth = self._depth.get(slot, 0)
+            if depth == 0:
+                _lock_byte(fd, slot, self._guard)
+            self._depth[slot] = depth + 1
+            try:
+                yield
+            finally:
+                self._depth[slot] -= 1
+                if self._depth[slot] == 0:
+                    _unlock_byte(fd, slot, self._guard)
+
+    def lock_key(self, key):
+        """
+        锁住 key 所在的槽（不同 key 可能落在同一槽，只会多等待，不会出错）。
+        """
+        return self.locked(self.slot_for(key))
+
+    @contextmanager
+    def lock_keys(self, keys):
+        """
+        同时锁住多个 key 所在的槽（批量写入用）。
+        槽按编号从小到大获取，与同样按此顺序加锁、或只持有单个槽的调用方之间不会死锁。
+        """
+        with ExitStack() as stack:
+            for slot in sorted({self.slot_for(key) for key in keys}):
+                stack.enter_context(self.locked(slot))
+            yield
+
+    def lock_all(self):
+        """
+        锁住整库操作专用的槽 0。
+        """
+        return self.locked(0)
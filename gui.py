@@ -7,8 +7,11 @@ from gui_register import RegisterViewMixin
 from gui_login import LoginViewMixin
 from gui_totp import TOTPViewMixin
 
-# 主 GUI 类，继承三个功能模块
-class TwoFAGUI(RegisterViewMixin, LoginViewMixin, TOTPViewMixin):
+# 导入后台任务桥接模块（耗时操作放到工作线程执行）
+from gui_tasks import BackgroundTaskMixin
+
+# 主 GUI 类，继承三个功能模块与后台任务模块
+class TwoFAGUI(RegisterViewMixin, LoginViewMixin, TOTPViewMixin, BackgroundTaskMixin):
     def __init__(self, root):
         """
         初始化主界面窗口，设置样式、状态变量、默认页面等
@@ -26,6 +29,9 @@ class TwoFAGUI(RegisterViewMixin, LoginViewMixin, TOTPViewMixin):
         # 注册阶段使用的用户缓存数据（未提交前）
         self.pending_user = None  # 用于暂存注册信息
         self.username = ""        # 当前登录用户的用户名
+        self.auth_session = None  # 第二因子凭据（第一因子通过后）或登录会话令牌
+        self.qr_image = None      # 注册完成页上显示的二维码（需保留引用，否则图像会被回收）
+        self.background_tasks = []  # 当前页面上未完成的后台任务
 
         # Label 样式配置
         self.label_font_big = ("SimSun", 30)
@@ -52,8 +58,9 @@ class TwoFAGUI(RegisterViewMixin, LoginViewMixin, TOTPViewMixin):
 
     def clear_window(self):
         """
-        清空当前窗口中的所有控件（用于页面切换）
+        清空当前窗口中的所有控件（用于页面切换），并取消旧页面上未完成的后台任务
         """
+        self.cancel_background_tasks()
         for widget in self.root.winfo_children():
             widget.destroy()
 
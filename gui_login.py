@@ -3,23 +3,8 @@
 import tkinter as tk
 from tkinter import messagebox
 
-# 导入用户管理相关函数
-from user_manager import (
-    get_user,
-    verify_recovery_code,
-    get_remaining_attempts,
-    is_user_locked,
-    lock_user,
-    reset_failed_attempts,
-    increment_failed_attempts
-)
-
-# 导入验证码逻辑模块
-from verification_manager import (
-    send_code,
-    verify_first_factor,
-    verify_code as verify_input_code
-)
+# 登录流程由 auth_service 实现；它依赖 twilio、cryptography 等，
+# 在工作线程中首次使用时才导入，以免拖慢主菜单的首次显示
 
 # 登录界面模块（含第一因素认证）
 class LoginViewMixin:
@@ -54,7 +39,9 @@ class LoginViewMixin:
             self.root,
             text="发送验证码",
             **self.button_style,
-            command=lambda: self.send_login_code(username_entry.get().strip(), method_var.get())
+            command=lambda: self.send_login_code(
+                username_entry.get().strip(), method_var.get(), widgets=[send_code_btn]
+            )
         )
         send_code_btn.pack(pady=5, padx=10)
 
@@ -66,63 +53,85 @@ class LoginViewMixin:
         method_var.trace("w", update_send_button)
         update_send_button()
 
-        # 登录按钮
-        tk.Button(
+        # 登录按钮（校验期间禁用，防止重复提交）
+        login_btn = tk.Button(
             self.root,
             text="登录",
-            command=lambda: self.login(username_entry, method_var, credential_entry),
+            command=lambda: self.login(username_entry, method_var, credential_entry, widgets=[login_btn]),
             **self.button_style
-        ).pack(pady=10)
+        )
+        login_btn.pack(pady=10)
 
         # 返回主菜单按钮
         tk.Button(self.root, text="返回", command=self.init_main_menu, **self.button_style).pack(pady=5)
 
-    def send_login_code(self, username, method):
+    def send_login_code(self, username, method, widgets=()):
         """
-        发送验证码（短信或邮箱）用于登录第一因子验证
+        发送验证码（短信或邮箱）用于登录第一因子验证（在后台线程中发送）
         """
-        try:
-            send_code(username, method)  # 调用验证码模块
-            messagebox.showinfo("成功", f"验证码已发送至 {method}")
-        except Exception as e:
-            messagebox.showerror("错误", str(e))
+        self.run_in_background(
+            dispatch_login_code, username, method,
+            on_success=lambda _: messagebox.showinfo("成功", f"验证码已发送至 {method}"),
+            on_error=lambda e: messagebox.showerror("错误", str(e)),
+            widgets=widgets
+        )
 
-    def login(self, username_entry, method_var, credential_entry):
+    def login(self, username_entry, method_var, credential_entry, widgets=()):
         """
-        登录逻辑处理，根据用户输入的方式与凭证进行验证
+        登录逻辑处理，根据用户输入的方式与凭证进行验证（校验在后台线程中执行）
         """
         username = username_entry.get().strip()
         method = method_var.get()
         input_val = credential_entry.get().strip()
 
-        # 获取用户信息
-        user = get_user(username)
-        if not user:
-            messagebox.showerror("错误", "用户不存在")
-            return
-
-        # 判断账户是否被锁定
-        if is_user_locked(user):
-            messagebox.showerror("错误", "账户已被锁定，请稍后再试")
-            return
-
-        # 验证第一因子（密码、短信、邮箱）
-        if method == "password":
-            success = verify_first_factor(username, "password", input_val)
-        else:
-            stored = user.get("verification_codes", {}).get(method)
-            success = verify_input_code(input_val, stored)
-
-        # 登录成功
-        if success:
-            reset_failed_attempts(username)      # 重置失败次数
-            self.username = username             # 保存当前登录用户
-            self.init_totp_verification()        # 进入第二因子验证界面（TOTP）
-        else:
-            increment_failed_attempts(username)  # 增加失败次数
-            remaining = get_remaining_attempts(username)
-            if remaining <= 0:
-                lock_user(username)
-                messagebox.showerror("错误", "尝试次数过多，账户已锁定")
+        def on_result(result):
+            # 用户不存在
+            if result.status == "no_such_user":
+                messagebox.showerror("错误", "用户不存在")
+                return
+
+            # 判断账户是否被锁定（本次失败导致锁定时 remaining 为 0）
+            if result.status == "locked":
+                if result.remaining is None:
+                    messagebox.showerror("错误", "账户已被锁定，请稍后再试")
+                else:
+                    messagebox.showerror("错误", "尝试次数过多，账户已锁定")
+                return
+
+            # 第一因子通过
+            if result.status == "second_factor":
+                self.username = username             # 保存当前登录用户
+                self.auth_session = result.session   # 第二因子凭据
+                self.init_totp_verification()        # 进入第二因子验证界面（TOTP）
             else:
-                messagebox.showerror("错误", f"验证失败，剩余尝试次数：{remaining}")
+                messagebox.showerror("错误", f"验证失败，剩余尝试次数：{result.remaining}")
+
+        self.run_in_background(
+            check_first_factor, username, method, input_val,
+            on_success=on_result,
+            on_error=lambda e: messagebox.showerror("错误", str(e)),
+            widgets=widgets
+        )
+
+
+def dispatch_login_code(username, method):
+    """
+    查找用户绑定的联系方式并发送登录验证码（在工作线程中执行）。
+    异常:
+        ValueError: 用户不存在或未绑定对应联系方式
+    """
+    # 延迟导入
+    from auth_service import get_auth_service
+    get_auth_service().send_login_code(username, method)
+
+
+def check_first_factor(username, method, input_val):
+    """
+    校验第一因子（在工作线程中执行）。
+
+    返回值:
+        AuthResult: 见 auth_service
+    """
+    # 延迟导入
+    from auth_service import get_auth_service
+    return get_auth_service().begin_login(username, method, input_val)
@@ -1,17 +1,12 @@
 # gui_register.py
 
 
+import base64
 import tkinter as tk
 from tkinter import messagebox
 
-# 导入用户管理模块
-from user_manager import add_user, get_user
-
-# 导入 TOTP 管理模块
-from totp_manager import generate_secret, generate_qr_code
-
-# 导入验证码模块
-from verification_manager import send_code, verify_code as verify_input_code
+# 用户管理、TOTP 与验证码模块（依赖 pyotp、twilio、cryptography 等）
+# 在首次使用时才导入，以免拖慢主菜单的首次显示
 
 
 class RegisterViewMixin:
@@ -83,45 +78,36 @@ class RegisterViewMixin:
                 messagebox.showerror("错误", "两次密码不一致")
                 return
 
-            if get_user(username):
-                messagebox.showerror("错误", "用户名已存在")
-                return
-
-            # 构建待注册用户数据
+            # 构建待注册用户数据（TOTP 密钥在后台线程中生成）
             self.pending_user = {
                 "username": username,
                 "password": pw1,
-                "secret": generate_secret(),
+                "secret": None,
                 "phone": phone if phone else None,
                 "email": email if email else None
             }
 
-            # 手机号验证
-            if phone:
-                try:
-                    result = send_code(phone, "sms", is_registration=True)
-                    self.pending_user["sms_code"] = result["code"]
-                    self.pending_user["sms_timestamp"] = result["timestamp"]
-                    self.verify_code_ui("sms", phone)
-                    return
-                except Exception as e:
-                    messagebox.showerror("错误", f"短信发送失败：{e}")
-                    return
+            def on_sent(prepared):
+                secret, sent = prepared
+                self.pending_user["secret"] = secret
 
-            # 邮箱验证
-            if email:
-                try:
-                    result = send_code(email, "email", is_registration=True)
-                    self.pending_user["email_code"] = result["code"]
-                    self.pending_user["email_timestamp"] = result["timestamp"]
-                    self.verify_code_ui("email", email)
-                    return
-                except Exception as e:
-                    messagebox.showerror("错误", f"邮件发送失败：{e}")
+                # 如果都没有填写，直接完成注册（保存完成前保持提交按钮禁用，防止重复注册）
+                if sent is None:
+                    self.finalize_registration(widgets=[submit_btn])
                     return
 
-            # 如果都没有填写，直接完成注册
-            self.finalize_registration()
+                method, contact, result = sent
+                self.pending_user[f"{method}_code"] = result["code"]
+                self.pending_user[f"{method}_timestamp"] = result["timestamp"]
+                self.verify_code_ui(method, contact)
+
+            # 查重与发送验证码（优先短信，其次邮箱）在后台线程中执行
+            self.run_in_background(
+                prepare_registration, username, phone, email,
+                on_success=on_sent,
+                on_error=lambda e: messagebox.showerror("错误", str(e)),
+                widgets=[submit_btn]
+            )
 
         # 提示信息
         tk.Label(
@@ -131,9 +117,10 @@ class RegisterViewMixin:
         ).pack(pady=5)
 
         # 提交按钮
-        tk.Button(
+        submit_btn = tk.Button(
             self.root, text="提交注册", command=start_verification, **self.button_style
-        ).pack(pady=10)
+        )
+        submit_btn.pack(pady=10)
 
         # 返回按钮
         tk.Button(
@@ -155,6 +142,9 @@ class RegisterViewMixin:
             - 如果是短信验证成功，则继续验证邮箱；
             - 如果是邮箱验证成功，则完成注册。
             """
+            # 延迟导入
+            from verification_manager import send_code, verify_code as verify_input_code
+
             input_code = code_var.get().strip()
             stored_code = {
                 "code": self.pending_user.get(f"{method}_code"),
@@ -163,42 +153,47 @@ class RegisterViewMixin:
 
             if verify_input_code(input_code, stored_code):
                 if method == "sms" and self.pending_user.get("email"):
-                    try:
-                        result = send_code(self.pending_user["email"], "email", is_registration=True)
+                    email = self.pending_user["email"]
+
+                    def on_sent(result):
                         self.pending_user["email_code"] = result["code"]
                         self.pending_user["email_timestamp"] = result["timestamp"]
-                        self.verify_code_ui("email", self.pending_user["email"])
-                        return
-                    except Exception as e:
-                        messagebox.showerror("错误", f"邮件发送失败：{e}")
-                        return
+                        self.verify_code_ui("email", email)
+
+                    # 邮件在后台线程中发送
+                    self.run_in_background(
+                        send_code, email, "email", True,
+                        on_success=on_sent,
+                        on_error=lambda e: messagebox.showerror("错误", f"邮件发送失败：{e}"),
+                        widgets=[confirm_btn]
+                    )
                 else:
-                    self.finalize_registration()
+                    self.finalize_registration(widgets=[confirm_btn])
             else:
                 messagebox.showerror("错误", "验证码错误或已过期")
 
         # 确认按钮
-        tk.Button(self.root, text="确认", command=verify_and_continue, **self.button_style).pack(pady=10)
+        confirm_btn = tk.Button(self.root, text="确认", command=verify_and_continue, **self.button_style)
+        confirm_btn.pack(pady=10)
 
-    def finalize_registration(self):
+    def finalize_registration(self, widgets=()):
         """
         注册完成逻辑：
-        - 保存用户信息
+        - 保存用户信息（密码哈希与写入在后台线程中执行）
         - 显示二维码
         - 显示恢复码
         """
-        try:
-            add_user(
-                self.pending_user["username"],
-                self.pending_user["secret"],
-                self.pending_user["password"],
-                email=self.pending_user.get("email"),
-                phone=self.pending_user.get("phone")
-            )
-        except Exception as e:
-            messagebox.showerror("错误", str(e))
-            return
-
+        self.run_in_background(
+            save_pending_user, self.pending_user,
+            on_success=self.show_registration_result,
+            on_error=lambda e: messagebox.showerror("错误", str(e)),
+            widgets=widgets
+        )
+
+    def show_registration_result(self, recovery_codes):
+        """
+        注册成功页面：展示二维码与恢复码。
+        """
         self.clear_window()
 
         username = self.pending_user["username"]
@@ -211,12 +206,29 @@ class RegisterViewMixin:
             font=self.label_font_mid
         ).pack(pady=10)
 
-        # 弹出二维码图像窗口
-        generate_qr_code(username, secret)
+        # 二维码在后台线程中渲染为 PNG，完成后直接显示在本页面中（延迟导入）
+        from totp_manager import generate_qr_code
+
+        qr_label = tk.Label(self.root, text="二维码生成中…", font=self.label_font_small)
+        qr_label.pack(pady=5)
+
+        def show_qr(png):
+            self.qr_image = tk.PhotoImage(data=base64.b64encode(png).decode())
+            qr_label.config(image=self.qr_image, text="")
 
-        # 获取恢复码
-        user = get_user(username)
-        recovery_codes = user.get("recovery_codes", [])
+        self.run_in_background(
+            generate_qr_code, username, secret,
+            on_success=show_qr,
+            on_error=lambda e: qr_label.config(text=f"二维码生成失败：{e}"),
+            cancellable=False
+        )
+
+        # 无法扫描时可手动输入密钥
+        tk.Label(self.root, text="无法扫描时请手动输入密钥：", font=self.label_font_small).pack()
+        secret_entry = tk.Entry(self.root, font=self.label_font_mid, justify="center", width=len(secret))
+        secret_entry.insert(0, secret)
+        secret_entry.config(state="readonly")
+        secret_entry.pack(pady=2)
 
         # 显示恢复码（可复制）
         tk.Label(
@@ -238,3 +250,64 @@ class RegisterViewMixin:
             command=self.init_main_menu,
             **self.button_style
         ).pack(pady=20)
+
+
+def prepare_registration(username, phone, email):
+    """
+    注册前的查重、TOTP 密钥生成与首个验证码发送（在工作线程中执行）。
+
+    返回值:
+        tuple: (TOTP 密钥, 发送结果)；发送结果为 (发送方式, 联系方式, 验证码对象)，
+               未填写任何联系方式时为 None
+    异常:
+        ValueError: 用户名或联系方式已被占用
+        Exception: 验证码发送失败
+    """
+    # 延迟导入
+    from user_manager import get_user, check_contact_available
+    from totp_manager import generate_secret
+    from verification_manager import send_code
+
+    if get_user(username):
+        raise ValueError("用户名已存在")
+
+    # 联系方式唯一性检查（索引查询）
+    check_contact_available(email=email or None, phone=phone or None)
+
+    secret = generate_secret()
+
+    # 手机号验证
+    if phone:
+        try:
+            return secret, ("sms", phone, send_code(phone, "sms", is_registration=True))
+        except Exception as e:
+            raise RuntimeError(f"短信发送失败：{e}")
+
+    # 邮箱验证
+    if email:
+        try:
+            return secret, ("email", email, send_code(email, "email", is_registration=True))
+        except Exception as e:
+            raise RuntimeError(f"邮件发送失败：{e}")
+
+    return secret, None
+
+
+def save_pending_user(pending_user):
+    """
+    保存待注册用户并返回其恢复码（在工作线程中执行）。
+    """
+    # 延迟导入
+    from user_manager import add_user, get_user
+
+    add_user(
+        pending_user["username"],
+        pending_user["secret"],
+        pending_user["password"],
+        email=pending_user.get("email"),
+        phone=pending_user.get("phone")
+    )
+
+    # 获取恢复码
+    user = get_user(pending_user["username"])
+    return user.get("recovery_codes", [])
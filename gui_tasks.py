@@ -0,0 +1,133 @@
+# gui_tasks.py
+
+import threading
+import tkinter as tk
+from tkinter import ttk
+from concurrent.futures import ThreadPoolExecutor
+
+# 轮询后台任务结果的间隔（毫秒）
+POLL_INTERVAL_MS = 50
+
+
+class BackgroundTask:
+    """
+    一个在工作线程中执行的任务，以及它在界面上占用的控件。
+    """
+
+    def __init__(self, future, widgets, on_success, on_error):
+        self.future = future
+        self.widgets = widgets
+        self.states = [widget.cget("state") for widget in widgets]  # 任务结束后恢复的原始状态
+        self.on_success = on_success
+        self.on_error = on_error
+        self.cancelled = False
+        self.progress_frame = None
+
+    def cancel(self):
+        """
+        取消任务：尚未开始的直接取消；已在执行的无法中断，但结果会被丢弃。
+        """
+        self.cancelled = True
+        self.future.cancel()
+
+
+class BackgroundTaskMixin:
+    """
+    GUI 后台执行桥接模块：
+
+    - 耗时操作（发送验证码、密码哈希、TOTP 校验、读写用户数据）提交到工作线程；
+    - Tk 主线程通过 root.after 轮询结果，回调始终在主线程中执行；
+    - 任务执行期间禁用相关按钮并显示进度条，可点击“取消”放弃结果；
+    - 切换页面（clear_window）时取消当前页面上所有未完成的任务。
+    """
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        if BackgroundTaskMixin._executor is None:
+            with BackgroundTaskMixin._executor_lock:
+                if BackgroundTaskMixin._executor is None:
+                    BackgroundTaskMixin._executor = ThreadPoolExecutor(
+                        max_workers=4, thread_name_prefix="gui-task"
+                    )
+        return BackgroundTaskMixin._executor
+
+    def run_in_background(self, func, *args, on_success=None, on_error=None, widgets=(), cancellable=True):
+        """
+        在工作线程中执行 func(*args)，完成后在主线程中调用
+        on_success(result) 或 on_error(exception)。
+
+        参数:
+            widgets: 任务执行期间需要禁用的控件
+            cancellable: 是否显示“取消”按钮
+        返回值:
+            BackgroundTask: 可调用 cancel() 取消
+        """
+        if not hasattr(self, "background_tasks"):
+            self.background_tasks = []
+
+        future = self.get_executor().submit(func, *args)
+        task = BackgroundTask(future, widgets, on_success, on_error)
+        for widget in widgets:
+            widget.config(state="disabled")
+        task.progress_frame = self._show_progress(task, cancellable)
+        self.background_tasks.append(task)
+
+        self.root.after(POLL_INTERVAL_MS, self._poll_task, task)
+        return task
+
+    def _show_progress(self, task, cancellable):
+        frame = tk.Frame(self.root)
+        bar = ttk.Progressbar(frame, mode="indeterminate", length=200)
+        bar.pack(side="left", padx=5)
+        bar.start(10)
+        if cancellable:
+            tk.Button(
+                frame,
+                text="取消",
+                font=self.label_font_small,
+                command=lambda: self._finish_task(task, cancelled=True)
+            ).pack(side="left", padx=5)
+        frame.pack(pady=5)
+        return frame
+
+    def _finish_task(self, task, cancelled=False):
+        """
+        结束任务：恢复控件、移除进度条（控件可能已随页面切换被销毁）。
+        """
+        if cancelled:
+            task.cancel()
+        if task in self.background_tasks:
+            self.background_tasks.remove(task)
+
+        if task.progress_frame is not None and task.progress_frame.winfo_exists():
+            task.progress_frame.destroy()
+        for widget, state in zip(task.widgets, task.states):
+            if widget.winfo_exists():
+                widget.config(state=state)
+
+    def _poll_task(self, task):
+        if task.cancelled:
+            return
+        if not task.future.done():
+            self.root.after(POLL_INTERVAL_MS, self._poll_task, task)
+            return
+
+        self._finish_task(task)
+        error = task.future.exception()
+        if error is None:
+            if task.on_success is not None:
+                task.on_success(task.future.result())
+        elif task.on_error is not None:
+            task.on_error(error)
+        else:
+            print(f"[GUI] 后台任务异常：{error}")
+
+    def cancel_background_tasks(self):
+        """
+        取消所有未完成的后台任务（页面切换时调用）。
+        """
+        for task in list(getattr(self, "background_tasks", [])):
+            self._finish_task(task, cancelled=True)
@@ -4,16 +4,7 @@
 import tkinter as tk
 from tkinter import messagebox
 
-# 导入 TOTP 验证函数
-from totp_manager import verify_totp
-
-# 导入用户管理函数
-from user_manager import (
-    verify_recovery_code,
-    increment_failed_attempts,
-    get_remaining_attempts,
-    lock_user
-)
+# 登录流程由 auth_service 实现，在工作线程中首次使用时才导入（见 check_second_factor）
 
 class TOTPViewMixin:
     """
@@ -44,25 +35,45 @@ class TOTPViewMixin:
             """
             code = code_entry.get().strip()
 
-            # 尝试验证 TOTP 或恢复码
-            if verify_totp(self.username, code) or verify_recovery_code(self.username, code):
-                messagebox.showinfo("登录成功", f"欢迎回来，{self.username}！")
-                self.init_main_menu()  # 返回主菜单
-            else:
-                # 验证失败，增加失败次数
-                increment_failed_attempts(self.username)
-                remaining = get_remaining_attempts(self.username)
-
-                if remaining <= 0:
-                    lock_user(self.username)
+            def on_result(result):
+                if result.status == "ok":
+                    self.auth_session = result.session  # 会话令牌
+                    messagebox.showinfo("登录成功", f"欢迎回来，{self.username}！")
+                    self.init_main_menu()  # 返回主菜单
+                elif result.status == "invalid_credentials":
+                    messagebox.showerror("错误", f"验证码错误，剩余尝试次数：{result.remaining}")
+                elif result.status == "locked":
                     messagebox.showerror("错误", "尝试次数过多，账户已锁定")
+                    self.init_main_menu()
                 else:
-                    messagebox.showerror("错误", f"验证码错误，剩余尝试次数：{remaining}")
+                    messagebox.showerror("错误", "登录已过期，请重新登录")
+                    self.init_login()
+
+            # 校验在后台线程中执行，期间禁用确认按钮
+            self.run_in_background(
+                check_second_factor, self.auth_session, code,
+                on_success=on_result,
+                on_error=lambda e: messagebox.showerror("错误", str(e)),
+                widgets=[confirm_btn]
+            )
 
         # 确认按钮
-        tk.Button(
+        confirm_btn = tk.Button(
             self.root,
             text="确认",
             command=verify_totp_code,
             **self.button_style
-        ).pack(pady=10)
+        )
+        confirm_btn.pack(pady=10)
+
+
+def check_second_factor(pending_session, code):
+    """
+    凭第一因子通过后得到的凭据校验 TOTP / 恢复码（在工作线程中执行）。
+
+    返回值:
+        AuthResult: 见 auth_service
+    """
+    # 延迟导入
+    from auth_service import get_auth_service
+    return get_auth_service().complete_login(pending_session, code)
@@ -0,0 +1,26 @@
+# job_utils.py
+#
+# 批处理任务（bulk_users.py、key_rotation.py、provisioning.py）共用的检查点写入与工作进程初始化。
+
+import json
+import os
+
+# 导入加密器（首次使用时创建）
+from crypto_utils import get_fernet
+
+
+def save_json_atomic(path, data):
+    """
+    先写临时文件再替换，检查点或索引文件要么是旧内容、要么是新内容，中断时不会只写了一半。
+    """
+    temp = path + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temp, path)
+
+
+def init_worker():
+    """
+    进程池的 initializer：工作进程启动时创建加密器（加载 .env 与密钥），避免每批重复检查。
+    """
+    get_fernet()
@@ -0,0 +1,211 @@
+# key_rotation.py
+#
+# 加密密钥轮换：把用旧密钥加密的 TOTP 密钥逐批改用最新的密钥重新加密。
+# 用法:
+#   python key_rotation.py [--batch-size 200] [--pause 0.05]   运行到完成（可随时中断，再次运行从进度处继续）
+#   python key_rotation.py --status                            查看进度
+#   python auth_server.py --rotate-keys                        在认证服务进程内后台运行
+#
+# 步骤：在 .env 中设置 FERNET_KEYS=新密钥,旧密钥 并重启所有服务进程（此后新写入都用新密钥，
+# 旧数据仍可解密），然后运行本脚本；完成后从 FERNET_KEYS 中删除旧密钥。
+#
+# 按用户名顺序分批遍历，每批只锁住需要重新加密的用户并在一个事务中写回，
+# 两批之间暂停一段时间，期间登录不受影响。进度（最后处理的用户名）记录在检查点文件中，
+# 检查点同时记下目标密钥的指纹：再次更换密钥后会从头开始。
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+from cryptography.fernet import InvalidToken
+
+# 导入存储引擎
+from data_store import get_store
+
+# 导入密钥读取与重新加密
+from crypto_utils import load_keys, is_current, rotate
+
+# 导入检查点写入
+from job_utils import save_json_atomic
+
+# 导入指标采集
+import metrics
+
+# 导入轮换批量、节流与进度文件配置
+from config import KEY_ROTATION_BATCH_SIZE, KEY_ROTATION_PAUSE, KEY_ROTATION_CHECKPOINT
+
+# 至少间隔多少秒输出一次进度
+PROGRESS_INTERVAL = 5
+
+
+def key_fingerprint():
+    """
+    最新密钥的指纹（不泄露密钥本身），用于判断检查点是否属于本次轮换。
+    """
+    return hashlib.sha256(load_keys()[0].encode()).hexdigest()[:16]
+
+
+class KeyRotationJob:
+    """
+    分批、可中断、可继续的重新加密任务。
+
+    run_batch() 处理一批并保存进度；run() 循环直到完成或 stop() 被调用；
+    start() 在后台线程中运行。progress() 返回当前进度，可在任意线程中调用。
+    """
+
+    def __init__(self, batch_size=KEY_ROTATION_BATCH_SIZE, pause=KEY_ROTATION_PAUSE,
+                 checkpoint_path=KEY_ROTATION_CHECKPOINT, store=None, verbose=True):
+        self.batch_size = batch_size
+        self.pause = pause
+        self.checkpoint_path = checkpoint_path
+        self.store = store or get_store()
+        self.verbose = verbose
+        self.total = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.state = self._load_checkpoint()
+
+    def _new_state(self):
+        return {"key": key_fingerprint(), "after": None, "scanned": 0, "rotated": 0, "failed": 0, "done": False}
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("key") == key_fingerprint():
+                return state
+        return self._new_state()
+
+    def _save_checkpoint(self):
+        save_json_atomic(self.checkpoint_path, self.state)
+
+    def restart(self):
+        with self._lock:
+            self.state = self._new_state()
+            self._save_checkpoint()
+
+    def run_batch(self):
+        """
+        处理下一批用户。返回值: bool，是否还有未处理的用户。
+        """
+        with self._lock:
+            if self.state["done"]:
+                return False
+
+            with metrics.span("key_rotation_batch"):
+                batch = self.store.scan(self.state["after"], self.batch_size)
+                # 先在锁外筛选，只锁住确实需要重新加密的用户
+                stale = [username for username, user in batch if user.get("secret") and not is_current(user["secret"])]
+
+                rotated, failed = [], 0
+                if stale:
+                    with self.store.lock_users(stale):
+                        for username in stale:
+                            # 锁内重新读取：期间用户可能已更换密钥或被删除
+                            user = self.store.get_for_update(username)
+                            if not user or not user.get("secret") or is_current(user["secret"]):
+                                continue
+                            try:
+                                user["secret"] = rotate(user["secret"])
+                            except InvalidToken:
+                                # 没有任何已配置的密钥能解密（如旧密钥已被提前删除）
+                                print(f"[KeyRotation] 无法解密用户 {username} 的密钥，已跳过")
+                                failed += 1
+                                continue
+                            rotated.append((username, user))
+                        if rotated:
+                            self.store.put_many(rotated)
+
+            self.state["scanned"] += len(batch)
+            self.state["rotated"] += len(rotated)
+            self.state["failed"] += failed
+            if batch:
+                self.state["after"] = batch[-1][0]
+            if len(batch) < self.batch_size:
+                self.state["done"] = True
+            self._save_checkpoint()
+            return not self.state["done"]
+
+    def run(self):
+        """
+        循环处理直到全部完成或被 stop()，返回最终进度。
+        """
+        self.total = self.store.count()
+        start = last_report = time.monotonic()
+        scanned_before = self.state["scanned"]
+
+        while not self._stop.is_set() and self.run_batch():
+            now = time.monotonic()
+            if self.verbose and now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                self._report((self.state["scanned"] - scanned_before) / (now - start))
+            # 节流：两批之间让出存储，stop() 时立即返回
+            self._stop.wait(self.pause)
+
+        if self.verbose:
+            progress = self.progress()
+            status = "完成" if progress["done"] else "已暂停"
+            print(f"[KeyRotation] {status}：检查 {progress['scanned']} 个用户，重新加密 {progress['rotated']}，"
+                  f"失败 {progress['failed']}")
+        return self.progress()
+
+    def _report(self, rate):
+        progress = self.progress()
+        line = f"[KeyRotation] 已检查 {progress['scanned']}"
+        if progress["total"]:
+            line += f" / {progress['total']}（{progress['percent']:.1f}%）"
+        line += f"，重新加密 {progress['rotated']}，{rate:.0f} 个/秒"
+        if rate > 0 and progress["total"]:
+            line += f"，预计还需 {max(progress['total'] - progress['scanned'], 0) / rate:.0f} 秒"
+        print(line, flush=True)
+
+    def start(self):
+        """
+        在后台线程中运行（守护线程，进程退出时进度已保存到检查点）。
+        """
+        self._thread = threading.Thread(target=self.run, name="key-rotation", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def progress(self):
+        state = dict(self.state)
+        total = self.total
+        state["total"] = total
+        state["percent"] = 100.0 if state["done"] else (
+            min(state["scanned"] / total * 100, 99.9) if total else 0.0
+        )
+        return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="用最新的加密密钥逐批重新加密 TOTP 密钥")
+    parser.add_argument("--batch-size", type=int, default=KEY_ROTATION_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=KEY_ROTATION_PAUSE, help="两批之间的暂停（秒）")
+    parser.add_argument("--checkpoint", default=KEY_ROTATION_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="忽略已有进度，从头开始")
+    parser.add_argument("--status", action="store_true", help="只显示进度")
+    args = parser.parse_args()
+
+    job = KeyRotationJob(args.batch_size, args.pause, args.checkpoint)
+    if args.status:
+        job.total = job.store.count()
+        progress = job.progress()
+        print(f"[KeyRotation] 目标密钥 {progress['key']}：检查 {progress['scanned']} / {progress['total']}"
+              f"（{progress['percent']:.1f}%），重新加密 {progress['rotated']}，失败 {progress['failed']}，"
+              f"{'已完成' if progress['done'] else '未完成'}")
+    else:
+        if args.restart:
+            job.restart()
+        try:
+            job.run()
+        except KeyboardInterrupt:
+            print(f"[KeyRotation] 已中断，进度已保存到 {args.checkpoint}")
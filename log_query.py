@@ -0,0 +1,276 @@
+# log_query.py
+
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+# 导入日志目录与分段工具
+from config import LOG_DIR, LOG_FILE
+from logger import list_segments, segment_start_ms, flush_logs, convert_legacy_log
+
+# 导入原子写入（索引文件）
+from job_utils import save_json_atomic
+
+# 稀疏索引粒度：每多少行记录一个块（块内偏移 + 最早/最晚时间）
+INDEX_BLOCK_LINES = 1024
+
+INDEX_SUFFIX = ".idx"
+
+# 按文件名跳过分段时的时间容差（秒）：异步写入与多进程追加会让少量日志落在相邻分段中
+SEGMENT_SKEW = 60
+
+# 统计失败最多的用户时最多跟踪的用户数（内存上限与日志中的用户数无关）
+TOP_USERS_SLOTS = 1024
+
+
+def to_epoch(value):
+    """
+    将 datetime / ISO 字符串 / 时间戳统一转换为秒级时间戳。
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+def _entry_time(entry):
+    try:
+        return datetime.fromisoformat(entry["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def build_segment_index(path, block_lines=INDEX_BLOCK_LINES):
+    """
+    扫描一个分段文件，生成稀疏索引：每 block_lines 行一个块，
+    记录块起始字节偏移及块内最早/最晚时间。
+
+    块内日志不要求严格有序（异步写入、多进程追加都会造成轻微乱序），
+    查询时只按块的 [min, max] 区间判断能否跳过。
+    """
+    blocks = []
+    offset = 0
+    block = None
+
+    with open(path, "rb") as f:
+        for line in f:
+            if block is None:
+                block = [offset, None, None, 0]
+            try:
+                ts = _entry_time(json.loads(line))
+            except json.JSONDecodeError:
+                ts = None
+            if ts is not None:
+                block[1] = ts if block[1] is None else min(block[1], ts)
+                block[2] = ts if block[2] is None else max(block[2], ts)
+            block[3] += 1
+            offset += len(line)
+
+            if block[3] >= block_lines:
+                blocks.append(block)
+                block = None
+
+    if block is not None:
+        blocks.append(block)
+
+    return {"size": offset, "blocks": blocks}
+
+
+def load_segment_index(path):
+    """
+    读取已封存分段的索引；索引不存在或与文件大小不符（有迟到的追加）时重建。
+    """
+    index_path = path + INDEX_SUFFIX
+    size = os.path.getsize(path)
+
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("size") == size:
+            return index
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    index = build_segment_index(path)
+    save_json_atomic(index_path, index)
+    return index
+
+
+def _overlaps(block_min, block_max, since, until):
+    # 块内没有可解析的时间时不能跳过
+    if block_min is None or block_max is None:
+        return True
+    if since is not None and block_max < since:
+        return False
+    if until is not None and block_min > until:
+        return False
+    return True
+
+
+def _iter_lines(path, start, end):
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if end is not None and pos >= end:
+                break
+            pos += len(line)
+            yield line
+
+
+def query_logs(username=None, success=None, reason=None, since=None, until=None, log_dir=LOG_DIR,
+               legacy_path=None):
+    """
+    按条件流式查询登录日志（生成器，逐条产出，不把整份日志读入内存）。
+
+    按时间过滤时，先根据文件名中的创建时间跳过整段（相邻分段的创建时间界定了本段的时间范围，
+    允许 SEGMENT_SKEW 秒的重叠），已封存的分段再借助稀疏索引按块跳过；当前写入中的分段逐行扫描。
+
+    参数:
+        username (str): 只返回该用户的日志
+        success (bool): 只返回成功 / 失败的日志
+        reason (str): 只返回该失败原因的日志
+        since, until: 时间范围（datetime、ISO 字符串或时间戳，闭区间）
+        legacy_path (str): 需要先转换进 log_dir 的旧版日志文件；默认只在查询 LOG_DIR 时转换 LOG_FILE，
+                           查询其他目录时不转换（避免把默认位置的旧日志转换进无关目录）
+    """
+    flush_logs()
+    if legacy_path is None and log_dir == LOG_DIR:
+        legacy_path = LOG_FILE
+    if legacy_path is not None:
+        convert_legacy_log(legacy_path, log_dir=log_dir)
+
+    since = to_epoch(since)
+    until = to_epoch(until)
+    time_filtered = since is not None or until is not None
+
+    segments = list_segments(log_dir)
+    for i, name in enumerate(segments):
+        path = os.path.join(log_dir, name)
+        sealed = i < len(segments) - 1
+
+        if until is not None and segment_start_ms(name) / 1000 - SEGMENT_SKEW > until:
+            break  # 之后的分段创建得更晚
+        if sealed and since is not None and segment_start_ms(segments[i + 1]) / 1000 + SEGMENT_SKEW < since:
+            continue
+
+        if sealed and time_filtered:
+            blocks = load_segment_index(path)["blocks"]
+            ranges = [
+                (offset, blocks[j + 1][0] if j + 1 < len(blocks) else None)
+                for j, (offset, block_min, block_max, _) in enumerate(blocks)
+                if _overlaps(block_min, block_max, since, until)
+            ]
+        else:
+            ranges = [(0, None)]
+
+        for start, end in ranges:
+            for line in _iter_lines(path, start, end):
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 写入中断产生的残缺行
+
+                if username is not None and entry.get("username") != username:
+                    continue
+                if success is not None and entry.get("success") != success:
+                    continue
+                if reason is not None and entry.get("reason") != reason:
+                    continue
+                if time_filtered:
+                    ts = _entry_time(entry)
+                    if ts is None or (since is not None and ts < since) or (until is not None and ts > until):
+                        continue
+                yield entry
+
+
+def failures_per_user(window, since=None, until=None, username=None, log_dir=LOG_DIR, legacy_path=None):
+    """
+    单次遍历统计每个用户在每个时间窗口内的失败次数。
+    内存占用只与 (用户, 窗口) 组合数有关，与日志总量无关。
+
+    参数:
+        window (int): 窗口长度（秒），窗口按时间戳对齐
+    返回值:
+        Counter: (username, 窗口起始时间戳) -> 失败次数
+    """
+    counts = Counter()
+    for entry in query_logs(username=username, success=False, since=since, until=until,
+                            log_dir=log_dir, legacy_path=legacy_path):
+        ts = _entry_time(entry)
+        if ts is None:
+            continue
+        counts[(entry.get("username"), int(ts // window * window))] += 1
+    return counts
+
+
+class SpaceSaving:
+    """
+    Space-Saving 频繁项摘要：单次遍历，最多保留 slots 个计数器。
+    计数器已满时，新键顶替当前计数最小的键并继承其计数，继承的部分记为误差：
+    每个键的 count 是上界，count - error 是下界；不同键数不超过 slots 时计数精确（error 为 0）。
+
+    计数器按计数分桶，增加计数与顶替最小计数的键都是 O(1)。
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.counts = {}     # 键 -> (计数, 误差)
+        self._buckets = {}   # 计数 -> 具有该计数的键（dict 当作有序集合）
+        self._min = 0
+
+    def _increment(self, key):
+        count, error = self.counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if count == self._min:
+                self._min = count + 1
+        self._buckets.setdefault(count + 1, {})[key] = None
+        self.counts[key] = (count + 1, error)
+
+    def add(self, key):
+        if key in self.counts:
+            self._increment(key)
+            return
+
+        if len(self.counts) < self.slots:
+            count = self._min = 0
+        else:
+            # 顶替计数最小的键
+            count = self._min
+            bucket = self._buckets[count]
+            victim = next(iter(bucket))
+            del bucket[victim]
+            del self.counts[victim]
+        self._buckets.setdefault(count, {})[key] = None
+        self.counts[key] = (count, count)
+        self._increment(key)
+
+    def top(self, n):
+        """
+        返回计数最高的 n 个键：[(键, 计数, 误差), ...]，按计数从高到低。
+        """
+        items = sorted(self.counts.items(), key=lambda item: item[1][0], reverse=True)[:n]
+        return [(key, count, error) for key, (count, error) in items]
+
+
+def top_failing_usernames(n=10, since=None, until=None, log_dir=LOG_DIR, legacy_path=None, slots=TOP_USERS_SLOTS):
+    """
+    单次遍历找出失败次数最多的 n 个用户名，内存占用只与 slots 有关，与日志中的用户数无关。
+
+    使用 Space-Saving 摘要：不同用户数不超过 slots 时结果精确；超过时结果是近似的，
+    每个用户的次数可能多计，最多多计 error 次，失败次数超过 失败总数 / slots 的用户一定在结果中。
+
+    返回值:
+        list: [(username, 失败次数, error), ...]，按次数从高到低；error 为 0 表示次数精确
+    """
+    summary = SpaceSaving(max(slots, n))
+    for entry in query_logs(success=False, since=since, until=until, log_dir=log_dir, legacy_path=legacy_path):
+        summary.add(entry.get("username"))
+    return summary.top(n)
@@ -1,14 +1,397 @@
 # logger.py
 
+import atexit
 import json
 import os
+import threading
+import time
+from collections import deque
 from datetime import datetime
-from config import LOG_FILE  # 导入日志文件路径
 
+# 导入指标采集
+import metrics
 
+# 导入日志路径、分段滚动与异步写入配置
+from config import (
+    LOG_FILE,
+    LOG_DIR,
+    LOG_SEGMENT_MAX_BYTES,
+    LOG_SEGMENT_MAX_AGE,
+    LOG_ASYNC,
+    LOG_QUEUE_SIZE,
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL,
+    LOG_BACKPRESSURE
+)
+
+# 分段文件名：login-<创建时间毫秒>.jsonl，按文件名排序即按时间排序
+SEGMENT_PREFIX = "login-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+def segment_start_ms(name):
+    """
+    从分段文件名中解析出该段的创建时间（毫秒时间戳）。
+    """
+    return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def list_segments(log_dir=LOG_DIR):
+    """
+    返回日志目录下所有分段文件名（按时间从旧到新）。
+    """
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(log_dir)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def encode_entry(entry):
+    """
+    将一条日志编码为一行 JSON（UTF-8，以换行结尾）。
+    """
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class SegmentWriter:
+    """
+    追加写入的分段日志：每条日志一行，只追加不重写，
+    当前段超过大小或时间跨度上限时滚动到新段。
+
+    写入使用 O_APPEND，单条日志一次 write 完成，多个进程同时追加也不会互相覆盖。
+    """
+
+    def __init__(self, log_dir=LOG_DIR, max_bytes=LOG_SEGMENT_MAX_BYTES, max_age=LOG_SEGMENT_MAX_AGE):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._fd = None
+        self._name = None
+        self._lock = threading.Lock()
+
+    def _should_rotate(self, name, size, now):
+        return size >= self.max_bytes or now - segment_start_ms(name) / 1000 >= self.max_age
+
+    def _open_segment(self):
+        """
+        打开可继续追加的最新分段；没有或已满时创建新段。
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        now = time.time()
+
+        segments = list_segments(self.log_dir)
+        if segments:
+            name = segments[-1]
+            size = os.path.getsize(os.path.join(self.log_dir, name))
+            if not self._should_rotate(name, size, now):
+                return name
+
+        # 与已有分段同名时顺延 1 毫秒，保证文件名唯一且有序
+        start_ms = int(now * 1000)
+        if segments:
+            start_ms = max(start_ms, segment_start_ms(segments[-1]) + 1)
+        return f"{SEGMENT_PREFIX}{start_ms:015d}{SEGMENT_SUFFIX}"
+
+    def _rotate(self):
+        self.close_segment()
+        self._name = self._open_segment()
+        self._fd = os.open(
+            os.path.join(self.log_dir, self._name),
+            os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0)
+        )
+
+    def write_many(self, entries):
+        """
+        追加写入若干条日志，返回写入的字节数。
+        """
+        data = b"".join(encode_entry(entry) for entry in entries)
+        if not data:
+            return 0
+
+        with self._lock:
+            if self._fd is None or self._should_rotate(self._name, os.fstat(self._fd).st_size, time.time()):
+                self._rotate()
+            os.write(self._fd, data)
+        return len(data)
+
+    def write(self, entry):
+        return self.write_many([entry])
+
+    def close_segment(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._name = None
+
+
+class AsyncLogWriter:
+    """
+    后台批量日志写入器：调用方只把日志放入有界内存队列，
+    后台线程在攒够 batch_size 条或最早一条等待超过 flush_interval 秒时批量写盘。
+
+    队列满时的策略（policy）:
+        "block"       阻塞调用方直到队列有空位
+        "drop_oldest" 丢弃队列中最旧的一条，计入 dropped
+        "drop_new"    丢弃新来的这一条，计入 dropped
+    """
+
+    POLICIES = ("block", "drop_oldest", "drop_new")
+
+    def __init__(self, writer, maxsize=LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE,
+                 flush_interval=LOG_FLUSH_INTERVAL, policy=LOG_BACKPRESSURE):
+        if policy not in self.POLICIES:
+            raise ValueError(f"不支持的日志队列策略：{policy}")
+
+        self.writer = writer
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+        self._oldest_time = None  # 队列中最早一条日志的入队时间
+        self._done = 0            # 已离开队列（写出或被挤掉）的日志条数，供 flush 判断进度
+
+        # 统计计数
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.total_flush_time = 0.0
+        self.max_flush_time = 0.0
+        self.last_flush_time = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="AsyncLogWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, entry):
+        """
+        将一条日志放入队列，返回是否被接受（被丢弃时返回 False）。
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("日志写入器已关闭")
+
+            if len(self._queue) >= self.maxsize:
+                if self.policy == "block":
+                    while len(self._queue) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        raise RuntimeError("日志写入器已关闭")
+                elif self.policy == "drop_oldest":
+                    self._queue.popleft()
+                    self.dropped += 1
+                    self._done += 1
+                else:
+                    self.dropped += 1
+                    return False
+
+            if not self._queue:
+                self._oldest_time = time.monotonic()
+            self._queue.append(entry)
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+
+            # 队列由空变为非空（开始计时）或攒够一批时唤醒后台线程
+            if len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _next_batch(self):
+        """
+        等待直到需要写盘，取出一批日志。调用方需持有 self._cond。
+        """
+        while True:
+            if self._queue:
+                waited = time.monotonic() - self._oldest_time
+                if (len(self._queue) >= self.batch_size or waited >= self.flush_interval
+                        or self._flush_requested or self._closed):
+                    break
+                self._cond.wait(self.flush_interval - waited)
+            elif self._closed:
+                return None
+            else:
+                self._flush_requested = False
+                self._cond.notify_all()
+                self._cond.wait()
+
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        self._oldest_time = time.monotonic() if self._queue else None
+        self._cond.notify_all()  # 唤醒因队列满而阻塞的调用方
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+            if batch is None:
+                return
+
+            start = time.perf_counter()
+            try:
+                self.writer.write_many(batch)
+            except Exception as e:
+                print(f"[Logger] 批量写入失败：{e}")
+                with self._cond:
+                    self.errors += 1
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                self.written += len(batch)
+                self._done += len(batch)
+                self.flushes += 1
+                self.total_flush_time += elapsed
+                self.max_flush_time = max(self.max_flush_time, elapsed)
+                self.last_flush_time = elapsed
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        立即写出队列中已有的日志，等待写盘完成。
+        返回值:
+            bool: 超时前是否全部写出
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self.submitted
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._done < target and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def shutdown(self, timeout=None):
+        """
+        写出剩余日志并停止后台线程，之后不再接受新日志。
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "flushes": self.flushes,
+                "last_flush_ms": self.last_flush_time * 1000,
+                "avg_flush_ms": self.total_flush_time / self.flushes * 1000 if self.flushes else 0.0,
+                "max_flush_ms": self.max_flush_time * 1000,
+            }
+
+
+def convert_legacy_log(legacy_path=LOG_FILE, log_dir=LOG_DIR):
+    """
+    一次性将旧版 login_logs.json（整个 JSON 数组）转换为 JSON Lines 分段，
+    转换完成后原文件重命名为 *.converted。
+
+    返回值:
+        int: 转换的日志条数
+    """
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            try:
+                logs = json.load(f)
+            except json.JSONDecodeError:
+                logs = []
+    except FileNotFoundError:
+        # 不存在旧版日志，或已被其他进程转换
+        return 0
+
+    if logs:
+        # 以最早一条日志的时间命名，保证转换出的分段排在现有分段之前
+        try:
+            start = datetime.fromisoformat(logs[0]["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            start = 0
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, f"{SEGMENT_PREFIX}{int(start * 1000):015d}{SEGMENT_SUFFIX}")
+        with open(path, "ab") as f:
+            f.write(b"".join(encode_entry(entry) for entry in logs))
+
+    os.replace(legacy_path, legacy_path + ".converted")
+    print(f"[Logger] 已将 {len(logs)} 条旧日志从 {legacy_path} 转换到 {log_dir}")
+    return len(logs)
+
+
+_writer = None
+_async_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    获取进程内共享的分段写入器，首次使用时顺带转换旧版日志文件。
+    """
+    global _writer
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                convert_legacy_log()
+                _writer = SegmentWriter()
+    return _writer
+
+
+def get_async_writer():
+    """
+    获取进程内共享的后台批量写入器，进程退出时自动写出剩余日志。
+    """
+    global _async_writer
+
+    writer = get_writer()
+    if _async_writer is None:
+        with _writer_lock:
+            if _async_writer is None:
+                _async_writer = AsyncLogWriter(writer)
+                atexit.register(_async_writer.shutdown)
+    return _async_writer
+
+
+def flush_logs(timeout=None):
+    """
+    等待异步队列中的日志全部写盘（未开启异步日志时直接返回 True）。
+    """
+    if _async_writer is None:
+        return True
+    return _async_writer.flush(timeout)
+
+
+def shutdown_logging(timeout=None):
+    if _async_writer is not None:
+        _async_writer.shutdown(timeout)
+
+
+def log_writer_stats():
+    """
+    返回异步日志队列深度与写盘延迟统计；未开启异步日志时返回 None。
+    """
+    if _async_writer is None:
+        return None
+    return _async_writer.stats()
+
+
+@metrics.timed("log_write")
 def log_login_attempt(username, success, reason=None, device_id=None):
     """
-    记录一次登录尝试的日志信息。
+    记录一次登录尝试的日志信息（追加一行，开销与历史日志量无关）。
 
     参数:
         username (str): 尝试登录的用户名
@@ -25,24 +408,31 @@ def log_login_attempt(username, success, reason=None, device_id=None):
         "timestamp": datetime.now().isoformat()  # 当前时间，ISO 格式
     }
 
-    logs = []
+    if LOG_ASYNC:
+        get_async_writer().submit(log_entry)
+    else:
+        get_writer().write(log_entry)
 
-    # 尝试读取已有日志
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
+
+def read_segment(path):
+    """
+    逐行读取一个分段文件中的日志，跳过写入中断产生的残缺行。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
             try:
-                logs = json.load(f)
+                yield json.loads(line)
             except json.JSONDecodeError:
-                logs = []
-
-    # 添加日志
-    logs.append(log_entry)
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=4, ensure_ascii=False)
+                continue
 
 
 def get_logs():
-    if os.path.exists(LOG_FILE):
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    """
+    读取全部日志到一个列表中（仅适合少量日志，按条件查询请使用 log_query.query_logs）。
+    """
+    flush_logs()
+    convert_legacy_log()
+    logs = []
+    for name in list_segments():
+        logs.extend(read_segment(os.path.join(LOG_DIR, name)))
+    return logs
@@ -0,0 +1,198 @@
+# metrics.py
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# 导入指标开关与直方图分桶配置
+from config import METRICS_ENABLED, METRICS_BUCKETS
+
+# 是否采集指标：关闭时 timed 直接返回原函数，event / span 立即返回
+ENABLED = METRICS_ENABLED
+
+
+def _format_labels(labelnames, values):
+    if not labelnames:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value)}"' for name, value in zip(labelnames, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """
+    单调递增计数器，可带标签（每组标签值一个计数）。
+    """
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def collect(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class HistogramChild:
+    """
+    一组标签值对应的固定分桶直方图：每个桶只存本桶计数，导出时再累加。
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个桶为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class Histogram:
+    """
+    固定分桶的延迟直方图（单位：秒），可带标签。
+    """
+
+    def __init__(self, name, help_text, labelnames=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues):
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, HistogramChild(self.buckets))
+        return child
+
+    def collect(self):
+        with self._lock:
+            children = sorted(self._children.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labelvalues, child in children:
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames + ("le",), labelvalues + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# 各阶段耗时：stage 如 store_get、json_parse、decrypt_secret、hash_password、smtp_connect、log_write
+STAGE_SECONDS = Histogram(
+    "auth_stage_duration_seconds", "登录各阶段耗时（秒）", labelnames=("stage",)
+)
+
+# 结果计数：event 如 login_success、lockout、code_expired、rate_limited
+EVENTS = Counter("auth_events_total", "认证结果计数", labelnames=("event",))
+
+REGISTRY = [STAGE_SECONDS, EVENTS]
+
+
+def timed(stage):
+    """
+    装饰器：把函数每次调用的耗时记入 STAGE_SECONDS{stage=...}。
+    指标关闭时直接返回原函数，没有任何额外开销。
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        child = STAGE_SECONDS.labels(stage)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _Span:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage):
+    """
+    计时代码块：with span("json_parse"): ...
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(STAGE_SECONDS.labels(stage))
+
+
+def event(name, amount=1):
+    """
+    记录一次认证结果事件。
+    """
+    if ENABLED:
+        EVENTS.inc(name, amount=amount)
+
+
+def render():
+    """
+    以 Prometheus 文本格式导出所有指标。
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
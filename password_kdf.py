@@ -0,0 +1,193 @@
+# password_kdf.py
+
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 导入指标采集
+import metrics
+
+# 导入 scrypt 参数与工作线程数
+from config import PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P, PASSWORD_HASH_WORKERS
+
+# 哈希格式：scrypt$<N>$<r>$<p>$<salt(base64)>$<hash(base64)>
+SCHEME = "scrypt"
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode()
+
+
+def _b64decode(text):
+    return base64.b64decode(text.encode())
+
+
+def _scrypt(password, salt, n, r, p):
+    # scrypt 需要约 128 * r * N 字节内存，maxmem 留出余量
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * r * n + 1024 * 1024, dklen=HASH_BYTES
+    )
+
+
+@metrics.timed("hash_password")
+def hash_password_sync(password, n=PASSWORD_SCRYPT_N, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P):
+    """
+    在当前线程中计算加盐 scrypt 哈希。
+    """
+    salt = os.urandom(SALT_BYTES)
+    digest = _scrypt(password, salt, n, r, p)
+    return f"{SCHEME}${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def is_legacy_hash(stored):
+    """
+    旧版格式：不加盐的 SHA-256 十六进制摘要。
+    """
+    return isinstance(stored, str) and len(stored) == 64 and "$" not in stored
+
+
+@metrics.timed("verify_password")
+def verify_password_sync(password, stored):
+    """
+    在当前线程中校验密码，兼容旧版 SHA-256 哈希。
+    """
+    if not stored:
+        return False
+
+    if is_legacy_hash(stored):
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored)
+
+    try:
+        scheme, n, r, p, salt, digest = stored.split("$")
+        if scheme != SCHEME:
+            return False
+        expected = _b64decode(digest)
+        actual = _scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def needs_rehash(stored):
+    """
+    判断已存储的哈希是否需要按当前参数重新计算（旧版格式或参数已调整）。
+    """
+    if not stored or is_legacy_hash(stored):
+        return True
+    try:
+        scheme, n, r, p, _, _ = stored.split("$")
+    except ValueError:
+        return True
+    return (scheme, int(n), int(r), int(p)) != (SCHEME, PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    密码哈希专用线程池：hashlib.scrypt 计算期间释放 GIL，
+    线程池同时限制了并发哈希数（每次计算占用约 128 * r * N 字节内存）。
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-kdf"
+                )
+    return _executor
+
+
+def submit_hash(password):
+    """
+    提交哈希任务到线程池，立即返回 Future。
+    """
+    return get_executor().submit(hash_password_sync, password)
+
+
+def submit_verify(password, stored):
+    """
+    提交校验任务到线程池，立即返回 Future（结果为 bool）。
+    """
+    return get_executor().submit(verify_password_sync, password, stored)
+
+
+def hash_password(password):
+    return submit_hash(password).result()
+
+
+def verify_password(password, stored):
+    return submit_verify(password, stored).result()
+
+
+# 用户不存在或已锁定时用于校验的固定哈希（当前参数，进程内首次使用时生成）
+_dummy_hash = None
+
+
+def verify_dummy(password):
+    """
+    对固定哈希做一次完整校验并丢弃结果，使“用户不存在”“已锁定”与“密码错误”的耗时相同。
+    """
+    global _dummy_hash
+
+    if _dummy_hash is None:
+        _dummy_hash = hash_password_sync(os.urandom(SALT_BYTES).hex())
+    verify_password(password, _dummy_hash)
+
+
+def measure(n, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P, rounds=3):
+    """
+    测量给定参数下单次哈希的耗时（秒，取多次中的最小值）。
+    """
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _scrypt("calibration-password", b"\x00" * SALT_BYTES, n, r, p)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate(target_ms=100, r=PASSWORD_SCRYPT_R, p=PASSWORD_SCRYPT_P, max_log_n=20):
+    """
+    在本机上选择单次哈希耗时不超过 target_ms 的最大 N（2 的幂）。
+
+    返回值:
+        dict: {"n", "r", "p", "ms"}
+    """
+    chosen = None
+    for log_n in range(10, max_log_n + 1):
+        n = 2 ** log_n
+        ms = measure(n, r, p) * 1000
+        if chosen is not None and ms > target_ms:
+            break
+        chosen = {"n": n, "r": r, "p": p, "ms": ms}
+    return chosen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="为本机标定 scrypt 密码哈希参数")
+    parser.add_argument("--target-ms", type=float, default=100, help="单次哈希目标耗时（毫秒）")
+    parser.add_argument("-r", type=int, default=PASSWORD_SCRYPT_R, help="块大小参数 r")
+    parser.add_argument("-p", type=int, default=PASSWORD_SCRYPT_P, help="并行度参数 p")
+    args = parser.parse_args()
+
+    result = calibrate(args.target_ms, args.r, args.p)
+    print(f"N = 2 ** {result['n'].bit_length() - 1}  r = {result['r']}  p = {result['p']}  "
+          f"单次耗时约 {result['ms']:.1f} ms")
+    print("将以下配置写入 config.py：")
+    print(f"PASSWORD_SCRYPT_N = 2 ** {result['n'].bit_length() - 1}")
+    print(f"PASSWORD_SCRYPT_R = {result['r']}")
+    print(f"PASSWORD_SCRYPT_P = {result['p']}")
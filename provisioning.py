@@ -0,0 +1,184 @@
+# provisioning.py
+#
+# 批量生成配置包：为每个用户输出一张 TOTP 二维码（PNG 或 SVG）和一份文本清单
+# （手动输入用的密钥与剩余恢复码），用于批量开通或线下分发。
+# 用法:
+#   python provisioning.py --output packs [--users names.txt] [--format png|svg] [--workers 0]
+#
+# 不指定 --users 时为存储中的全部用户生成。解密密钥、渲染二维码与写文件在进程池中完成，
+# 主进程只按批读取用户记录。配置包包含明文密钥，输出文件仅对当前用户可读写，分发后请及时删除。
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+# 导入存储引擎
+from data_store import get_store
+
+# 导入加密器与二维码渲染
+from crypto_utils import get_fernet
+from totp_manager import decrypt_secret, provisioning_uri, encode_qr
+
+# 导入工作进程初始化
+from job_utils import init_worker
+
+# 导入配置包批量与工作进程配置
+from config import PROVISION_CHUNK_SIZE, PROVISION_WORKERS, TOTP_ISSUER
+
+# 至少间隔多少秒输出一次进度
+PROGRESS_INTERVAL = 5
+
+
+def pack_name(username):
+    """
+    用户名转换为安全的文件名（保留字母数字与 ._-，其余字符按 URL 编码）。
+    """
+    return quote(username, safe="") or "_"
+
+
+def _private_opener(path, flags):
+    return os.open(path, flags, 0o600)
+
+
+def write_pack(output, username, enc_secret, recovery_codes, fmt="png", issuer=TOTP_ISSUER):
+    """
+    为一个用户写出配置包（<名称>.<格式> 与 <名称>.txt），返回写出的文件路径列表。
+    """
+    secret = decrypt_secret(enc_secret)
+    name = os.path.join(output, pack_name(username))
+
+    image_path = f"{name}.{fmt}"
+    with open(image_path, "wb", opener=_private_opener) as f:
+        # 每个 URI 只渲染一次，不经过界面显示用的缓存
+        f.write(encode_qr(provisioning_uri(username, secret, issuer), fmt))
+
+    text_path = f"{name}.txt"
+    with open(text_path, "w", encoding="utf-8", opener=_private_opener) as f:
+        f.write(f"用户名：{username}\n")
+        f.write(f"发行方：{issuer}\n")
+        f.write(f"手动输入密钥：{secret}\n")
+        f.write("恢复码（每个码只能使用一次）：\n")
+        for code in recovery_codes:
+            f.write(f"  {code}\n")
+    return [image_path, text_path]
+
+
+def _write_chunk(output, fmt, records):
+    """
+    工作进程：为一批用户写出配置包，返回 (成功数, [(username, 错误), ...])。
+    """
+    written, failed = 0, []
+    for username, enc_secret, recovery_codes in records:
+        try:
+            write_pack(output, username, enc_secret, recovery_codes, fmt)
+            written += 1
+        except Exception as e:
+            failed.append((username, f"{type(e).__name__}: {e}"))
+    return written, failed
+
+
+def iter_usernames(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def iter_records(store, usernames=None, chunk_size=PROVISION_CHUNK_SIZE):
+    """
+    按批生成 [(username, 加密密钥, 恢复码), ...]；指定 usernames 时跳过不存在的用户并提示。
+    """
+    if usernames is None:
+        after = None
+        while True:
+            batch = store.scan(after, chunk_size)
+            if not batch:
+                return
+            after = batch[-1][0]
+            yield [(username, user["secret"], user.get("recovery_codes", [])) for username, user in batch]
+
+    chunk = []
+    for username in usernames:
+        user = store.get(username)
+        if user is None:
+            print(f"[Provisioning] 用户不存在，已跳过：{username}")
+            continue
+        chunk.append((username, user["secret"], user.get("recovery_codes", [])))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate_packs(output, usernames=None, fmt="png", workers=PROVISION_WORKERS, chunk_size=PROVISION_CHUNK_SIZE):
+    """
+    在进程池中批量生成配置包。
+
+    返回值:
+        dict: {"written", "failed", "seconds"}
+    """
+    if fmt not in ("png", "svg"):
+        raise ValueError(f"不支持的二维码格式：{fmt}")
+    os.makedirs(output, mode=0o700, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    # 主进程先检查一次密钥配置，避免工作进程逐个失败
+    get_fernet()
+    store = get_store()
+
+    written, failed = 0, []
+    start = last_report = time.perf_counter()
+    pending = deque()
+
+    def collect(future):
+        nonlocal written, last_report
+        count, errors = future.result()
+        written += count
+        failed.extend(errors)
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            print(f"[Provisioning] 已生成 {written} 个配置包，{written / (now - start):.0f} 个/秒", flush=True)
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    try:
+        # 最多保留 2 * workers 批在途
+        for records in iter_records(store, usernames, chunk_size):
+            pending.append(executor.submit(_write_chunk, output, fmt, records))
+            if len(pending) >= workers * 2:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - start
+    for username, error in failed:
+        print(f"[Provisioning] 生成失败：{username}（{error}）")
+    print(f"[Provisioning] 已生成 {written} 个配置包到 {output}，失败 {len(failed)}，耗时 {seconds:.1f} s")
+    return {"written": written, "failed": len(failed), "seconds": seconds}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量生成 TOTP 二维码与恢复码配置包")
+    parser.add_argument("--output", required=True, help="输出目录")
+    parser.add_argument("--users", default=None, help="用户名列表文件（每行一个），默认全部用户")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--workers", type=int, default=PROVISION_WORKERS, help="工作进程数（0 表示 CPU 核数）")
+    parser.add_argument("--chunk-size", type=int, default=PROVISION_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    try:
+        generate_packs(
+            args.output,
+            iter_usernames(args.users) if args.users else None,
+            args.format, args.workers, args.chunk_size
+        )
+    except ValueError as e:
+        print(f"[Provisioning] {e}", file=sys.stderr)
+        sys.exit(1)
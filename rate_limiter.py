@@ -0,0 +1,187 @@
+# rate_limiter.py
+
+import threading
+import time
+from collections import OrderedDict
+
+# 导入限流规则与容量配置
+from config import RATE_LIMITS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_EVICT_INTERVAL
+
+# 导入指标采集
+import metrics
+
+
+class RateLimitExceeded(ValueError):
+    """
+    请求过于频繁。retry_after 为建议的等待秒数。
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SlidingWindowCounter:
+    """
+    滑动窗口计数限流：每个键最多 limit 次 / window 秒。
+
+    每个键只保存 [窗口编号, 本窗口计数, 上一窗口计数] 三个整数，
+    用上一窗口计数按时间比例衰减后加上本窗口计数来近似滑动窗口内的请求数。
+
+    键按最近一次请求的先后排列：超过 max_keys 时淘汰最久未请求的键，
+    evict_idle() 从头部删除两个窗口内没有请求的键（其计数已经归零）。
+    """
+
+    def __init__(self, limit, window, max_keys=RATE_LIMIT_MAX_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._keys = OrderedDict()  # key -> [窗口编号, 本窗口计数, 上一窗口计数]
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def hit(self, key, now=None):
+        """
+        记录一次请求。允许时返回 0，超出限额时返回还需等待的秒数（大于 0，本次不计数）。
+        """
+        if now is None:
+            now = time.monotonic()
+        position = now / self.window
+        index = int(position)
+        fraction = position - index
+
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                if len(self._keys) >= self.max_keys:
+                    self._keys.popitem(last=False)
+                    self.evicted += 1
+                state = self._keys[key] = [index, 0, 0]
+            else:
+                self._keys.move_to_end(key)
+                if state[0] != index:
+                    state[2] = state[1] if state[0] == index - 1 else 0
+                    state[1] = 0
+                    state[0] = index
+
+            current, previous = state[1], state[2]
+            if previous * (1 - fraction) + current < self.limit:
+                state[1] += 1
+                self.allowed += 1
+                return 0
+
+            self.rejected += 1
+
+        # 估算计数降到限额以下的时刻（恰好在边界上时也返回一个正数，表示本次被拒绝）
+        if current < self.limit:
+            target = 1 - (self.limit - current) / previous
+            wait = (target - fraction) * self.window
+        else:
+            wait = (1 - fraction + 1 - self.limit / current) * self.window
+        return max(wait, 0.001)
+
+    def evict_idle(self, now=None):
+        """
+        删除两个窗口内没有请求的键，返回删除的数量。
+        """
+        if now is None:
+            now = time.monotonic()
+        index = int(now / self.window)
+
+        removed = 0
+        with self._lock:
+            while self._keys:
+                key, state = next(iter(self._keys.items()))
+                if state[0] >= index - 1:
+                    break
+                del self._keys[key]
+                removed += 1
+            self.evicted += removed
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return len(self._keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._keys),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
+
+
+class RateLimiter:
+    """
+    按名称组织的一组限流规则（见 config.RATE_LIMITS），
+    由一个后台线程定期清理所有规则中的空闲键。
+
+    计数只保存在当前进程内；多进程部署时每个进程各自限流。
+    """
+
+    def __init__(self, rules=RATE_LIMITS, max_keys=RATE_LIMIT_MAX_KEYS,
+                 evict_interval=RATE_LIMIT_EVICT_INTERVAL):
+        self.counters = {
+            name: SlidingWindowCounter(limit, window, max_keys)
+            for name, (limit, window) in rules.items()
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        if evict_interval:
+            self._thread = threading.Thread(
+                target=self._evict_loop, args=(evict_interval,), name="rate-limit-evict", daemon=True
+            )
+            self._thread.start()
+
+    def _evict_loop(self, interval):
+        while not self._stop.wait(interval):
+            for counter in self.counters.values():
+                counter.evict_idle()
+
+    def check(self, name, key):
+        """
+        对规则 name 下的 key 记录一次请求；key 为空时不限流。
+        异常:
+            RateLimitExceeded: 超出限额
+        """
+        if not key:
+            return
+        wait = self.counters[name].hit(key)
+        if wait:
+            metrics.event("rate_limited")
+            raise RateLimitExceeded(f"操作过于频繁，请在 {int(wait) + 1} 秒后重试", wait)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {name: counter.stats() for name, counter in self.counters.items()}
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    获取进程内共享的限流器（首次使用时启动清理线程）。
+    """
+    global _limiter
+
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+def check_rate_limit(name, key):
+    get_rate_limiter().check(name, key)
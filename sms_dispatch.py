@@ -0,0 +1,208 @@
+# sms_dispatch.py
+
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+# 导入短信发送队列、重试与限速配置
+from config import (
+    SMS_WORKERS,
+    SMS_QUEUE_SIZE,
+    SMS_MAX_RETRIES,
+    SMS_RETRY_BASE_DELAY,
+    SMS_RETRY_MAX_DELAY,
+    SMS_RATE_LIMIT,
+    SMS_RATE_BURST
+)
+
+
+def is_transient_error(exc):
+    """
+    判断发送异常是否值得重试：网络错误、超时、限流（429）与服务端错误（5xx）。
+    异常自带 transient 属性时以其为准。
+    """
+    transient = getattr(exc, "transient", None)
+    if transient is not None:
+        return bool(transient)
+    # ConnectionError / TimeoutError 均为 OSError 的子类
+    if isinstance(exc, OSError):
+        return True
+    status = getattr(exc, "status", None)
+    if status is None and hasattr(exc, "get_http_status"):
+        status = exc.get_http_status()
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class TokenBucket:
+    """
+    令牌桶限速器：平均每秒 rate 个令牌，最多积攒 burst 个。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """
+        有令牌时取走一个并返回 0，否则返回还需等待的秒数。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, stop_event=None):
+        """
+        阻塞直到取得一个令牌；stop_event 被设置时放弃并返回 False。
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class SMSDispatcher:
+    """
+    异步短信发送管道：调用方把 (手机号, 验证码) 放入有界队列后立即返回 Future，
+    由工作线程按供应商限速发送，临时性错误按指数退避（带随机抖动）重试。
+
+    send_fn(to_phone, code) 为实际发送函数，失败时抛出异常。
+    """
+
+    def __init__(self, send_fn, workers=SMS_WORKERS, queue_size=SMS_QUEUE_SIZE,
+                 max_retries=SMS_MAX_RETRIES, base_delay=SMS_RETRY_BASE_DELAY,
+                 max_delay=SMS_RETRY_MAX_DELAY, rate=SMS_RATE_LIMIT, burst=SMS_RATE_BURST):
+        self.send_fn = send_fn
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = TokenBucket(rate, burst)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+        # 统计计数
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"sms-dispatch-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, to_phone, code):
+        """
+        提交一条短信发送任务，立即返回 Future（结果为 True，或最终失败的异常）。
+
+        异常:
+            RuntimeError: 发送队列已满或管道已关闭
+        """
+        if self._stop.is_set():
+            raise RuntimeError("短信发送管道已关闭")
+
+        future = Future()
+        try:
+            self._queue.put_nowait((to_phone, code, future))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise RuntimeError("短信发送队列已满，请稍后再试")
+
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, to_phone, code):
+        attempt = 0
+        while True:
+            if not self.limiter.acquire(self._stop):
+                raise RuntimeError("短信发送管道已关闭")
+            try:
+                return self.send_fn(to_phone, code)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                print(f"[SMS] 发送失败，第 {attempt + 1} 次重试：{e}")
+                if self._stop.wait(self._backoff(attempt)):
+                    raise
+                attempt += 1
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+
+            to_phone, code, future = job
+            if future.set_running_or_notify_cancel():
+                try:
+                    self._deliver(to_phone, code)
+                except Exception as e:
+                    with self._lock:
+                        self.failed += 1
+                    print(f"[SMS] 发送最终失败：{to_phone}：{e}")
+                    future.set_exception(e)
+                else:
+                    with self._lock:
+                        self.sent += 1
+                    future.set_result(True)
+            self._queue.task_done()
+
+    def join(self):
+        """
+        等待队列中已提交的短信全部处理完毕。
+        """
+        self._queue.join()
+
+    def shutdown(self, wait=True):
+        """
+        停止接收新任务；wait 为 True 时先发完队列中已有的短信。
+        """
+        if wait:
+            self._queue.join()
+        self._stop.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "sent": self.sent,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rejected": self.rejected,
+            }
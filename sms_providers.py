@@ -0,0 +1,256 @@
+# sms_providers.py
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# 导入临时性错误判断
+from sms_dispatch import is_transient_error
+
+# 导入短信供应商与路由配置
+from config import (
+    TWILIO_SID,
+    TWILIO_TOKEN,
+    TWILIO_PHONE,
+    SMS_PROVIDERS,
+    SMS_HEDGE_AFTER,
+    SMS_EWMA_ALPHA,
+    SMS_PROVIDER_MAX_FAILURES,
+    SMS_PROVIDER_COOLDOWN
+)
+
+# 统一的发送结果：
+#   ok          是否发送成功
+#   provider    实际使用的供应商名称
+#   message_id  供应商返回的消息标识（失败时为 None）
+#   error       失败原因（成功时为 None）
+#   transient   失败是否为临时性错误（网络、限流、服务端错误），可稍后重试
+#   latency     本次调用耗时（秒）
+SMSResult = namedtuple("SMSResult", "ok provider message_id error transient latency")
+
+
+class SMSProvider:
+    """
+    短信供应商接口：子类实现 _send(to_phone, code)，成功返回消息标识，失败抛出异常。
+    send() 捕获异常并统一返回 SMSResult，不会抛出。
+    """
+
+    name = "base"
+
+    def _send(self, to_phone, code):
+        raise NotImplementedError
+
+    def send(self, to_phone, code):
+        start = time.perf_counter()
+        try:
+            message_id = self._send(to_phone, code)
+        except Exception as e:
+            return SMSResult(False, self.name, None, str(e), is_transient_error(e), time.perf_counter() - start)
+        return SMSResult(True, self.name, message_id, None, False, time.perf_counter() - start)
+
+
+class TwilioProvider(SMSProvider):
+    """
+    Twilio 短信，客户端在首次发送时创建并复用。
+    """
+
+    name = "twilio"
+
+    def __init__(self, sid=TWILIO_SID, token=TWILIO_TOKEN, from_phone=TWILIO_PHONE):
+        self.sid = sid
+        self.token = token
+        self.from_phone = from_phone
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.sid, self.token)
+        return self._client
+
+    def _send(self, to_phone, code):
+        message = self.client().messages.create(
+            body=f"您的验证码是: {code}",
+            from_=self.from_phone,
+            to=to_phone
+        )
+        return message.sid
+
+
+class AliyunProvider(SMSProvider):
+    """
+    阿里云短信（仅支持中国大陆号码），客户端在首次发送时创建并复用。
+    """
+
+    name = "aliyun"
+
+    def _send(self, to_phone, code):
+        import alisms
+        return alisms.send_sms_request(to_phone, code)
+
+
+PROVIDER_TYPES = {
+    "twilio": TwilioProvider,
+    "aliyun": AliyunProvider,
+}
+
+
+class ProviderStats:
+    """
+    单个供应商的近期表现：延迟与错误率的指数滑动平均，以及连续失败计数。
+    """
+
+    def __init__(self, alpha=SMS_EWMA_ALPHA):
+        self.alpha = alpha
+        self.latency = None     # 延迟 EWMA（秒），尚无样本时为 None
+        self.error_rate = 0.0   # 错误率 EWMA
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.sends = 0
+        self.failures = 0
+
+    def record(self, result):
+        a = self.alpha
+        self.latency = result.latency if self.latency is None else (1 - a) * self.latency + a * result.latency
+        self.error_rate = (1 - a) * self.error_rate + a * (0.0 if result.ok else 1.0)
+        self.sends += 1
+        if result.ok:
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+
+    def score(self):
+        """
+        分数越低越优先：延迟按错误率放大；没有样本的供应商优先试用一次。
+        """
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 10 * self.error_rate)
+
+
+class SMSRouter:
+    """
+    多供应商短信路由：
+
+    - 优先使用近期延迟和错误率综合最低的供应商；
+    - 失败时自动切换到下一个供应商；连续失败达到上限的供应商暂停使用一段时间；
+    - 设置 hedge_after 后，首选供应商在该时间内未返回时，同时向下一个供应商发送，
+      取最先成功的结果（对冲请求，可能导致用户收到两条短信）。
+    """
+
+    def __init__(self, providers, hedge_after=SMS_HEDGE_AFTER, alpha=SMS_EWMA_ALPHA,
+                 max_failures=SMS_PROVIDER_MAX_FAILURES, cooldown=SMS_PROVIDER_COOLDOWN):
+        if not providers:
+            raise ValueError("至少需要一个短信供应商")
+
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.stats = {p.name: ProviderStats(alpha) for p in self.providers}
+        self._lock = threading.Lock()
+        self._executor = None
+        if hedge_after is not None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=2 * len(self.providers), thread_name_prefix="sms-hedge"
+            )
+
+    def ranked(self):
+        """
+        按优先级返回供应商列表；处于冷却期的供应商排在最后（都在冷却时仍会被尝试）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            return sorted(
+                self.providers,
+                key=lambda p: (self.stats[p.name].cooldown_until > now, self.stats[p.name].score())
+            )
+
+    def _record(self, result):
+        with self._lock:
+            stats = self.stats[result.provider]
+            stats.record(result)
+            if stats.consecutive_failures >= self.max_failures:
+                stats.cooldown_until = time.monotonic() + self.cooldown
+                stats.consecutive_failures = 0
+                print(f"[SMS] 供应商 {result.provider} 连续失败，暂停使用 {self.cooldown} 秒")
+
+    def _send_one(self, provider, to_phone, code):
+        result = provider.send(to_phone, code)
+        self._record(result)
+        return result
+
+    def send(self, to_phone, code):
+        """
+        按路由策略发送一条短信，返回最终的 SMSResult（全部失败时返回最后一个失败结果）。
+        """
+        ranked = self.ranked()
+        if self._executor is None:
+            result = None
+            for provider in ranked:
+                result = self._send_one(provider, to_phone, code)
+                if result.ok:
+                    return result
+            return result
+        return self._send_hedged(ranked, to_phone, code)
+
+    def _send_hedged(self, ranked, to_phone, code):
+        pending = set()
+        remaining = list(ranked)
+        result = None
+
+        while remaining or pending:
+            # 没有在途请求时立即发起下一个；否则等待 hedge_after 后再对冲
+            if remaining and not pending:
+                pending.add(self._executor.submit(self._send_one, remaining.pop(0), to_phone, code))
+
+            done, pending = wait(
+                pending, timeout=self.hedge_after if remaining else None, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                result = future.result()
+                if result.ok:
+                    return result
+
+            if not done and remaining:
+                pending.add(self._executor.submit(self._send_one, remaining.pop(0), to_phone, code))
+
+        return result
+
+    def snapshot(self):
+        """
+        返回各供应商的近期表现，便于观察路由决策。
+        """
+        with self._lock:
+            return {
+                name: {
+                    "latency_ms": None if s.latency is None else s.latency * 1000,
+                    "error_rate": s.error_rate,
+                    "sends": s.sends,
+                    "failures": s.failures,
+                    "cooling_down": s.cooldown_until > time.monotonic(),
+                }
+                for name, s in self.stats.items()
+            }
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_sms_router():
+    """
+    获取按 SMS_PROVIDERS 配置构建的进程内共享路由器。
+    """
+    global _router
+
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = SMSRouter([PROVIDER_TYPES[name]() for name in SMS_PROVIDERS])
+    return _router
@@ -0,0 +1,250 @@
+# smtp_pool.py
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+# 导入指标采集
+import metrics
+
+# 导入 SMTP 服务器与连接池配置
+from config import (
+    EMAIL_SENDER,
+    EMAIL_PASSWORD,
+    SMTP_HOST,
+    SMTP_PORT,
+    SMTP_USE_SSL,
+    SMTP_TIMEOUT,
+    SMTP_POOL_SIZE,
+    SMTP_MAX_IDLE,
+    SMTP_MAX_AGE,
+    SMTP_MAX_USES,
+    SMTP_CHECK_AFTER
+)
+
+
+class PooledSMTPConnection:
+    """
+    连接池中的一个已登录 SMTP 会话及其使用记录。
+    """
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            # 连接可能已被服务器断开，关闭失败无需处理
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    复用已完成 TLS 握手和登录的 SMTP 会话的连接池。
+
+    - 取出连接时：超过最大存活时间 / 最大使用次数 / 最大空闲时间的连接直接回收；
+      空闲超过 check_after 秒的连接先发送 NOOP 做健康检查；
+    - 发送失败的连接不放回池中；服务器断开连接时换新连接重试一次；
+    - 同时存在的连接数不超过 size，超出时调用方等待。
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=EMAIL_SENDER, password=EMAIL_PASSWORD,
+                 use_ssl=SMTP_USE_SSL, size=SMTP_POOL_SIZE, timeout=SMTP_TIMEOUT, max_idle=SMTP_MAX_IDLE,
+                 max_age=SMTP_MAX_AGE, max_uses=SMTP_MAX_USES, check_after=SMTP_CHECK_AFTER):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.size = size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.check_after = check_after
+
+        self._idle = []          # 空闲连接（后进先出，优先复用最近用过的连接）
+        self._total = 0          # 当前存在的连接数（空闲 + 使用中）
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # 统计计数
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.failed_checks = 0
+        self.sends = 0
+        self.errors = 0
+
+    @metrics.timed("smtp_connect")
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        return PooledSMTPConnection(smtp)
+
+    def _expired(self, conn, now):
+        return (
+            now - conn.created >= self.max_age
+            or conn.uses >= self.max_uses
+            or now - conn.last_used >= self.max_idle
+        )
+
+    def _healthy(self, conn, now):
+        if now - conn.last_used < self.check_after:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        conn.close()
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def acquire(self):
+        """
+        取出一个可用连接；没有空闲连接且未达上限时新建。
+        """
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("SMTP 连接池已关闭")
+                while not self._idle and self._total >= self.size:
+                    self._cond.wait()
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    self._total += 1
+                    conn = None
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.created += 1
+                return conn
+
+            now = time.monotonic()
+            if self._expired(conn, now):
+                with self._cond:
+                    self.recycled += 1
+                self._discard(conn)
+                continue
+            if not self._healthy(conn, now):
+                with self._cond:
+                    self.failed_checks += 1
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self.reused += 1
+            return conn
+
+    def release(self, conn, broken=False):
+        """
+        归还连接；broken 为 True 时关闭连接而不放回池中。
+        """
+        if broken or self._closed:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn.smtp
+        except Exception:
+            self.release(conn, broken=True)
+            raise
+        conn.uses += 1
+        self.release(conn)
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        通过池中的会话发送一封邮件；连接已被服务器断开时换新连接重试一次。
+        """
+        for attempt in range(2):
+            try:
+                with self.connection() as smtp:
+                    smtp.sendmail(from_addr, to_addrs, message)
+                with self._cond:
+                    self.sends += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                with self._cond:
+                    self.errors += 1
+                if attempt == 1:
+                    raise
+            except Exception:
+                with self._cond:
+                    self.errors += 1
+                raise
+
+    def close(self):
+        """
+        关闭池中所有空闲连接，之后不再发放连接。
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "total": self._total,
+                "created": self.created,
+                "reused": self.reused,
+                "recycled": self.recycled,
+                "failed_checks": self.failed_checks,
+                "sends": self.sends,
+                "errors": self.errors,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_smtp_pool():
+    """
+    获取进程内共享的 SMTP 连接池（首次使用时创建）。
+    """
+    global _pool
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool()
+    return _pool
@@ -0,0 +1,81 @@
+# tests/test_auth_server.py
+#
+# 认证服务接口测试：POST /login/code 的响应不应暴露用户名是否存在。
+# 用法: python -m pytest tests
+
+import asyncio
+import http.client
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# 仓库根目录加入模块搜索路径；配置中的数据文件均为相对路径，先切换到临时目录再导入项目模块
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+class SendCodeEnumerationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp(prefix="2fa-test-"))
+        if not os.getenv("FERNET_KEY"):
+            from cryptography.fernet import Fernet
+            os.environ["FERNET_KEY"] = Fernet.generate_key().decode()
+
+        import verification_manager
+        from auth_server import AuthServer, run_in_thread
+        from auth_service import AuthService
+        from totp_manager import generate_secret
+        from user_manager import add_user
+
+        # 邮件发送替换为记录调用，不连接 SMTP 服务器
+        cls.sent = []
+        cls._send_email_code = verification_manager.send_email_code
+        verification_manager.send_email_code = lambda contact, code: cls.sent.append(contact)
+
+        add_user("alice", generate_secret(), "password123", email="alice@example.com")
+
+        cls.service = AuthService()
+        cls.server = AuthServer(service=cls.service, port=0)
+        cls.thread, cls.loop = run_in_thread(cls.server)
+
+    @classmethod
+    def tearDownClass(cls):
+        import verification_manager
+
+        asyncio.run_coroutine_threadsafe(cls.server.close(), cls.loop).result()
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+        cls.thread.join()
+        verification_manager.send_email_code = cls._send_email_code
+        os.chdir(cls._cwd)
+
+    def send_code(self, username):
+        conn = http.client.HTTPConnection("127.0.0.1", self.server.port)
+        conn.request("POST", "/login/code", json.dumps({"username": username, "method": "email"}))
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return response.status
+
+    def test_same_status_sequence_for_existing_and_unknown_user(self):
+        from config import RATE_LIMITS
+
+        attempts = RATE_LIMITS["send_code_user"][0] + 1
+        existing = [self.send_code("alice") for _ in range(attempts)]
+        unknown = [self.send_code("nobody") for _ in range(attempts)]
+
+        self.assertEqual(existing, unknown)
+        self.assertEqual(existing, [202] * (attempts - 1) + [429])
+
+        # 存在的用户确实收到了验证码（发送在后台完成）
+        self.service.code_sender.shutdown(wait=True)
+        self.assertEqual(self.sent, ["alice@example.com"] * (attempts - 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,28 @@
 # totp_manager.py
 
 
+import functools
+import hmac
+import io
+import threading
+import time
+from collections import OrderedDict
+
 import pyotp
-import qrcode
 from datetime import datetime
-from user_manager import get_user
+from user_manager import get_user, SECRET_CHANGE_LISTENERS
+
+# 导入限流检查
+from rate_limiter import check_rate_limit, RateLimitExceeded
+
+# 导入指标采集
+import metrics
+
+# 导入 Fernet 加密器（首次使用时创建）
+from crypto_utils import get_fernet
 
-# 导入 Fernet 加密器
-from crypto_utils import fernet
+# 导入 TOTP 缓存与二维码配置
+from config import TOTP_CACHE_SIZE, TOTP_CACHE_TTL, TOTP_ISSUER, QR_BOX_SIZE, QR_CACHE_SIZE
 
 
 def generate_secret():
@@ -15,13 +30,14 @@ def generate_secret():
 
 
 def encrypt_secret(secret):
-    return fernet.encrypt(secret.encode()).decode()
+    return get_fernet().encrypt(secret.encode()).decode()
 
 
 def decrypt_secret(enc_secret):
-    return fernet.decrypt(enc_secret.encode()).decode()
+    return get_fernet().decrypt(enc_secret.encode()).decode()
 
 
+@metrics.timed("decrypt_secret")
 def get_decrypted_secret(user):
     """
     从用户数据中获取解密后的 TOTP 密钥。
@@ -29,12 +45,49 @@ def get_decrypted_secret(user):
     return decrypt_secret(user["secret"])
 
 
-def generate_qr_code(username, secret, issuer="MyApp"):
-    # 生成 otpauth URI
-    uri = pyotp.TOTP(secret).provisioning_uri(name=username, issuer_name=issuer)
+def provisioning_uri(username, secret, issuer=TOTP_ISSUER):
+    """
+    生成供 Authenticator 应用扫描的 otpauth URI。
+    """
+    return pyotp.TOTP(secret).provisioning_uri(name=username, issuer_name=issuer)
+
+
+@metrics.timed("render_qr")
+def encode_qr(uri, fmt="png", box_size=QR_BOX_SIZE):
+    """
+    把 otpauth URI 编码为 PNG / SVG 字节（不缓存）。
+    """
+    # 延迟导入：qrcode 仅在注册完成或生成配置包时需要（PNG 依赖 PIL，SVG 不依赖）
+    import qrcode
+
+    if fmt == "png":
+        factory = None
+    elif fmt == "svg":
+        import qrcode.image.svg
+        factory = qrcode.image.svg.SvgPathImage
+    else:
+        raise ValueError(f"不支持的二维码格式：{fmt}")
+
+    buffer = io.BytesIO()
+    qrcode.make(uri, image_factory=factory, box_size=box_size).save(buffer)
+    return buffer.getvalue()
 
-    qr = qrcode.make(uri)
-    qr.show()
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr(uri, fmt="png", box_size=QR_BOX_SIZE):
+    """
+    在内存中把 otpauth URI 渲染为 PNG 或 SVG 字节，不写临时文件、不调用外部程序。
+    结果按 (URI, 格式, 尺寸) 缓存，重复显示同一二维码时不再重新编码。
+    URI 中包含明文密钥，缓存只保存在当前进程内且容量很小（config.QR_CACHE_SIZE）。
+    """
+    return encode_qr(uri, fmt, box_size)
+
+
+def generate_qr_code(username, secret, issuer=TOTP_ISSUER, fmt="png"):
+    """
+    生成用户 TOTP 密钥的二维码图像（PNG / SVG 字节）。
+    """
+    return render_qr(provisioning_uri(username, secret, issuer), fmt)
 
 
 def verify_code(secret, code, last_used_time=None):
@@ -54,23 +107,202 @@ def verify_code(secret, code, last_used_time=None):
     return False, current_time
 
 
-def get_totp(username):
+class TOTPCache:
     """
-    获取指定用户的 TOTP 对象（用于验证）。
+    已解密 TOTP 对象的 LRU + TTL 缓存（按用户名）。
+    命中时既不读取用户数据，也不做 Fernet 解密。
+
+    每个条目同时记下对应的密文：调用方传入用户记录时若密文已变化（密钥更换、
+    密钥轮换重新加密），条目视为失效；未传入记录时依靠 TTL 和显式失效保证不会长期过期。
     """
-    user = get_user(username)
+
+    def __init__(self, capacity=TOTP_CACHE_SIZE, ttl=TOTP_CACHE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()  # username -> (totp, 密文, 过期时间)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, username, enc_secret=None):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                totp, cached_secret, expires_at = entry
+                if time.monotonic() >= expires_at:
+                    del self._entries[username]
+                    self.expirations += 1
+                elif enc_secret is not None and enc_secret != cached_secret:
+                    del self._entries[username]
+                    self.invalidations += 1
+                else:
+                    self._entries.move_to_end(username)
+                    self.hits += 1
+                    return totp
+            self.misses += 1
+            return None
+
+    def put(self, username, totp, enc_secret):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (totp, enc_secret, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, username):
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def purge(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+            }
+
+
+_totp_cache = TOTPCache()
+
+# 用户更换 TOTP 密钥时使缓存条目失效
+SECRET_CHANGE_LISTENERS.append(_totp_cache.invalidate)
+
+
+def invalidate_totp(username):
+    _totp_cache.invalidate(username)
+
+
+def purge_totp_cache():
+    """
+    清空全部已缓存的 TOTP 对象（如更换加密密钥后）。
+    """
+    _totp_cache.purge()
+
+
+def totp_cache_stats():
+    return _totp_cache.stats()
+
+
+def get_totp(username, user=None):
+    """
+    获取指定用户的 TOTP 对象（用于验证），优先使用缓存。
+    已读取过用户记录时可通过 user 传入，避免重复读取。
+    """
+    totp = _totp_cache.get(username, user["secret"] if user else None)
+    if totp is not None:
+        return totp
+
+    if user is None:
+        user = get_user(username)
     if not user:
         return None
 
     secret = get_decrypted_secret(user)
-    return pyotp.TOTP(secret)
+    totp = pyotp.TOTP(secret)
+    _totp_cache.put(username, totp, user["secret"])
+    return totp
 
 
-def verify_totp(username, input_code):
+@metrics.timed("verify_totp")
+def verify_totp(username, input_code, user=None, caller=None):
     """
-    验证指定用户的 TOTP 验证码是否正确。
+    验证指定用户的 TOTP 验证码是否正确（先做限流检查，再解密密钥）。
+    异常:
+        RateLimitExceeded: 该调用方或用户尝试过于频繁
     """
-    totp = get_totp(username)
+    check_rate_limit("totp_caller", caller)
+    check_rate_limit("totp_user", username)
+
+    totp = get_totp(username, user=user)
     if not totp:
         return False
     return totp.verify(input_code)
+
+
+def verify_totp_batch_steps(items, valid_window=0, for_time=None):
+    """
+    批量验证多个用户的 TOTP 验证码（网关每个周期收集到的一批提交）。
+
+    每条提交与 verify_totp 一样先做限流检查（totp_caller / totp_user），
+    超出限额的提交判为不通过，不影响同一批的其他提交；失败计数由调用方处理，
+    返回的时间步可供调用方识别重复提交的同一验证码。
+
+    同一时间步内的提交共享计数器，每个 (密钥, 计数器) 只计算一次 HMAC，
+    同一用户只取一次 TOTP 对象。
+
+    参数:
+        items (list): [(username, code), ...] 或 [(username, code, caller), ...]（caller 为调用方标识，如客户端 IP）
+        valid_window (int): 允许前后偏移的时间步数，与 pyotp 的 valid_window 含义相同
+        for_time (float): 验证所用的时间戳，默认当前时间（整批共用）
+    返回值:
+        list: 与 items 一一对应；通过时为验证码所属的时间步，不通过（含被限流、格式无效）时为 None
+    """
+    now = time.time() if for_time is None else for_time
+
+    totps = {}  # username -> TOTP 对象（或 None）
+    otps = {}   # (密钥, 计数器) -> 验证码（字节）
+    results = []
+
+    for item in items:
+        username, code = item[0], item[1]
+        caller = item[2] if len(item) > 2 else None
+        try:
+            check_rate_limit("totp_caller", caller)
+            check_rate_limit("totp_user", username)
+        except RateLimitExceeded:
+            results.append(None)
+            continue
+
+        if username not in totps:
+            totps[username] = get_totp(username)
+        totp = totps[username]
+        if totp is None or not code:
+            results.append(None)
+            continue
+
+        # 按字节比较：验证码只含 ASCII 数字，其他字符（如全角数字）直接判为不通过
+        try:
+            submitted = str(code).encode("ascii")
+        except UnicodeEncodeError:
+            results.append(None)
+            continue
+
+        counter = int(now // totp.interval)
+        step = None
+        for offset in range(-valid_window, valid_window + 1):
+            key = (totp.secret, counter + offset)
+            expected = otps.get(key)
+            if expected is None:
+                expected = otps[key] = totp.generate_otp(counter + offset).encode()
+            if hmac.compare_digest(submitted, expected):
+                step = counter + offset
+                break
+        results.append(step)
+
+    return results
+
+
+def verify_totp_batch(items, valid_window=0, for_time=None):
+    """
+    批量验证多个用户的 TOTP 验证码，参数同 verify_totp_batch_steps。
+    返回值:
+        list: 与 items 一一对应的验证结果（bool）
+    """
+    return [step is not None for step in verify_totp_batch_steps(items, valid_window, for_time)]
@@ -1,26 +1,50 @@
 # user_manager.py
 
 import time
-import hashlib
 import secrets
 
-# 导入数据读写模块
-from data_store import load_users, save_users
+# 导入数据读写模块（按用户名单条读写）
+from data_store import (
+    get_user_record,
+    get_user_record_for_update,
+    save_user_record,
+    user_exists,
+    find_username_by_contact,
+    lock_user as acquire_user_lock  # 与下方“锁定账户”的 lock_user 区分
+)
 
-# 导入对称加密器
-from crypto_utils import fernet
+# 导入对称加密器（首次使用时创建）
+from crypto_utils import get_fernet
+
+# 导入密码哈希（加盐 scrypt，在专用线程池中计算）
+import password_kdf
+
+# 导入指标采集
+import metrics
 
 # 导入配最大失败次数、锁定时长
 from config import MAX_FAILED_ATTEMPTS, LOCK_DURATION
 
 
+# 验证方式 -> 用户记录中的联系方式字段
+CONTACT_FIELDS = {"email": "email", "sms": "phone", "phone": "phone"}
+
+# TOTP 密钥变更监听器：callback(username)，用于让依赖密钥的缓存失效
+SECRET_CHANGE_LISTENERS = []
+
+
+def notify_secret_changed(username):
+    for callback in SECRET_CHANGE_LISTENERS:
+        callback(username)
+
+
 def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    return password_kdf.hash_password(password)
 
 
 def add_user(username, secret, password, email=None, phone=None):
     """
-    添加新用户并保存到 users.json 文件中。
+    添加新用户并保存到用户存储中。
     参数:
         username (str): 用户名
         secret (str): TOTP 密钥（未加密）
@@ -28,40 +52,226 @@ def add_user(username, secret, password, email=None, phone=None):
         email (str): 可选邮箱
         phone (str): 可选手机号
     异常:
-        ValueError: 用户已存在
+        ValueError: 用户已存在，或邮箱/手机号已被其他用户绑定
     """
-    users = load_users()
-
-    if username in users:
+    if user_exists(username):
         raise ValueError("用户已存在")
 
-    users[username] = {
-        "secret": fernet.encrypt(secret.encode()).decode(),  # 加密 TOTP 密钥
+    # 计算哈希前先检查一次；并发注册同一联系方式时由存储在写入时拒绝（同样抛出 ValueError）
+    check_contact_available(email=email, phone=phone)
+
+    # 哈希与加密在加锁前完成，锁内只做查重与写入
+    user = {
+        "secret": get_fernet().encrypt(secret.encode()).decode(),  # 加密 TOTP 密钥
         "password": hash_password(password),
         "email": email,
         "phone": phone,
         "recovery_codes": generate_recovery_codes(),
         "failed_attempts": 0,
         "locked_until": 0,
-        "last_verified_time": 0,                             # 上次验证时间（保留字段）
-        "verification_codes": {}
+        "last_verified_time": 0                              # 上次验证时间（保留字段）
     }
 
-    save_users(users)
+    with acquire_user_lock(username):
+        # 其他进程可能刚刚注册了同名用户
+        if get_user_record_for_update(username) is not None:
+            raise ValueError("用户已存在")
+        save_user_record(username, user)
+    notify_secret_changed(username)
 
 
 def get_user(username):
-    return load_users().get(username)
+    return get_user_record(username)
+
+
+def find_user_by_contact(method, contact):
+    """
+    通过邮箱或手机号查找绑定的用户名（走二级索引，不扫描全部用户）。
+    参数:
+        method (str): "email"、"sms" 或 "phone"
+        contact (str): 邮箱地址或手机号
+    """
+    field = CONTACT_FIELDS.get(method)
+    if field is None:
+        raise ValueError("不支持的发送方式")
+    return find_username_by_contact(field, contact)
+
+
+def check_contact_available(email=None, phone=None, username=None):
+    """
+    检查邮箱/手机号是否已被其他用户绑定（写入前的提示性检查，唯一性最终由存储保证）。
+    异常:
+        ValueError: 联系方式已被 username 以外的用户绑定
+    """
+    if email:
+        owner = find_username_by_contact("email", email)
+        if owner is not None and owner != username:
+            raise ValueError("该邮箱已被其他用户绑定")
+
+    if phone:
+        owner = find_username_by_contact("phone", phone)
+        if owner is not None and owner != username:
+            raise ValueError("该手机号已被其他用户绑定")
+
+
+def update_contact(username, email=None, phone=None):
+    """
+    修改用户绑定的邮箱和/或手机号（传入 None 表示不修改），二级索引随记录一起更新。
+    异常:
+        ValueError: 用户不存在，或联系方式已被其他用户绑定
+    """
+    check_contact_available(email=email, phone=phone, username=username)
+
+    with user_transaction(username) as txn:
+        if not txn.exists():
+            raise ValueError("用户不存在")
+        if email is not None:
+            txn.user["email"] = email
+            txn.dirty = True
+        if phone is not None:
+            txn.user["phone"] = phone
+            txn.dirty = True
+
+
+class UserTransaction:
+    """
+    单用户事务（unit of work）：进入时读取一次用户记录，
+    期间的多次修改只作用于内存中的记录，退出时若有改动则统一写回一次。
+
+    事务期间持有该用户的跨进程锁，多个进程同时登录同一用户时
+    失败计数、恢复码消耗等修改不会互相覆盖；不同用户之间互不阻塞。
+
+    用法:
+        with user_transaction(username) as txn:
+            if txn.user and not txn.is_locked():
+                remaining = txn.register_failure()
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.user = None
+        self.dirty = False  # 记录是否被修改，未修改时退出不写回
+        self._lock = None
+
+    def __enter__(self):
+        self._lock = acquire_user_lock(self.username)
+        self._lock.__enter__()
+        try:
+            self.user = get_user_record_for_update(self.username)
+        except BaseException:
+            self._lock.__exit__(None, None, None)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            # 出现异常时放弃本次修改
+            if exc_type is None:
+                self.commit()
+        finally:
+            self._lock.__exit__(None, None, None)
+        return False
+
+    def commit(self):
+        if self.dirty and self.user is not None:
+            save_user_record(self.username, self.user)
+            self.dirty = False
+
+    def exists(self):
+        return self.user is not None
+
+    def is_locked(self):
+        return self.user is not None and is_user_locked(self.user)
+
+    def remaining_attempts(self):
+        if self.user is None:
+            return MAX_FAILED_ATTEMPTS
+        return max(0, MAX_FAILED_ATTEMPTS - self.user.get("failed_attempts", 0))
+
+    def increment_failed_attempts(self):
+        if self.user is not None:
+            self.user["failed_attempts"] = self.user.get("failed_attempts", 0) + 1
+            self.dirty = True
+
+    def reset_failed_attempts(self):
+        # 失败次数本来就是 0 时不产生写入
+        if self.user is not None and self.user.get("failed_attempts", 0) != 0:
+            self.user["failed_attempts"] = 0
+            self.dirty = True
+
+    def lock(self):
+        if self.user is not None:
+            self.user["locked_until"] = time.time() + LOCK_DURATION
+            self.dirty = True
+
+    def register_failure(self):
+        """
+        记录一次验证失败：增加失败次数，次数用尽时锁定账户。
+
+        返回值:
+            int: 剩余尝试次数（0 表示账户已被锁定）
+        """
+        self.increment_failed_attempts()
+        remaining = self.remaining_attempts()
+        if remaining <= 0:
+            self.lock()
+            metrics.event("lockout")
+        return remaining
+
+    def verify_password(self, input_password):
+        """
+        校验密码；成功且存储的是旧版哈希（或参数已调整）时顺带升级哈希。
+        """
+        if self.user is None:
+            return False
+
+        if not verify_password(self.user, input_password):
+            return False
+
+        if password_kdf.needs_rehash(self.user.get("password")):
+            self.user["password"] = hash_password(input_password)
+            self.dirty = True
+        return True
+
+    def consume_recovery_code(self, code):
+        """
+        校验并消耗一个恢复码（恢复码只能一次性使用）。
+        """
+        if self.user is None:
+            return False
+
+        if code in self.user.get("recovery_codes", []):
+            self.user["recovery_codes"].remove(code)
+            self.dirty = True
+            return True
+
+        return False
+
+
+def set_user_secret(username, secret):
+    """
+    更换用户的 TOTP 密钥（明文传入，加密后保存）。
+    异常:
+        ValueError: 用户不存在
+    """
+    with user_transaction(username) as txn:
+        if not txn.exists():
+            raise ValueError("用户不存在")
+        txn.user["secret"] = get_fernet().encrypt(secret.encode()).decode()
+        txn.dirty = True
+    notify_secret_changed(username)
+
+
+def user_transaction(username):
+    return UserTransaction(username)
 
 
 def get_remaining_attempts(username):
     """
     获取用户剩余的登录尝试次数。
     """
-    users = load_users()
-    if username in users:
-        return max(0, MAX_FAILED_ATTEMPTS - users[username].get("failed_attempts", 0))
-    return MAX_FAILED_ATTEMPTS
+    with user_transaction(username) as txn:
+        return txn.remaining_attempts()
 
 
 def is_user_locked(user):
@@ -69,34 +279,28 @@ def is_user_locked(user):
 
 
 def lock_user(username):
-    users = load_users()
-    if username in users:
-        users[username]["locked_until"] = time.time() + LOCK_DURATION
-        save_users(users)
+    with user_transaction(username) as txn:
+        txn.lock()
 
 
 def reset_failed_attempts(username):
     """
     重置用户的失败尝试次数。
     """
-    users = load_users()
-    if username in users:
-        users[username]["failed_attempts"] = 0
-        save_users(users)
+    with user_transaction(username) as txn:
+        txn.reset_failed_attempts()
 
 
 def increment_failed_attempts(username):
     """
     增加用户的失败尝试次数。
     """
-    users = load_users()
-    if username in users:
-        users[username]["failed_attempts"] += 1
-        save_users(users)
+    with user_transaction(username) as txn:
+        txn.increment_failed_attempts()
 
 
 def verify_password(user, input_password):
-    return hash_password(input_password) == user.get("password")
+    return password_kdf.verify_password(input_password, user.get("password"))
 
 
 def generate_recovery_codes(n=5):
@@ -104,14 +308,5 @@ def generate_recovery_codes(n=5):
 
 
 def verify_recovery_code(username, code):
-    users = load_users()
-    user = users.get(username)
-    if not user:
-        return False
-
-    if code in user.get("recovery_codes", []):
-        user["recovery_codes"].remove(code)  # 恢复码只能一次性使用
-        save_users(users)
-        return True
-
-    return False
+    with user_transaction(username) as txn:
+        return txn.consume_recovery_code(code)
@@ -0,0 +1,145 @@
+# user_record.py
+
+import base64
+import binascii
+from collections.abc import MutableMapping
+
+# 用户记录的固定字段（与 user_manager.add_user 中的顺序一致）；
+# 所有 UserRecord 共用这些字段名字符串，不再每条记录各存一份
+FIELDS = (
+    "secret",
+    "password",
+    "email",
+    "phone",
+    "recovery_codes",
+    "failed_attempts",
+    "locked_until",
+    "last_verified_time",
+)
+
+# 恢复码合并保存时使用的分隔符（恢复码本身不含换行）
+_CODE_SEPARATOR = "\n"
+
+
+def _pack_secret(secret):
+    """
+    Fernet 密文是 URL 安全的 Base64 文本，解码为原始字节保存可省下约四分之一；
+    无法无损还原的值（如非 Fernet 格式）原样保存。
+    """
+    if not isinstance(secret, str):
+        return secret
+    try:
+        raw = base64.urlsafe_b64decode(secret.encode())
+    except (binascii.Error, ValueError):
+        return secret
+    if base64.urlsafe_b64encode(raw).decode() != secret:
+        return secret
+    return raw
+
+
+def _pack_codes(codes):
+    if isinstance(codes, (list, tuple)) and all(
+        isinstance(code, str) and _CODE_SEPARATOR not in code for code in codes
+    ):
+        return _CODE_SEPARATOR.join(codes)
+    return codes
+
+
+class UserRecord(MutableMapping):
+    """
+    紧凑的用户记录：用 __slots__ 代替每条记录一个 dict，可以像 dict 一样按字段名读写。
+
+    - 加密的 TOTP 密钥以原始字节保存，读取 record["secret"] 时才还原为文本；
+    - 恢复码合并为一个字符串保存，首次读取时才拆分为列表
+      （拆分后的列表保存在记录中，对它的修改如 remove 会保留）；
+    - 字段名由所有记录共用；FIELDS 以外的字段放在 _extra 中，没有时不占用字典。
+
+    同样的合成用户（Fernet 密文、scrypt 哈希、邮箱、手机号、5 个恢复码），
+    普通 dict 约 1.6 KB / 用户，UserRecord 约 0.6 KB / 用户（100 万用户约 1.5 GiB 对 0.6 GiB）
+    （python benchmarks/bench_user_memory.py，Python 3.11 64 位，不含用户名本身）。
+    """
+
+    __slots__ = (
+        "_secret", "password", "email", "phone", "_recovery_codes",
+        "failed_attempts", "locked_until", "last_verified_time", "_extra",
+    )
+
+    def __init__(self, secret=None, password=None, email=None, phone=None, recovery_codes=(),
+                 failed_attempts=0, locked_until=0, last_verified_time=0, **extra):
+        self._secret = _pack_secret(secret)
+        self.password = password
+        self.email = email
+        self.phone = phone
+        self._recovery_codes = _pack_codes(list(recovery_codes or ()))
+        self.failed_attempts = failed_attempts
+        self.locked_until = locked_until
+        self.last_verified_time = last_verified_time
+        self._extra = extra or None
+
+    @classmethod
+    def from_dict(cls, user):
+        return cls(**user)
+
+    def to_dict(self):
+        """
+        转换为普通 dict（写入存储、序列化为 JSON 时使用）。
+        """
+        return dict(self.items())
+
+    @property
+    def secret(self):
+        secret = self._secret
+        if isinstance(secret, bytes):
+            return base64.urlsafe_b64encode(secret).decode()
+        return secret
+
+    @secret.setter
+    def secret(self, value):
+        self._secret = _pack_secret(value)
+
+    @property
+    def recovery_codes(self):
+        codes = self._recovery_codes
+        if isinstance(codes, str):
+            codes = self._recovery_codes = codes.split(_CODE_SEPARATOR) if codes else []
+        return codes
+
+    @recovery_codes.setter
+    def recovery_codes(self, value):
+        self._recovery_codes = list(value)
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in FIELDS:
+            raise KeyError(f"不能删除固定字段：{key}")
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self):
+        yield from FIELDS
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return len(FIELDS) + (len(self._extra) if self._extra is not None else 0)
+
+    def __contains__(self, key):
+        return key in FIELDS or (self._extra is not None and key in self._extra)
+
+    def __repr__(self):
+        return f"UserRecord({self.to_dict()!r})"
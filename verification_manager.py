@@ -1,15 +1,33 @@
 # verification_manager.py
 
 import secrets
+import threading
 import time
 from email.header import Header
 from config import VERIFICATION_CODE_EXPIRY
-from data_store import load_users, save_users
-from user_manager import get_user, verify_password
-from config import EMAIL_SENDER, EMAIL_PASSWORD, TWILIO_SID, TWILIO_TOKEN, TWILIO_PHONE
+from user_manager import find_user_by_contact, user_transaction
+from code_store import get_code_store, code_key
+from rate_limiter import check_rate_limit
+import metrics
+from config import EMAIL_SENDER, SMS_ASYNC
 from email.mime.text import MIMEText
-import smtplib
-from twilio.rest import Client
+
+# 导入 SMTP 连接池（复用已登录的会话）
+from smtp_pool import get_smtp_pool
+
+# 导入异步短信发送管道与多供应商路由
+from sms_dispatch import SMSDispatcher
+from sms_providers import get_sms_router
+
+
+class SMSSendError(Exception):
+    """
+    所有短信供应商均发送失败。transient 表示失败是否为临时性错误（可重试）。
+    """
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
 
 
 def generate_code():
@@ -19,44 +37,86 @@ def generate_code():
     return str(secrets.randbelow(900000) + 100000)
 
 
-def send_code(contact, method, is_registration=False):
+def send_code(contact, method, is_registration=False, caller=None):
+    """
+    发送验证码。注册阶段返回验证码对象，由界面在内存中验证；
+    登录阶段把验证码放入一次性验证码存储（不读写用户记录）。
+    caller 为调用方标识（如客户端 IP），用于限流。
+    异常:
+        RateLimitExceeded: 该调用方、联系方式或用户发送过于频繁
+    """
+    if method not in ("email", "sms"):
+        raise ValueError("不支持的发送方式")
+
+    # 限流检查在查询用户与调用短信/邮件服务之前
+    check_rate_limit("send_code_caller", caller)
+    check_rate_limit("send_code_contact", contact)
+
+    username = None
+    if not is_registration:
+        # 登录阶段：通过二级索引定位绑定该联系方式的用户
+        username = find_user_by_contact(method, contact)
+        if username is None:
+            raise ValueError("未找到绑定该邮箱或手机号的用户")
+        check_rate_limit("send_code_user", username)
+
+    return _send(contact, method, username)
+
+
+def check_send_rate(username, caller=None):
+    """
+    登录验证码发送的限流检查，按请求的用户名计数（无论该用户是否存在），
+    应在查询用户之前调用，使存在与不存在的用户名被限流的方式相同。
+    异常:
+        RateLimitExceeded: 该调用方或用户名发送过于频繁
+    """
+    check_rate_limit("send_code_caller", caller)
+    check_rate_limit("send_code_user", username)
+
+
+def send_user_code(username, contact, method):
+    """
+    向已确定的用户发送登录验证码，调用方应先调用 check_send_rate。
+    异常:
+        RateLimitExceeded: 该联系方式发送过于频繁
+    """
+    if method not in ("email", "sms"):
+        raise ValueError("不支持的发送方式")
+
+    check_rate_limit("send_code_contact", contact)
+    return _send(contact, method, username)
+
+
+def _send(contact, method, username=None):
     """
-    发送验证码并根据阶段决定是否写入用户数据。
+    生成并发送验证码。username 为 None 时（注册阶段）返回验证码对象；
+    否则把验证码放入一次性验证码存储，返回 True。
     """
     code = generate_code()
     timestamp = time.time()
 
+    if username is not None:
+        # 先保存再发送：用户可能在发送函数返回前就收到并提交验证码
+        get_code_store().put(code_key(username, method), code)
+
     # 发送验证码
-    if method == "email":
-        send_email_code(contact, code)
-    elif method == "sms":
-        send_sms_code(contact, code)
-    else:
-        raise ValueError("不支持的发送方式")
+    try:
+        if method == "email":
+            send_email_code(contact, code)
+        elif SMS_ASYNC:
+            # 入队即返回，发送、重试与限速由后台工作线程完成
+            get_sms_dispatcher().submit(contact, code)
+        else:
+            send_sms_code(contact, code)
+    except Exception:
+        if username is not None:
+            get_code_store().delete(code_key(username, method))
+        raise
 
-    if is_registration:
+    if username is None:
         # 注册阶段：不写入文件，只返回验证码对象，GUI 内存中验证
         return {"code": code, "timestamp": timestamp}
 
-    # 登录阶段：将验证码写入用户数据文件
-    users = load_users()
-    for username, user in users.items():
-        if method == "email" and user.get("email") == contact:
-            user.setdefault("verification_codes", {})[method] = {
-                "code": code,
-                "timestamp": timestamp
-            }
-            break
-        elif method == "sms" and user.get("phone") == contact:
-            user.setdefault("verification_codes", {})[method] = {
-                "code": code,
-                "timestamp": timestamp
-            }
-            break
-    else:
-        raise ValueError("未找到绑定该邮箱或手机号的用户")
-
-    save_users(users)
     return True
 
 
@@ -85,24 +145,47 @@ def verify_code(input_code, stored_code_obj):
     return result
 
 
-def verify_first_factor(username, method, input_value):
+def consume_login_code(username, method, input_code):
+    """
+    校验登录验证码，成功后立即作废（每个验证码只能使用一次）。
+    """
+    return get_code_store().consume(code_key(username, method), input_code)
+
+
+def check_login_rate(username, caller=None):
+    """
+    第一因子校验的限流检查，应在读取用户与计算密码哈希之前调用。
+    异常:
+        RateLimitExceeded: 该调用方或用户尝试过于频繁
+    """
+    check_rate_limit("login_caller", caller)
+    check_rate_limit("login_user", username)
+
+
+def verify_first_factor(username, method, input_value, txn=None, caller=None):
     """
     验证第一因子（密码、短信验证码、邮箱验证码）。
+    已开启用户事务时可通过 txn 传入，避免重复读取，此时调用方应在开启事务前
+    调用 check_login_rate；密码验证成功时旧版哈希会在同一事务中被升级。
     """
-    user = get_user(username)
-    if not user:
+    if txn is None:
+        check_login_rate(username, caller)
+        with user_transaction(username) as txn:
+            return verify_first_factor(username, method, input_value, txn=txn)
+
+    if not txn.exists():
         return False
 
     if method == "password":
-        return verify_password(user, input_value)
+        return txn.verify_password(input_value)
 
-    stored = user.get("verification_codes", {}).get(method)
-    return verify_code(input_value, stored)
+    return consume_login_code(username, method, input_value)
 
 
+@metrics.timed("send_email")
 def send_email_code(to_email, code):
     """
-    发送邮件验证码（使用 QQ 邮箱 SMTP）。
+    发送邮件验证码（使用 QQ 邮箱 SMTP，经连接池复用已登录的会话）。
     """
     # 构建邮件正文（纯文本）
     msg = MIMEText(f'您的 2FA 登录验证码：{code}', 'plain', 'utf-8')
@@ -111,10 +194,8 @@ def send_email_code(to_email, code):
     msg["To"] = to_email
 
     try:
-        # 使用 SMTP SSL 发送邮件（端口 587 / 465）
-        with smtplib.SMTP_SSL("smtp.qq.com", 587) as smtp:
-            smtp.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            smtp.sendmail(EMAIL_SENDER, to_email, msg.as_string())
+        # 使用 SMTP SSL 发送邮件（端口 587 / 465），会话由连接池维护
+        get_smtp_pool().send(EMAIL_SENDER, to_email, msg.as_string())
 
         print(f"[Email] 验证码发送成功：{to_email}")
 
@@ -127,19 +208,33 @@ def send_email_code(to_email, code):
             raise
 
 
-# 可替换为 alisms.py 中的 send_sms_code（阿里云）
+_sms_dispatcher = None
+_sms_lock = threading.Lock()
+
+
+def get_sms_dispatcher():
+    """
+    获取进程内共享的短信发送管道（首次使用时启动工作线程）。
+    """
+    global _sms_dispatcher
+
+    if _sms_dispatcher is None:
+        with _sms_lock:
+            if _sms_dispatcher is None:
+                _sms_dispatcher = SMSDispatcher(send_sms_code)
+    return _sms_dispatcher
+
+
+# 供应商（Twilio / 阿里云）及顺序在 config.SMS_PROVIDERS 中配置
+@metrics.timed("send_sms")
 def send_sms_code(to_phone, code):
     """
-    使用 Twilio 发送短信验证码。
+    经多供应商路由发送短信验证码，全部供应商失败时抛出 SMSSendError。
     """
-    try:
-        client = Client(TWILIO_SID, TWILIO_TOKEN)
-        message = client.messages.create(
-            body=f"您的验证码是: {code}",
-            from_=TWILIO_PHONE,
-            to=to_phone
-        )
-        print(f"[Twilio] 短信已发送：{message.sid}")
-    except Exception as e:
-        print(f"[Twilio] 发送失败：{e}")
-        raise
+    result = get_sms_router().send(to_phone, code)
+    if result.ok:
+        print(f"[SMS] 短信已通过 {result.provider} 发送：{result.message_id}")
+        return result
+
+    print(f"[SMS] 发送失败（{result.provider}）：{result.error}")
+    raise SMSSendError(result.error, transient=result.transient)